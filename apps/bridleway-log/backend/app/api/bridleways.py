@@ -14,6 +14,8 @@ from math import radians, sin, cos, sqrt, atan2
 
 from app.db import get_db
 from app.models import Path
+from app.services.coverage import build_path_segments
+from app.services.response_cache import bump_data_version
 
 logger = logging.getLogger(__name__)
 
@@ -144,6 +146,10 @@ async def upload_bridleways(
 
         db.commit()
 
+        # Split the new paths into coverage segments
+        build_path_segments(db)
+        bump_data_version(db)
+
         return {
             "status": "success",
             "message": f"Imported {imported} bridleways for area '{area}'",
@@ -158,6 +164,8 @@ async def upload_bridleways(
     except Exception as e:
         logger.error(f"Error uploading bridleways: {e}")
         db.rollback()
+        # Batches committed before the error stay in the database
+        bump_data_version(db)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -168,6 +176,7 @@ def delete_area(area_name: str, db: Session = Depends(get_db)):
     """
     deleted = db.query(Path).filter(Path.area == area_name).delete()
     db.commit()
+    bump_data_version(db)
 
     if deleted == 0:
         raise HTTPException(status_code=404, detail=f"No paths found for area: {area_name}")
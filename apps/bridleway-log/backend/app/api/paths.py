@@ -1,24 +1,199 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, and_, case, cast, Numeric
 from geoalchemy2.functions import ST_AsGeoJSON
 from typing import Optional
 import json
+import math
 
+from app.config import PATHS_GEOJSON_ASSEMBLY
 from app.db import get_db
-from app.models import Path
+from app.models import Path, PathSegment, PathCoverageProfile, PathSegmentCoverage, PathRideCoverage, Ride, RideBuffer
+from app.schemas import PathRide, PathRidesResponse
+from app.services.coverage import COVERAGE_BUFFER_METERS, COVERAGE_BUFFER_PROFILES, COVERAGE_MAX_BUFFER_METERS
+from app.services.geojson import stream_feature_collection, feature_collection_sql
+from app.services.response_cache import CacheLookup, lookup_cached_response
 
 router = APIRouter()
 
+BUFFER_QUERY = Query(None, description="Coverage buffer width in meters (see /api/coverage/profiles)")
+
+# Web map tile size; one pixel at zoom z spans 360 / (TILE_SIZE * 2^z) degrees
+TILE_SIZE = 256
+
+
+def resolve_buffer(buffer: Optional[int]) -> int:
+    """Validate a requested coverage buffer width, defaulting to COVERAGE_BUFFER_METERS."""
+    if buffer is None:
+        return COVERAGE_BUFFER_METERS
+    if buffer not in COVERAGE_BUFFER_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown coverage buffer {buffer}. Available: {list(COVERAGE_BUFFER_PROFILES)}"
+        )
+    return buffer
+
+
+def coverage_columns(buffer_m: int, segments: bool = False) -> tuple:
+    """
+    Coverage columns (is_ridden, coverage_fraction, last_ridden_date) for a buffer width.
+
+    The default width is read from paths / path_segments directly; other
+    widths come from the profile tables, which join_coverage_profile() adds.
+    """
+    if buffer_m == COVERAGE_BUFFER_METERS:
+        source = PathSegment if segments else Path
+    else:
+        source = PathSegmentCoverage if segments else PathCoverageProfile
+
+    return (
+        func.coalesce(source.is_ridden, False).label("is_ridden"),
+        func.coalesce(source.coverage_fraction, 0.0).label("coverage_fraction"),
+        source.last_ridden_date.label("last_ridden_date")
+    )
+
+
+def join_coverage_profile(query, buffer_m: int, segments: bool = False):
+    """Outer join the coverage profile for a non-default buffer width."""
+    if buffer_m == COVERAGE_BUFFER_METERS:
+        return query
+    if segments:
+        return query.outerjoin(
+            PathSegmentCoverage,
+            and_(PathSegmentCoverage.segment_id == PathSegment.id, PathSegmentCoverage.buffer_m == buffer_m)
+        )
+    return query.outerjoin(
+        PathCoverageProfile,
+        and_(PathCoverageProfile.path_id == Path.id, PathCoverageProfile.buffer_m == buffer_m)
+    )
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[tuple[float, float, float, float]]:
+    """Parse a "west,south,east,north" bounding box in degrees."""
+    if bbox is None:
+        return None
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if not all(map(math.isfinite, (west, south, east, north))) or west >= east or south >= north:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    return west, south, east, north
+
+
+def zoom_geometry(geometry, zoom: Optional[int]):
+    """
+    GeoJSON of a geometry at the resolution of a map zoom level.
+
+    Simplified with ST_SimplifyPreserveTopology to one pixel at that zoom,
+    with coordinates rounded to match. Without zoom, full resolution.
+    """
+    if zoom is None:
+        return func.ST_AsGeoJSON(geometry)
+
+    pixel_degrees = 360.0 / (TILE_SIZE * 2 ** zoom)
+    decimals = max(0, math.ceil(-math.log10(pixel_degrees)))
+    return func.ST_AsGeoJSON(func.ST_SimplifyPreserveTopology(geometry, pixel_degrees), decimals)
+
+
+def path_properties(p) -> dict:
+    """GeoJSON properties of a path row from /api/paths or /api/paths/excluded."""
+    return {
+        "id": p.id,
+        "source_fid": p.source_fid,
+        "route_code": p.route_code,
+        "name": p.name,
+        "path_type": p.path_type,
+        "area": p.area,
+        "length_km": round(p.length_km, 3) if p.length_km else None,
+        "is_ridden": p.is_ridden or False,
+        "coverage_fraction": round(p.coverage_fraction, 3) if p.coverage_fraction else 0.0,
+        "last_ridden_date": p.last_ridden_date.isoformat() if p.last_ridden_date else None
+    }
+
+
+def isoformat_sql(column):
+    """datetime.isoformat() of a timestamp column in SQL: microseconds only when non-zero."""
+    seconds = 'YYYY-MM-DD"T"HH24:MI:SS'
+    return case(
+        (column == func.date_trunc("second", column), func.to_char(column, seconds)),
+        else_=func.to_char(column, seconds + ".US")
+    )
+
+
+def path_properties_sql(rows) -> dict:
+    """path_properties() as SQL expressions on a subquery of the same columns."""
+    return {
+        "id": rows.c.id,
+        "source_fid": rows.c.source_fid,
+        "route_code": rows.c.route_code,
+        "name": rows.c.name,
+        "path_type": rows.c.path_type,
+        "area": rows.c.area,
+        "length_km": case((rows.c.length_km != 0, func.round(cast(rows.c.length_km, Numeric), 3))),
+        "is_ridden": rows.c.is_ridden,
+        "coverage_fraction": func.round(cast(rows.c.coverage_fraction, Numeric), 3),
+        "last_ridden_date": isoformat_sql(rows.c.last_ridden_date)
+    }
+
+
+def path_collection_response(cached: CacheLookup, db: Session, query):
+    """
+    Respond with a FeatureCollection of path rows, assembled as PATHS_GEOJSON_ASSEMBLY says.
+
+    "database" has PostgreSQL build the whole document in one query, so
+    there is no per-feature work in Python; anything else streams it.
+    """
+    if PATHS_GEOJSON_ASSEMBLY == "database":
+        rows = query.subquery("path_rows")
+        body = db.execute(feature_collection_sql(rows, path_properties_sql(rows), rows.c.geometry)).scalar()
+        return cached.store_body(body.encode(), "application/json")
+    return cached.stream(stream_feature_collection(query.statement, path_properties))
+
+
+def filter_paths(
+    query,
+    is_ridden,
+    coverage_fraction,
+    area: Optional[list[str]] = None,
+    path_type: Optional[list[str]] = None,
+    ridden: Optional[bool] = None,
+    min_coverage: Optional[float] = None
+):
+    """Apply the /api/paths filters to a query. Footpaths are always excluded."""
+    query = query.filter(Path.path_type != "Footpath")
+
+    if area:
+        query = query.filter(Path.area.in_(area))
+    if path_type:
+        query = query.filter(Path.path_type.in_(path_type))
+    if ridden is not None:
+        query = query.filter(is_ridden == ridden)
+    if min_coverage is not None:
+        query = query.filter(coverage_fraction >= min_coverage)
+
+    return query
+
 
 @router.get("/paths/excluded")
 def get_excluded_paths(
+    request: Request,
+    buffer: Optional[int] = BUFFER_QUERY,
     db: Session = Depends(get_db)
 ):
     """
     Get excluded paths (footpaths) as GeoJSON FeatureCollection.
     Used for reviewing what has been filtered out.
+
+    Streamed like /api/paths.
     """
+    cached = lookup_cached_response(request, db)
+    if cached.response:
+        return cached.response
+
+    buffer_m = resolve_buffer(buffer)
+    is_ridden, coverage_fraction, last_ridden_date = coverage_columns(buffer_m)
+
     query = db.query(
         Path.id,
         Path.source_fid,
@@ -27,49 +202,29 @@ def get_excluded_paths(
         Path.path_type,
         Path.area,
         Path.length_km,
-        Path.is_ridden,
-        Path.coverage_fraction,
-        Path.last_ridden_date,
+        is_ridden,
+        coverage_fraction,
+        last_ridden_date,
         func.ST_AsGeoJSON(Path.geometry).label("geometry")
     )
+    query = join_coverage_profile(query, buffer_m)
 
     # Only return footpaths (excluded from main view)
     query = query.filter(Path.path_type == "Footpath")
 
-    paths = query.all()
-
-    features = []
-    for p in paths:
-        feature = {
-            "type": "Feature",
-            "properties": {
-                "id": p.id,
-                "source_fid": p.source_fid,
-                "route_code": p.route_code,
-                "name": p.name,
-                "path_type": p.path_type,
-                "area": p.area,
-                "length_km": round(p.length_km, 3) if p.length_km else None,
-                "is_ridden": p.is_ridden or False,
-                "coverage_fraction": round(p.coverage_fraction, 3) if p.coverage_fraction else 0.0,
-                "last_ridden_date": p.last_ridden_date.isoformat() if p.last_ridden_date else None
-            },
-            "geometry": json.loads(p.geometry) if p.geometry else None
-        }
-        features.append(feature)
-
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    return path_collection_response(cached, db, query)
 
 
 @router.get("/paths")
 def get_paths(
+    request: Request,
     area: Optional[list[str]] = Query(None),
     path_type: Optional[list[str]] = Query(None),
     ridden: Optional[bool] = Query(None, description="Filter by ridden status"),
     min_coverage: Optional[float] = Query(None, ge=0, le=1, description="Minimum coverage fraction (0-1)"),
+    buffer: Optional[int] = BUFFER_QUERY,
+    bbox: Optional[str] = Query(None, description="Only paths in this box: west,south,east,north (degrees)"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom level to simplify geometry for"),
     db: Session = Depends(get_db)
 ):
     """
@@ -80,7 +235,22 @@ def get_paths(
     - path_type: Filter by path type(s) - can be specified multiple times
     - ridden: Filter by ridden status (true/false)
     - min_coverage: Filter paths with coverage >= this value (0-1)
+    - buffer: Coverage buffer width in meters (defaults to the standard width)
+    - bbox: Only paths whose bounding box overlaps west,south,east,north
+    - zoom: Simplify geometry to one pixel at this map zoom level
+
+    The FeatureCollection is streamed from a server-side cursor as rows
+    arrive, or built by PostgreSQL with PATHS_GEOJSON_ASSEMBLY=database.
+    Responses are cached until the data changes, with an ETag.
     """
+    cached = lookup_cached_response(request, db)
+    if cached.response:
+        return cached.response
+
+    buffer_m = resolve_buffer(buffer)
+    bounds = parse_bbox(bbox)
+    is_ridden, coverage_fraction, last_ridden_date = coverage_columns(buffer_m)
+
     query = db.query(
         Path.id,
         Path.source_fid,
@@ -89,43 +259,65 @@ def get_paths(
         Path.path_type,
         Path.area,
         Path.length_km,
-        Path.is_ridden,
-        Path.coverage_fraction,
-        Path.last_ridden_date,
-        func.ST_AsGeoJSON(Path.geometry).label("geometry")
+        is_ridden,
+        coverage_fraction,
+        last_ridden_date,
+        zoom_geometry(Path.geometry, zoom).label("geometry")
     )
+    query = join_coverage_profile(query, buffer_m)
+    query = filter_paths(query, is_ridden, coverage_fraction, area, path_type, ridden, min_coverage)
 
-    # Always exclude footpaths
-    query = query.filter(Path.path_type != "Footpath")
+    # Bounding box overlap, answered from the GIST index on geometry
+    if bounds:
+        query = query.filter(Path.geometry.op("&&")(func.ST_MakeEnvelope(*bounds, 4326)))
 
-    if area:
-        query = query.filter(Path.area.in_(area))
-    if path_type:
-        query = query.filter(Path.path_type.in_(path_type))
-    if ridden is not None:
-        query = query.filter(Path.is_ridden == ridden)
-    if min_coverage is not None:
-        query = query.filter(Path.coverage_fraction >= min_coverage)
+    return path_collection_response(cached, db, query)
 
-    paths = query.all()
+
+@router.get("/paths/{path_id}/segments")
+def get_path_segments(
+    path_id: int,
+    buffer: Optional[int] = BUFFER_QUERY,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the coverage segments of a path as GeoJSON FeatureCollection.
+
+    Each ~50 m segment carries its own ridden flag, so partially ridden
+    paths can be drawn without any geometry processing at request time.
+    """
+    buffer_m = resolve_buffer(buffer)
+    is_ridden, coverage_fraction, last_ridden_date = coverage_columns(buffer_m, segments=True)
+
+    if not db.query(Path.id).filter(Path.id == path_id).first():
+        raise HTTPException(status_code=404, detail="Path not found")
+
+    query = db.query(
+        PathSegment.id,
+        PathSegment.seq,
+        PathSegment.length_m,
+        is_ridden,
+        coverage_fraction,
+        last_ridden_date,
+        func.ST_AsGeoJSON(func.ST_Transform(PathSegment.geometry, 4326)).label("geometry")
+    )
+    query = join_coverage_profile(query, buffer_m, segments=True)
+    segments = query.filter(PathSegment.path_id == path_id).order_by(PathSegment.seq).all()
 
     features = []
-    for p in paths:
+    for s in segments:
         feature = {
             "type": "Feature",
             "properties": {
-                "id": p.id,
-                "source_fid": p.source_fid,
-                "route_code": p.route_code,
-                "name": p.name,
-                "path_type": p.path_type,
-                "area": p.area,
-                "length_km": round(p.length_km, 3) if p.length_km else None,
-                "is_ridden": p.is_ridden or False,
-                "coverage_fraction": round(p.coverage_fraction, 3) if p.coverage_fraction else 0.0,
-                "last_ridden_date": p.last_ridden_date.isoformat() if p.last_ridden_date else None
+                "id": s.id,
+                "path_id": path_id,
+                "seq": s.seq,
+                "length_m": round(s.length_m, 1) if s.length_m else None,
+                "is_ridden": s.is_ridden or False,
+                "coverage_fraction": round(s.coverage_fraction, 3) if s.coverage_fraction else 0.0,
+                "last_ridden_date": s.last_ridden_date.isoformat() if s.last_ridden_date else None
             },
-            "geometry": json.loads(p.geometry) if p.geometry else None
+            "geometry": json.loads(s.geometry) if s.geometry else None
         }
         features.append(feature)
 
@@ -135,6 +327,71 @@ def get_paths(
     }
 
 
+@router.get("/paths/{path_id}/rides", response_model=PathRidesResponse)
+def get_path_rides(
+    path_id: int,
+    buffer: Optional[int] = BUFFER_QUERY,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the rides that covered a path, most recent first.
+
+    Served from path_ride_coverage, which is updated when rides are uploaded
+    and deleted, so this is an index lookup rather than a spatial query.
+    path_ride_coverage holds the part of the path within the widest buffer;
+    for a narrower buffer covered_length_m is that part clipped to the
+    ride's stored buffer of the requested width.
+    """
+    buffer_m = resolve_buffer(buffer)
+
+    if not db.query(Path.id).filter(Path.id == path_id).first():
+        raise HTTPException(status_code=404, detail="Path not found")
+
+    narrower = buffer_m != COVERAGE_MAX_BUFFER_METERS
+    if narrower:
+        covered_length = func.ST_Length(func.ST_Intersection(PathRideCoverage.geometry, RideBuffer.geometry))
+    else:
+        covered_length = PathRideCoverage.covered_length_m
+
+    query = db.query(
+        PathRideCoverage.ride_id,
+        Ride.filename,
+        PathRideCoverage.ride_date,
+        Ride.distance_km,
+        covered_length.label("covered_length_m"),
+        PathRideCoverage.distance_m
+    ).join(
+        Ride, Ride.id == PathRideCoverage.ride_id
+    )
+    if narrower:
+        query = query.outerjoin(
+            RideBuffer,
+            and_(RideBuffer.ride_id == PathRideCoverage.ride_id, RideBuffer.buffer_m == buffer_m)
+        )
+
+    rows = query.filter(
+        PathRideCoverage.path_id == path_id,
+        PathRideCoverage.distance_m <= buffer_m
+    ).order_by(
+        PathRideCoverage.ride_date.desc().nullslast(),
+        PathRideCoverage.ride_id.desc()
+    ).all()
+
+    rides = [
+        PathRide(
+            ride_id=r.ride_id,
+            filename=r.filename,
+            date_recorded=r.ride_date,
+            distance_km=r.distance_km or 0.0,
+            covered_length_m=round(r.covered_length_m or 0.0, 1),
+            distance_m=round(r.distance_m, 1) if r.distance_m is not None else None
+        )
+        for r in rows
+    ]
+
+    return PathRidesResponse(path_id=path_id, buffer_m=buffer_m, rides=rides, total=len(rides))
+
+
 @router.get("/path-types")
 def get_path_types(db: Session = Depends(get_db)):
     types = db.query(Path.path_type).filter(Path.path_type != "Footpath").distinct().order_by(Path.path_type).all()
@@ -2,18 +2,17 @@
 Rides API endpoints for GPX upload and management.
 """
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from geoalchemy2 import WKTElement
 from typing import Optional
-import hashlib
-import json
-import gpxpy
-import gpxpy.gpx
+from urllib.parse import quote
+import asyncio
+import unicodedata
+import zipfile
 import logging
-from pathlib import Path
-from datetime import datetime
 
 from app.db import get_db
 from app.models import Ride
@@ -22,130 +21,153 @@ from app.schemas import (
     RideListResponse,
     RideUploadResult,
     RideUploadResponse,
-    CoverageRecomputeResponse
+    CoverageJobResponse
 )
-from app.services.coverage import recompute_coverage
-from app.config import GPX_STORAGE_DIR
+from app.services.coverage import (
+    get_ride_path_ids,
+    COVERAGE_BUFFER_METERS,
+    COVERAGE_BUFFER_PROFILES,
+    COVERAGE_MIN_FRACTION
+)
+from app.services.gpx import hash_and_parse_gpx, fingerprint_candidates, get_parse_pool
+from app.services.coverage_jobs import CoverageJob, submit_coverage_job, get_coverage_job
+from app.services.gpx_store import store_gpx, gpx_object_path, find_legacy_gpx, iter_gpx
+from app.services.ride_import import import_gpx_entries, iter_zip_gpx
+from app.services.geojson import stream_feature_collection
+from app.services.response_cache import lookup_cached_response, bump_data_version
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Ride geometry served per map zoom band:
+# (level, min zoom, max zoom, column, GeoJSON decimal places)
+RIDE_LOD_BANDS = [
+    ("low", 0, 10, Ride.geometry_low, 4),
+    ("medium", 11, 13, Ride.geometry_medium, 5),
+    ("high", 14, 15, Ride.geometry_high, 6),
+    ("full", 16, 30, Ride.geometry, 6)
+]
+
+
+def ride_lod_band(zoom: int) -> tuple:
+    """Pick the level of detail for a map zoom level."""
+    for band in RIDE_LOD_BANDS:
+        if zoom <= band[2]:
+            return band
+    return RIDE_LOD_BANDS[-1]
+
+
+def ride_properties(r) -> dict:
+    """GeoJSON properties of a ride row from /api/rides/geojson."""
+    return {
+        "id": r.id,
+        "filename": r.filename,
+        "date_recorded": r.date_recorded.isoformat() if r.date_recorded else None,
+        "distance_km": r.distance_km,
+        "elevation_gain_m": r.elevation_gain_m
+    }
+
+
+def coverage_job_response(job: CoverageJob) -> CoverageJobResponse:
+    """Build the API representation of a coverage job."""
+    return CoverageJobResponse(
+        job_id=job.id,
+        status=job.status,
+        full_recompute=job.full_recompute,
+        ride_count=len(job.ride_ids),
+        path_count=len(job.path_ids),
+        merged_requests=job.requests,
+        paths_updated=job.paths_updated,
+        error=job.error,
+        tiles_total=job.tiles_total,
+        tiles_done=len(job.tiles),
+        tiles=list(job.tiles),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
 
-def save_gpx_to_disk(content: bytes, filename: str, file_hash: str) -> Optional[Path]:
+def store_uploaded_ride(db: Session, filename: str, parsed, content: Optional[bytes] = None) -> RideUploadResult:
     """
-    Save GPX file to disk in the configured storage directory.
+    Store one hashed and parsed upload as a Ride record.
 
     Args:
-        content: The GPX file content
+        db: Database session
         filename: Original filename
-        file_hash: SHA256 hash of the file (first 8 chars used for uniqueness)
+        parsed: hash_and_parse_gpx() result, or the exception it raised
+        content: The GPX file content, archived once the ride is stored.
+            None if the caller archives the file itself.
 
     Returns:
-        Path to saved file, or None if save failed
+        Upload result for the file.
     """
-    try:
-        # Ensure storage directory exists
-        GPX_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+    if isinstance(parsed, Exception):
+        logger.error(f"Error processing GPX file {filename}: {parsed}")
+        return RideUploadResult(filename=filename, status="error", message=str(parsed))
 
-        # Create a unique filename using hash prefix and timestamp
-        # Format: YYYYMMDD_HHMMSS_hash8chars_originalname.gpx
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        hash_prefix = file_hash[:8]
+    file_hash, (wkb, date_recorded, distance_km, elevation_gain, fingerprint) = parsed
 
-        # Clean the original filename (remove path, ensure .gpx extension)
-        clean_filename = Path(filename).name
-        if not clean_filename.lower().endswith('.gpx'):
-            clean_filename += '.gpx'
+    try:
+        # Check for duplicate
+        existing = db.query(Ride).filter(Ride.file_hash == file_hash).first()
+        if existing:
+            return RideUploadResult(
+                filename=filename,
+                status="skipped_duplicate",
+                message=f"Duplicate file (matches ride ID {existing.id})"
+            )
 
-        # Create final filename
-        final_filename = f"{timestamp}_{hash_prefix}_{clean_filename}"
-        filepath = GPX_STORAGE_DIR / final_filename
+        if fingerprint:
+            same_track = db.query(Ride.id).filter(
+                Ride.track_fingerprint.in_(fingerprint_candidates(fingerprint))
+            ).first()
+            if same_track:
+                return RideUploadResult(
+                    filename=filename,
+                    status="skipped_duplicate",
+                    message=f"Same activity as ride ID {same_track.id} (exported differently)"
+                )
 
-        # Write file
-        filepath.write_bytes(content)
-        logger.info(f"Saved GPX file to {filepath}")
+        if not wkb:
+            return RideUploadResult(
+                filename=filename,
+                status="error",
+                message="No valid track or route data found in GPX file"
+            )
 
-        return filepath
+        # Create Ride record
+        ride = Ride(
+            filename=filename,
+            file_hash=file_hash,
+            track_fingerprint=fingerprint,
+            date_recorded=date_recorded,
+            distance_km=round(distance_km, 3),
+            elevation_gain_m=round(elevation_gain, 1) if elevation_gain else None,
+            geometry=func.ST_GeomFromWKB(wkb, 4326)
+        )
 
-    except Exception as e:
-        logger.error(f"Failed to save GPX file to disk: {e}")
-        return None
+        db.add(ride)
+        db.commit()
+        db.refresh(ride)
+        bump_data_version(db)
 
+        # Archive the original file
+        if content is not None and not store_gpx(content, file_hash):
+            logger.warning(f"GPX file {filename} imported to database but failed to archive")
 
-def parse_gpx_file(content: bytes) -> tuple[Optional[str], Optional[str], float, Optional[float]]:
-    """
-    Parse GPX file content and extract geometry and metadata.
+        return RideUploadResult(
+            filename=filename,
+            status="imported",
+            message=f"Imported successfully ({distance_km:.2f} km)",
+            ride_id=ride.id
+        )
 
-    Returns:
-        Tuple of (wkt_geometry, date_recorded, distance_km, elevation_gain_m)
-    """
-    gpx = gpxpy.parse(content.decode('utf-8'))
-
-    all_coords = []
-    total_distance = 0.0
-    elevation_gain = 0.0
-    min_time = None
-    prev_elevation = None
-
-    # Process all tracks
-    for track in gpx.tracks:
-        for segment in track.segments:
-            segment_coords = []
-            for i, point in enumerate(segment.points):
-                segment_coords.append((point.longitude, point.latitude))
-
-                # Track time for date_recorded
-                if point.time:
-                    if min_time is None or point.time < min_time:
-                        min_time = point.time
-
-                # Calculate elevation gain
-                if point.elevation is not None:
-                    if prev_elevation is not None:
-                        elev_diff = point.elevation - prev_elevation
-                        if elev_diff > 0:
-                            elevation_gain += elev_diff
-                    prev_elevation = point.elevation
-
-            if len(segment_coords) >= 2:
-                all_coords.append(segment_coords)
-
-            # Calculate distance using gpxpy's built-in method
-            total_distance += segment.length_3d() if segment.has_elevations() else segment.length_2d()
-
-    # Also process waypoints if there are routes but no tracks
-    if not all_coords:
-        for route in gpx.routes:
-            route_coords = []
-            for point in route.points:
-                route_coords.append((point.longitude, point.latitude))
-                if point.time:
-                    if min_time is None or point.time < min_time:
-                        min_time = point.time
-            if len(route_coords) >= 2:
-                all_coords.append(route_coords)
-
-    if not all_coords:
-        return None, None, 0.0, None
-
-    # Convert to WKT MultiLineString
-    if len(all_coords) == 1:
-        # Single linestring
-        coords_str = ", ".join(f"{lon} {lat}" for lon, lat in all_coords[0])
-        wkt = f"MULTILINESTRING(({coords_str}))"
-    else:
-        # Multiple linestrings
-        linestrings = []
-        for coords in all_coords:
-            coords_str = ", ".join(f"{lon} {lat}" for lon, lat in coords)
-            linestrings.append(f"({coords_str})")
-        wkt = f"MULTILINESTRING({', '.join(linestrings)})"
-
-    date_recorded = min_time.isoformat() if min_time else None
-    distance_km = total_distance / 1000.0  # Convert meters to km
-
-    return wkt, date_recorded, distance_km, elevation_gain if elevation_gain > 0 else None
+    except Exception as e:
+        logger.error(f"Error processing GPX file {filename}: {e}")
+        db.rollback()
+        return RideUploadResult(filename=filename, status="error", message=str(e))
 
 
 @router.post("/rides/upload", response_model=RideUploadResponse)
@@ -156,97 +178,88 @@ async def upload_rides(
     """
     Upload one or more GPX files.
 
-    Each GPX file is parsed and stored as a Ride record.
-    After upload, coverage is recomputed for all paths.
+    Each GPX file is parsed and stored as a Ride record. Hashing and parsing
+    run in parallel in the GPX process pool, and the database writes in a
+    worker thread, so large uploads don't block the event loop.
+    Coverage for the paths near the new rides is recomputed by a background
+    job; poll /api/coverage/jobs/{coverage_job_id} for its progress.
     """
+    filenames = [file.filename or "unknown.gpx" for file in files]
+    contents = [await file.read() for file in files]
+
+    loop = asyncio.get_running_loop()
+    pool = get_parse_pool()
+    parsed = await asyncio.gather(
+        *(loop.run_in_executor(pool, hash_and_parse_gpx, content) for content in contents),
+        return_exceptions=True
+    )
+
+    # Stored one at a time so duplicates within the batch are detected
     results = []
-    imported = 0
-    skipped = 0
-    errors = 0
-
-    for file in files:
-        try:
-            # Read file content
-            content = await file.read()
-
-            # Calculate file hash for deduplication
-            file_hash = hashlib.sha256(content).hexdigest()
-
-            # Check for duplicate
-            existing = db.query(Ride).filter(Ride.file_hash == file_hash).first()
-            if existing:
-                results.append(RideUploadResult(
-                    filename=file.filename or "unknown",
-                    status="skipped_duplicate",
-                    message=f"Duplicate file (matches ride ID {existing.id})"
-                ))
-                skipped += 1
-                continue
-
-            # Parse GPX content
-            wkt, date_recorded, distance_km, elevation_gain = parse_gpx_file(content)
-
-            if not wkt:
-                results.append(RideUploadResult(
-                    filename=file.filename or "unknown",
-                    status="error",
-                    message="No valid track or route data found in GPX file"
-                ))
-                errors += 1
-                continue
-
-            # Create Ride record
-            ride = Ride(
-                filename=file.filename or "unknown.gpx",
-                file_hash=file_hash,
-                date_recorded=date_recorded,
-                distance_km=round(distance_km, 3),
-                elevation_gain_m=round(elevation_gain, 1) if elevation_gain else None,
-                geometry=WKTElement(wkt, srid=4326)
-            )
+    for filename, content, parsed_file in zip(filenames, contents, parsed):
+        results.append(await run_in_threadpool(store_uploaded_ride, db, filename, parsed_file, content))
 
-            db.add(ride)
-            db.commit()
-            db.refresh(ride)
-
-            # Save GPX file to disk
-            saved_path = save_gpx_to_disk(content, file.filename or "unknown.gpx", file_hash)
-            if saved_path:
-                logger.info(f"GPX file saved to {saved_path}")
-            else:
-                logger.warning(f"GPX file {file.filename} imported to database but failed to save to disk")
-
-            results.append(RideUploadResult(
-                filename=file.filename or "unknown",
-                status="imported",
-                message=f"Imported successfully ({distance_km:.2f} km)",
-                ride_id=ride.id
-            ))
-            imported += 1
-
-        except Exception as e:
-            logger.error(f"Error processing GPX file {file.filename}: {e}")
-            results.append(RideUploadResult(
-                filename=file.filename or "unknown",
-                status="error",
-                message=str(e)
-            ))
-            errors += 1
-            db.rollback()
-
-    # Recompute coverage if any rides were imported
-    if imported > 0:
-        try:
-            recompute_coverage(db)
-        except Exception as e:
-            logger.error(f"Error recomputing coverage: {e}")
+    imported_ride_ids = [r.ride_id for r in results if r.status == "imported"]
+    skipped = sum(1 for r in results if r.status == "skipped_duplicate")
+    errors = sum(1 for r in results if r.status == "error")
+
+    # Queue coverage for paths near the new rides only
+    coverage_job_id = None
+    if imported_ride_ids:
+        coverage_job_id = submit_coverage_job(ride_ids=imported_ride_ids).id
 
     return RideUploadResponse(
         total_files=len(files),
-        imported=imported,
+        imported=len(imported_ride_ids),
         skipped=skipped,
         errors=errors,
-        results=results
+        results=results,
+        coverage_job_id=coverage_job_id
+    )
+
+
+@router.post("/rides/upload-zip", response_model=RideUploadResponse)
+async def upload_rides_zip(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload a ZIP export (e.g. Strava or Garmin bulk export) of GPX files.
+
+    The archive is spooled to a temporary file and read member by member;
+    .gpx and .gpx.gz members are parsed in the GPX process pool and stored
+    in batches. Coverage is queued for each batch as soon as it is
+    committed, so rides already stored get coverage even if a later part of
+    the import fails.
+    """
+    if not zipfile.is_zipfile(file.file):
+        raise HTTPException(status_code=400, detail="Not a ZIP archive")
+    file.file.seek(0)
+
+    coverage_jobs = []
+
+    def queue_coverage(ride_ids: list[int]):
+        coverage_jobs.append(submit_coverage_job(ride_ids=ride_ids))
+
+    results = await run_in_threadpool(import_gpx_entries, db, iter_zip_gpx(file.file), on_batch=queue_coverage)
+    results = [RideUploadResult(**r) for r in results]
+
+    imported_ride_ids = [r.ride_id for r in results if r.status == "imported"]
+    if imported_ride_ids:
+        await run_in_threadpool(bump_data_version, db)
+    skipped = sum(1 for r in results if r.status == "skipped_duplicate")
+    errors = sum(1 for r in results if r.status == "error")
+
+    # Jobs run in order, so the last one finishing means all are done
+    coverage_job_id = coverage_jobs[-1].id if coverage_jobs else None
+
+    return RideUploadResponse(
+        total_files=len(results),
+        imported=len(imported_ride_ids),
+        skipped=skipped,
+        errors=errors,
+        results=results,
+        coverage_job_id=coverage_job_id
     )
 
 
@@ -280,72 +293,170 @@ def get_rides(db: Session = Depends(get_db)):
 
 
 @router.get("/rides/geojson")
-def get_rides_geojson(db: Session = Depends(get_db)):
+def get_rides_geojson(
+    request: Request,
+    zoom: Optional[int] = Query(None, ge=0, le=30, description="Map zoom level, selects the level of detail"),
+    db: Session = Depends(get_db)
+):
     """
     Get all rides as a GeoJSON FeatureCollection.
+
+    With zoom, rides are served from the pre-simplified geometry for that
+    zoom band (see RIDE_LOD_BANDS) with coordinates rounded to match, and
+    the band is returned as "lod" so the client knows when to reload.
+    Without zoom, full-resolution geometry is returned.
+
+    The FeatureCollection is streamed from a server-side cursor.
     """
-    rides = db.query(
+    cached = lookup_cached_response(request, db)
+    if cached.response:
+        return cached.response
+
+    members = {}
+    column, decimals = Ride.geometry, None
+    if zoom is not None:
+        level, min_zoom, max_zoom, column, decimals = ride_lod_band(zoom)
+        members["lod"] = {"level": level, "min_zoom": min_zoom, "max_zoom": max_zoom}
+    geometry = func.ST_AsGeoJSON(column) if decimals is None else func.ST_AsGeoJSON(column, decimals)
+
+    query = db.query(
         Ride.id,
         Ride.filename,
         Ride.date_recorded,
         Ride.distance_km,
         Ride.elevation_gain_m,
-        func.ST_AsGeoJSON(Ride.geometry).label('geojson')
-    ).filter(Ride.geometry.isnot(None)).all()
-
-    features = []
-    for r in rides:
-        if r.geojson:
-            features.append({
-                "type": "Feature",
-                "properties": {
-                    "id": r.id,
-                    "filename": r.filename,
-                    "date_recorded": r.date_recorded.isoformat() if r.date_recorded else None,
-                    "distance_km": r.distance_km,
-                    "elevation_gain_m": r.elevation_gain_m
-                },
-                "geometry": json.loads(r.geojson)
-            })
+        geometry.label('geojson')
+    ).filter(column.isnot(None))
 
-    return {
-        "type": "FeatureCollection",
-        "features": features
+    return cached.stream(stream_feature_collection(query.statement, ride_properties, members, geometry_column="geojson"))
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows a gzip response.
+
+    Every coding is read first: an explicit gzip entry takes precedence over
+    *, and a coding with q=0 (or an unreadable q) refuses it.
+    """
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+
+    quality = qualities.get("gzip", qualities.get("*", 0.0))
+    return quality > 0
+
+
+def attachment_disposition(filename: str) -> str:
+    """
+    Content-Disposition header value for downloading a file under its stored name.
+
+    Control characters are dropped and the plain filename parameter is
+    reduced to printable ASCII without quotes or backslashes; the full name
+    goes in an RFC 5987 filename* parameter.
+    """
+    name = "".join(c for c in filename if unicodedata.category(c)[0] != "C") or "ride.gpx"
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in name)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+@router.get("/rides/{ride_id}/gpx")
+def download_ride_gpx(ride_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Download the original GPX file of a ride.
+
+    Archived files are sent as stored (gzip) when the client accepts gzip,
+    which lets the server use sendfile; otherwise they are decompressed
+    while streaming.
+    """
+    ride = db.query(Ride.filename, Ride.file_hash).filter(Ride.id == ride_id).first()
+    if not ride:
+        raise HTTPException(status_code=404, detail="Ride not found")
+
+    path = gpx_object_path(ride.file_hash) if ride.file_hash else None
+    if path is None or not path.exists():
+        path = find_legacy_gpx(ride.file_hash) if ride.file_hash else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="GPX file not found")
+
+    headers = {
+        "Content-Disposition": attachment_disposition(ride.filename),
+        "Vary": "Accept-Encoding"
     }
+    compressed = path.name.endswith(".gz")
+
+    if not compressed or accepts_gzip(request.headers.get("accept-encoding", "")):
+        if compressed:
+            headers["Content-Encoding"] = "gzip"
+        return FileResponse(path, media_type="application/gpx+xml", headers=headers)
+
+    return StreamingResponse(iter_gpx(path), media_type="application/gpx+xml", headers=headers)
 
 
 @router.delete("/rides/{ride_id}")
 def delete_ride(ride_id: int, db: Session = Depends(get_db)):
     """
-    Delete a ride and recompute coverage.
+    Delete a ride and recompute coverage for the paths it covered.
     """
     ride = db.query(Ride).filter(Ride.id == ride_id).first()
     if not ride:
         raise HTTPException(status_code=404, detail="Ride not found")
 
+    # The ride's buffer and path contributions are removed with it
+    path_ids = get_ride_path_ids(db, ride_id)
+
     db.delete(ride)
     db.commit()
+    bump_data_version(db)
 
-    # Recompute coverage
-    try:
-        recompute_coverage(db)
-    except Exception as e:
-        logger.error(f"Error recomputing coverage after delete: {e}")
+    # Queue coverage refresh for the paths the ride covered
+    job = submit_coverage_job(path_ids=path_ids)
 
-    return {"message": f"Ride {ride_id} deleted", "id": ride_id}
+    return {"message": f"Ride {ride_id} deleted", "id": ride_id, "coverage_job_id": job.id}
 
 
-@router.post("/coverage/recompute", response_model=CoverageRecomputeResponse)
-def recompute_coverage_endpoint(db: Session = Depends(get_db)):
+@router.post("/coverage/recompute", response_model=CoverageJobResponse)
+def recompute_coverage_endpoint():
     """
     Manually trigger coverage recomputation for all paths.
+
+    The recompute runs in the background; the returned job can be polled
+    via /api/coverage/jobs/{job_id}.
     """
-    try:
-        paths_updated = recompute_coverage(db)
-        return CoverageRecomputeResponse(
-            paths_updated=paths_updated,
-            message="Coverage recomputed successfully"
-        )
-    except Exception as e:
-        logger.error(f"Error in coverage recomputation: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    job = submit_coverage_job(full_recompute=True)
+    return coverage_job_response(job)
+
+
+@router.get("/coverage/jobs/{job_id}", response_model=CoverageJobResponse)
+def get_coverage_job_status(job_id: str):
+    """
+    Get the status of a coverage job.
+    """
+    job = get_coverage_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Coverage job not found")
+
+    return coverage_job_response(job)
+
+
+@router.get("/coverage/profiles")
+def get_coverage_profiles():
+    """
+    List the buffer widths coverage is computed for.
+
+    Any of them can be passed as ?buffer= to /api/paths and /api/stats.
+    """
+    return {
+        "buffers_m": list(COVERAGE_BUFFER_PROFILES),
+        "default_buffer_m": COVERAGE_BUFFER_METERS,
+        "min_fraction": COVERAGE_MIN_FRACTION
+    }
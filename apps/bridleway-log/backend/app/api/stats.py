@@ -1,18 +1,35 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
+from typing import Optional
 
 from app.db import get_db
 from app.models import Path
+from app.api.paths import BUFFER_QUERY, resolve_buffer, coverage_columns, join_coverage_profile
+from app.services.response_cache import lookup_cached_response
 
 router = APIRouter()
 
 
 @router.get("/stats")
-def get_stats(db: Session = Depends(get_db)):
+def get_stats(
+    request: Request,
+    buffer: Optional[int] = BUFFER_QUERY,
+    db: Session = Depends(get_db)
+):
     """
     Get aggregated statistics including coverage data.
+
+    Query parameters:
+    - buffer: Coverage buffer width in meters (defaults to the standard width)
     """
+    cached = lookup_cached_response(request, db)
+    if cached.response:
+        return cached.response
+
+    buffer_m = resolve_buffer(buffer)
+    is_ridden = coverage_columns(buffer_m)[0]
+
     # Base filter: exclude footpaths
     base_filter = Path.path_type != "Footpath"
 
@@ -21,10 +38,14 @@ def get_stats(db: Session = Depends(get_db)):
     total_length = db.query(func.sum(Path.length_km)).filter(base_filter).scalar() or 0
 
     # Coverage counts (excluding footpaths)
-    ridden_paths = db.query(func.count(Path.id)).filter(base_filter, Path.is_ridden == True).scalar() or 0
+    ridden_paths = join_coverage_profile(
+        db.query(func.count(Path.id)), buffer_m
+    ).filter(base_filter, is_ridden == True).scalar() or 0
     not_ridden_paths = total_paths - ridden_paths
 
-    ridden_length = db.query(func.sum(Path.length_km)).filter(base_filter, Path.is_ridden == True).scalar() or 0
+    ridden_length = join_coverage_profile(
+        db.query(func.sum(Path.length_km)), buffer_m
+    ).filter(base_filter, is_ridden == True).scalar() or 0
     not_ridden_length = total_length - ridden_length
 
     # Stats by path type (including coverage, excluding footpaths)
@@ -32,9 +53,10 @@ def get_stats(db: Session = Depends(get_db)):
         Path.path_type,
         func.count(Path.id).label('count'),
         func.sum(Path.length_km).label('length'),
-        func.count(Path.id).filter(Path.is_ridden == True).label('ridden_count'),
-        func.sum(Path.length_km).filter(Path.is_ridden == True).label('ridden_length')
-    ).filter(base_filter).group_by(Path.path_type).all()
+        func.count(Path.id).filter(is_ridden == True).label('ridden_count'),
+        func.sum(Path.length_km).filter(is_ridden == True).label('ridden_length')
+    )
+    by_type_query = join_coverage_profile(by_type_query, buffer_m).filter(base_filter).group_by(Path.path_type).all()
 
     by_type = {}
     for path_type, count, length, ridden_count, ridden_len in by_type_query:
@@ -52,9 +74,10 @@ def get_stats(db: Session = Depends(get_db)):
         Path.area,
         func.count(Path.id).label('count'),
         func.sum(Path.length_km).label('length'),
-        func.count(Path.id).filter(Path.is_ridden == True).label('ridden_count'),
-        func.sum(Path.length_km).filter(Path.is_ridden == True).label('ridden_length')
-    ).filter(base_filter).group_by(Path.area).all()
+        func.count(Path.id).filter(is_ridden == True).label('ridden_count'),
+        func.sum(Path.length_km).filter(is_ridden == True).label('ridden_length')
+    )
+    by_area_query = join_coverage_profile(by_area_query, buffer_m).filter(base_filter).group_by(Path.area).all()
 
     by_area = {}
     for area, count, length, ridden_count, ridden_len in by_area_query:
@@ -67,7 +90,7 @@ def get_stats(db: Session = Depends(get_db)):
             "not_ridden_length_km": round((length or 0) - (ridden_len or 0), 3)
         }
 
-    return {
+    return cached.store({
         "total_paths": total_paths,
         "total_length_km": round(total_length, 3),
         "ridden_paths": ridden_paths,
@@ -76,7 +99,7 @@ def get_stats(db: Session = Depends(get_db)):
         "not_ridden_length_km": round(not_ridden_length, 3),
         "by_type": by_type,
         "by_area": by_area
-    }
+    })
 
 
 @router.get("/areas")
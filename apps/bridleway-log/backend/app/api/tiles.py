@@ -0,0 +1,144 @@
+"""
+Tiles API endpoints serving paths as Mapbox Vector Tiles.
+
+Tiles are built by PostGIS with ST_AsMVTGeom/ST_AsMVT, so the map only
+loads the paths in view, quantized to the tile grid of the zoom level.
+They take the same filters as /api/paths.
+"""
+
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+from urllib.parse import urlencode
+
+from app.db import get_db
+from app.models import Path
+from app.api.paths import BUFFER_QUERY, resolve_buffer, coverage_columns, join_coverage_profile, filter_paths
+
+router = APIRouter()
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+PATH_TILE_LAYER = "paths"
+PATH_TILE_EXTENT = 4096  # Tile grid size in ST_AsMVTGeom units
+PATH_TILE_BUFFER = 64  # Grid units drawn beyond the tile edge, so line ends aren't cut off
+PATH_TILE_MIN_ZOOM = 0
+PATH_TILE_MAX_ZOOM = 22
+
+# Attributes carried by each feature in the paths layer, as TileJSON field types
+PATH_TILE_FIELDS = {
+    "id": "Number",
+    "name": "String",
+    "route_code": "String",
+    "path_type": "String",
+    "area": "String",
+    "length_km": "Number",
+    "is_ridden": "Boolean",
+    "coverage_fraction": "Number",
+    "last_ridden_date": "String"
+}
+
+
+@router.get("/tiles/paths/{z}/{x}/{y}.mvt")
+def get_path_tile(
+    z: int,
+    x: int,
+    y: int,
+    area: Optional[list[str]] = Query(None),
+    path_type: Optional[list[str]] = Query(None),
+    ridden: Optional[bool] = Query(None, description="Filter by ridden status"),
+    min_coverage: Optional[float] = Query(None, ge=0, le=1, description="Minimum coverage fraction (0-1)"),
+    buffer: Optional[int] = BUFFER_QUERY,
+    db: Session = Depends(get_db)
+):
+    """
+    Get one Web Mercator tile of paths as a Mapbox Vector Tile.
+
+    The tile has a single "paths" layer whose features carry the
+    PATH_TILE_FIELDS attributes. Filters are the same as for /api/paths.
+    """
+    if not PATH_TILE_MIN_ZOOM <= z <= PATH_TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    buffer_m = resolve_buffer(buffer)
+    is_ridden, coverage_fraction, last_ridden_date = coverage_columns(buffer_m)
+    envelope = func.ST_TileEnvelope(z, x, y)
+
+    query = db.query(
+        Path.id,
+        Path.name,
+        Path.route_code,
+        Path.path_type,
+        Path.area,
+        Path.length_km,
+        is_ridden,
+        coverage_fraction,
+        func.to_char(last_ridden_date, 'YYYY-MM-DD"T"HH24:MI:SS').label("last_ridden_date"),
+        func.ST_AsMVTGeom(
+            func.ST_Transform(Path.geometry, 3857),
+            envelope,
+            PATH_TILE_EXTENT,
+            PATH_TILE_BUFFER,
+            True
+        ).label("geom")
+    )
+    query = join_coverage_profile(query, buffer_m)
+    query = filter_paths(query, is_ridden, coverage_fraction, area, path_type, ridden, min_coverage)
+
+    # Bounding box test against the GIST index on geometry; ST_AsMVTGeom clips
+    query = query.filter(Path.geometry.op("&&")(func.ST_Transform(envelope, 4326)))
+
+    rows = query.subquery("tile")
+    tile = db.query(func.ST_AsMVT(rows.table_valued(), PATH_TILE_LAYER, PATH_TILE_EXTENT, "geom")).scalar()
+
+    return Response(content=bytes(tile or b""), media_type=MVT_MEDIA_TYPE)
+
+
+@router.get("/tiles/paths.json")
+def get_path_tilejson(
+    area: Optional[list[str]] = Query(None),
+    path_type: Optional[list[str]] = Query(None),
+    ridden: Optional[bool] = Query(None, description="Filter by ridden status"),
+    min_coverage: Optional[float] = Query(None, ge=0, le=1, description="Minimum coverage fraction (0-1)"),
+    buffer: Optional[int] = BUFFER_QUERY,
+    db: Session = Depends(get_db)
+):
+    """
+    Get TileJSON describing the path tiles for a set of filters.
+
+    The tile URL is relative to this document and carries the filters;
+    bounds cover the matching paths, for fitting the map to them.
+    """
+    buffer_m = resolve_buffer(buffer)
+    is_ridden, coverage_fraction, _ = coverage_columns(buffer_m)
+
+    extent = func.ST_Extent(Path.geometry)
+    query = db.query(
+        func.ST_XMin(extent).label("west"),
+        func.ST_YMin(extent).label("south"),
+        func.ST_XMax(extent).label("east"),
+        func.ST_YMax(extent).label("north")
+    )
+    query = join_coverage_profile(query, buffer_m)
+    bounds = filter_paths(query, is_ridden, coverage_fraction, area, path_type, ridden, min_coverage).one()
+
+    params = {
+        "area": area or [],
+        "path_type": path_type or [],
+        "ridden": [] if ridden is None else [str(ridden).lower()],
+        "min_coverage": [] if min_coverage is None else [min_coverage],
+        "buffer": [] if buffer is None else [buffer]
+    }
+    query_string = urlencode(params, doseq=True)
+
+    tilejson = {
+        "tilejson": "3.0.0",
+        "tiles": [f"paths/{{z}}/{{x}}/{{y}}.mvt{'?' + query_string if query_string else ''}"],
+        "vector_layers": [{"id": PATH_TILE_LAYER, "fields": PATH_TILE_FIELDS}],
+        "minzoom": PATH_TILE_MIN_ZOOM,
+        "maxzoom": PATH_TILE_MAX_ZOOM
+    }
+    if bounds.west is not None:
+        tilejson["bounds"] = [bounds.west, bounds.south, bounds.east, bounds.north]
+    return tilejson
@@ -0,0 +1,178 @@
+"""
+Uploads API endpoints for chunked, resumable GPX uploads.
+
+    POST   /uploads                    start an upload, returns its upload_id
+    PUT    /uploads/{id}?offset=N      append a chunk (raw request body) at offset N
+    GET    /uploads/{id}               current offset, to resume after a dropped connection
+    POST   /uploads/{id}/finalize      import the completed file as a ride
+    DELETE /uploads/{id}               abandon the upload
+"""
+
+from pathlib import Path
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+from app.api.rides import store_uploaded_ride
+from app.config import UPLOAD_CHUNK_BYTES, UPLOAD_MAX_BYTES
+from app.db import get_db
+from app.schemas import UploadSessionCreate, UploadSessionResponse, RideUploadResponse
+from app.services.coverage_jobs import submit_coverage_job
+from app.services.gpx import parse_gpx_path, get_parse_pool
+from app.services.gpx_store import store_gpx_file
+from app.services.upload_sessions import UploadSession, upload_sessions
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def upload_session_response(session: UploadSession) -> UploadSessionResponse:
+    """Build the API representation of an upload session."""
+    return UploadSessionResponse(
+        upload_id=session.id,
+        filename=session.filename,
+        size=session.size,
+        offset=session.offset,
+        chunk_size=UPLOAD_CHUNK_BYTES,
+        complete=session.complete
+    )
+
+
+async def get_upload_session(upload_id: str) -> UploadSession:
+    """Look up an upload session, or raise 404."""
+    session = await run_in_threadpool(upload_sessions.get, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+@router.post("/uploads", response_model=UploadSessionResponse)
+async def create_upload(body: UploadSessionCreate):
+    """
+    Start a chunked upload of one GPX file.
+
+    Send the file with PUT /uploads/{upload_id}?offset=N, chunk_size bytes
+    at a time, then POST /uploads/{upload_id}/finalize.
+    """
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if body.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File is larger than {UPLOAD_MAX_BYTES} bytes")
+
+    filename = Path(body.filename).name or "unknown.gpx"
+    session = await run_in_threadpool(upload_sessions.create, filename, body.size)
+    return upload_session_response(session)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(upload_id: str):
+    """
+    Get the progress of a chunked upload.
+
+    After a failed or interrupted chunk, resume by sending the file from
+    the returned offset.
+    """
+    return upload_session_response(await get_upload_session(upload_id))
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Position of this chunk in the file")
+):
+    """
+    Append the request body to a chunked upload.
+
+    The chunk is streamed to the spool file and hashed as it arrives. If the
+    connection drops part way, the bytes already received are kept and the
+    upload's offset says where to carry on.
+    """
+    session = await get_upload_session(upload_id)
+
+    if session.lock.locked():
+        raise HTTPException(status_code=409, detail="A chunk for this upload is still being received")
+
+    async with session.lock:
+        if offset != session.offset:
+            raise HTTPException(status_code=409, detail=f"Expected offset {session.offset}")
+
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and offset + int(length) > session.size:
+            raise HTTPException(status_code=413, detail="Chunk runs past the end of the file")
+
+        try:
+            async for data in request.stream():
+                if not data:
+                    continue
+                if session.offset + len(data) > session.size:
+                    raise HTTPException(status_code=413, detail="Chunk runs past the end of the file")
+                await run_in_threadpool(session.append, data)
+        except ClientDisconnect:
+            logger.info(f"Upload {upload_id} interrupted at {session.offset} of {session.size} bytes")
+
+    return upload_session_response(session)
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=RideUploadResponse)
+async def finalize_upload(upload_id: str, db: Session = Depends(get_db)):
+    """
+    Import a completed chunked upload as a ride.
+
+    The file is parsed from the spool file in the GPX process pool, stored
+    like a /rides/upload file and archived; the upload session is then
+    removed. Coverage is queued as for /rides/upload.
+    """
+    session = await get_upload_session(upload_id)
+
+    if session.lock.locked():
+        raise HTTPException(status_code=409, detail="A chunk for this upload is still being received")
+
+    async with session.lock:
+        if not session.complete:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Upload incomplete: {session.offset} of {session.size} bytes received"
+            )
+
+        file_hash = session.file_hash()
+        loop = asyncio.get_running_loop()
+        try:
+            parsed = (file_hash, await loop.run_in_executor(get_parse_pool(), parse_gpx_path, str(session.spool_path), file_hash))
+        except Exception as e:
+            parsed = e
+
+        result = await run_in_threadpool(store_uploaded_ride, db, session.filename, parsed)
+        if result.status == "imported":
+            if not await run_in_threadpool(store_gpx_file, session.spool_path, file_hash):
+                logger.warning(f"GPX file {session.filename} imported to database but failed to archive")
+
+        await run_in_threadpool(upload_sessions.discard, upload_id)
+
+    coverage_job_id = None
+    if result.status == "imported":
+        coverage_job_id = submit_coverage_job(ride_ids=[result.ride_id]).id
+
+    return RideUploadResponse(
+        total_files=1,
+        imported=1 if result.status == "imported" else 0,
+        skipped=1 if result.status == "skipped_duplicate" else 0,
+        errors=1 if result.status == "error" else 0,
+        results=[result],
+        coverage_job_id=coverage_job_id
+    )
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """
+    Abandon a chunked upload and delete the bytes received so far.
+    """
+    await get_upload_session(upload_id)
+    await run_in_threadpool(upload_sessions.discard, upload_id)
+    return {"message": f"Upload {upload_id} deleted", "id": upload_id}
@@ -11,3 +11,34 @@ DATABASE_URL = os.getenv(
 # Can be overridden with GPX_STORAGE_DIR environment variable
 DEFAULT_GPX_DIR = Path(__file__).parent.parent.parent.parent.parent / "data" / "gpx" / "activities"
 GPX_STORAGE_DIR = Path(os.getenv("GPX_STORAGE_DIR", str(DEFAULT_GPX_DIR)))
+
+# Number of database connections used for a full coverage recompute
+# Defaults to the number of CPU cores
+COVERAGE_WORKERS = int(os.getenv("COVERAGE_WORKERS", str(os.cpu_count() or 1)))
+
+# Coverage engine used for recomputes: "postgis" (SQL) or "shapely" (in-process)
+COVERAGE_ENGINE = os.getenv("COVERAGE_ENGINE", "postgis")
+
+# Number of processes used to hash and parse uploaded GPX files
+# Defaults to the number of CPU cores
+GPX_PARSE_WORKERS = int(os.getenv("GPX_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Directory of cached GPX parse results, keyed by file hash, and its size
+# limit; the least recently used entries are removed beyond it
+GPX_PARSE_CACHE_DIR = Path(os.getenv("GPX_PARSE_CACHE_DIR", str(GPX_STORAGE_DIR / "parsed")))
+GPX_PARSE_CACHE_MAX_BYTES = int(os.getenv("GPX_PARSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# How /api/paths builds its GeoJSON: "stream" (features written out by Python
+# as rows arrive) or "database" (the whole FeatureCollection built by PostgreSQL)
+PATHS_GEOJSON_ASSEMBLY = os.getenv("PATHS_GEOJSON_ASSEMBLY", "stream")
+
+# Size limits of the in-memory cache of paths, stats and ride GeoJSON responses
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "128"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# Directory where chunked uploads are spooled until they are finalized
+UPLOAD_SPOOL_DIR = Path(os.getenv("UPLOAD_SPOOL_DIR", str(GPX_STORAGE_DIR / "uploads")))
+
+# Chunk size suggested to chunked upload clients, and the largest file accepted
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
@@ -1,8 +1,9 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+from app.config import DATABASE_URL, COVERAGE_WORKERS
 
-engine = create_engine(DATABASE_URL)
+# Keep enough pooled connections for a parallel coverage recompute
+engine = create_engine(DATABASE_URL, pool_size=max(5, COVERAGE_WORKERS))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
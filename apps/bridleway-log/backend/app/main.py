@@ -4,7 +4,9 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from app.db import engine, Base
-from app.api import paths, stats, rides, bridleways
+from app.api import paths, stats, rides, uploads, tiles, bridleways
+from app.services.coverage_jobs import resume_coverage_jobs
+from app.services.gpx import shutdown_parse_pool
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -25,6 +27,8 @@ app.add_middleware(
 app.include_router(paths.router, prefix="/api", tags=["paths"])
 app.include_router(stats.router, prefix="/api", tags=["stats"])
 app.include_router(rides.router, prefix="/api", tags=["rides"])
+app.include_router(uploads.router, prefix="/api", tags=["uploads"])
+app.include_router(tiles.router, prefix="/api", tags=["tiles"])
 app.include_router(bridleways.router, prefix="/api", tags=["bridleways"])
 
 # Serve frontend static files
@@ -36,6 +40,16 @@ async def root():
     return FileResponse("/app/static/index.html")
 
 
+@app.on_event("startup")
+def resume_coverage():
+    resume_coverage_jobs()
+
+
+@app.on_event("shutdown")
+def stop_parse_pool():
+    shutdown_parse_pool()
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
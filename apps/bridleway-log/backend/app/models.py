@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index, Computed, Sequence
 from geoalchemy2 import Geometry
 from datetime import datetime
 from app.db import Base
 
+# Bumped after every committed change to paths, rides or coverage; part of
+# the response cache key (see app/services/response_cache.py)
+data_version = Sequence("data_version", metadata=Base.metadata)
+
 
 class Path(Base):
     __tablename__ = "paths"
@@ -14,9 +18,14 @@ class Path(Base):
     path_type = Column(String, index=True)
     area = Column(String, index=True)
     geometry = Column(Geometry("LINESTRING", srid=4326))
+    # British National Grid (EPSG:27700) copy kept in sync by PostgreSQL
+    geometry_bng = Column(
+        Geometry("LINESTRING", srid=27700),
+        Computed("ST_Transform(geometry, 27700)", persisted=True)
+    )
     length_km = Column(Float)
 
-    # Coverage fields (iteration 2)
+    # Coverage fields (iteration 2), for the default buffer width
     is_ridden = Column(Boolean, default=False, index=True)
     coverage_fraction = Column(Float, default=0.0)
     last_ridden_date = Column(DateTime, nullable=True)
@@ -28,8 +37,110 @@ class Ride(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     file_hash = Column(String(64), unique=True, index=True)  # SHA-256 for deduplication
+    track_fingerprint = Column(String(64), index=True)  # Same activity exported differently, see gpx.track_fingerprint()
     date_recorded = Column(DateTime, nullable=True)
     distance_km = Column(Float, default=0.0)
     elevation_gain_m = Column(Float, nullable=True)
     geometry = Column(Geometry("MULTILINESTRING", srid=4326))
+    # British National Grid (EPSG:27700) copy kept in sync by PostgreSQL
+    geometry_bng = Column(
+        Geometry("MULTILINESTRING", srid=27700),
+        Computed("ST_Transform(geometry, 27700)", persisted=True)
+    )
+    # Simplified copies for drawing at lower map zooms, kept in sync by PostgreSQL.
+    # Tolerances are in degrees (~100 m, ~10 m and ~2 m)
+    geometry_low = Column(
+        Geometry("MULTILINESTRING", srid=4326, spatial_index=False),
+        Computed("ST_Simplify(geometry, 0.001, true)", persisted=True)
+    )
+    geometry_medium = Column(
+        Geometry("MULTILINESTRING", srid=4326, spatial_index=False),
+        Computed("ST_Simplify(geometry, 0.0001, true)", persisted=True)
+    )
+    geometry_high = Column(
+        Geometry("MULTILINESTRING", srid=4326, spatial_index=False),
+        Computed("ST_Simplify(geometry, 0.00002, true)", persisted=True)
+    )
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RideBuffer(Base):
+    """Coverage buffer of a ride in British National Grid (EPSG:27700), one per buffer width."""
+    __tablename__ = "ride_buffers"
+
+    ride_id = Column(Integer, ForeignKey("rides.id", ondelete="CASCADE"), primary_key=True)
+    buffer_m = Column(Integer, primary_key=True)
+    geometry = Column(Geometry("MULTIPOLYGON", srid=27700))
+
+
+class PathSegment(Base):
+    """Fixed-length piece of a path, in British National Grid (EPSG:27700)."""
+    __tablename__ = "path_segments"
+    __table_args__ = (
+        Index("idx_path_segments_path_seq", "path_id", "seq", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    path_id = Column(Integer, ForeignKey("paths.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # Position along the path, from 0
+    length_m = Column(Float)
+    geometry = Column(Geometry("LINESTRING", srid=27700))
+
+    # Coverage for the default buffer width
+    is_ridden = Column(Boolean, default=False)
+    coverage_fraction = Column(Float, default=0.0)
+    last_ridden_date = Column(DateTime, nullable=True)
+
+
+class PathSegmentCoverage(Base):
+    """Coverage of a path segment for one buffer width."""
+    __tablename__ = "path_segment_coverage"
+
+    segment_id = Column(Integer, ForeignKey("path_segments.id", ondelete="CASCADE"), primary_key=True)
+    buffer_m = Column(Integer, primary_key=True)
+    is_ridden = Column(Boolean, default=False)
+    coverage_fraction = Column(Float, default=0.0)
+    last_ridden_date = Column(DateTime, nullable=True)
+
+
+class PathCoverageProfile(Base):
+    """Coverage of a path for one buffer width."""
+    __tablename__ = "path_coverage_profiles"
+
+    path_id = Column(Integer, ForeignKey("paths.id", ondelete="CASCADE"), primary_key=True)
+    buffer_m = Column(Integer, primary_key=True, index=True)
+    is_ridden = Column(Boolean, default=False)
+    coverage_fraction = Column(Float, default=0.0)
+    last_ridden_date = Column(DateTime, nullable=True)
+
+
+class PathRideCoverage(Base):
+    """Part of a path covered by a single ride, in British National Grid (EPSG:27700)."""
+    __tablename__ = "path_ride_coverage"
+    __table_args__ = (
+        Index("idx_path_ride_coverage_path_date", "path_id", "ride_date"),
+    )
+
+    path_id = Column(Integer, ForeignKey("paths.id", ondelete="CASCADE"), primary_key=True)
+    ride_id = Column(Integer, ForeignKey("rides.id", ondelete="CASCADE"), primary_key=True, index=True)
+    ride_date = Column(DateTime, nullable=True)  # Copy of rides.date_recorded
+    distance_m = Column(Float)  # Closest approach of the ride to the path
+    # Part of the path within the widest buffer profile of the ride
+    covered_length_m = Column(Float, default=0.0)
+    geometry = Column(Geometry("MULTILINESTRING", srid=27700, spatial_index=False))
+
+
+class CoverageQueueEntry(Base):
+    """
+    Coverage work queued on the background worker and not yet done.
+
+    One row per ride, path or full recompute, deleted when the job covering
+    it completes, so work queued before a restart is picked up again.
+    """
+    __tablename__ = "coverage_queue"
+
+    id = Column(Integer, primary_key=True)
+    ride_id = Column(Integer, ForeignKey("rides.id", ondelete="CASCADE"), nullable=True)
+    path_id = Column(Integer, ForeignKey("paths.id", ondelete="CASCADE"), nullable=True)
+    full_recompute = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
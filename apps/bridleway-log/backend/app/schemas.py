@@ -53,6 +53,22 @@ class RideListResponse(BaseModel):
     total: int
 
 
+class PathRide(BaseModel):
+    ride_id: int
+    filename: str
+    date_recorded: Optional[datetime] = None
+    distance_km: float = 0.0
+    covered_length_m: float = 0.0  # Length of the path within the requested buffer of the ride
+    distance_m: Optional[float] = None  # Closest approach of the ride to the path
+
+
+class PathRidesResponse(BaseModel):
+    path_id: int
+    buffer_m: int
+    rides: list[PathRide]
+    total: int
+
+
 class RideUploadResult(BaseModel):
     filename: str
     status: str  # "imported", "skipped_duplicate", "error"
@@ -66,8 +82,43 @@ class RideUploadResponse(BaseModel):
     skipped: int
     errors: int
     results: list[RideUploadResult]
+    coverage_job_id: Optional[str] = None
 
 
-class CoverageRecomputeResponse(BaseModel):
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int  # Total file size in bytes
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int  # Bytes received so far; the next chunk starts here
+    chunk_size: int  # Suggested chunk size in bytes
+    complete: bool = False
+
+
+class CoverageTileResult(BaseModel):
+    area: Optional[str]
+    tile: Optional[str]
+    paths: int
     paths_updated: int
-    message: str
+    seconds: float
+
+
+class CoverageJobResponse(BaseModel):
+    job_id: str
+    status: str  # "queued", "running", "completed", "failed"
+    full_recompute: bool = False
+    ride_count: int = 0
+    path_count: int = 0
+    merged_requests: int = 1
+    paths_updated: Optional[int] = None
+    error: Optional[str] = None
+    tiles_total: int = 0
+    tiles_done: int = 0
+    tiles: list[CoverageTileResult] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -4,12 +4,29 @@ Coverage calculation service using PostGIS spatial operations.
 Coverage rule:
 - A path is considered "ridden" if at least COVERAGE_MIN_FRACTION of its length
   is within COVERAGE_BUFFER_METERS of any GPX track geometry.
+
+Coverage is computed for every buffer width in COVERAGE_BUFFER_PROFILES in
+the same pass and stored in path_segment_coverage / path_coverage_profiles,
+so the API can switch GPS tolerance without a recompute. The columns on
+paths and path_segments hold the default COVERAGE_BUFFER_METERS profile.
+
+Each ride's buffer is stored in ride_buffers, and the part of each path it
+covers is stored in path_ride_coverage, so adding or deleting a ride only
+revisits the paths that ride touches.
+
+Paths are split into ~COVERAGE_SEGMENT_METERS pieces in path_segments, each
+with its own coverage fraction, ridden flag and last ridden date. Path-level
+coverage is the length-weighted sum over its segments.
 """
 
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
 import logging
+import time
+
+from app.config import COVERAGE_ENGINE
 
 logger = logging.getLogger(__name__)
 
@@ -17,121 +34,442 @@ logger = logging.getLogger(__name__)
 COVERAGE_MIN_FRACTION = 0.5  # 50% of path must be covered
 COVERAGE_BUFFER_METERS = 30  # 30 meter buffer around GPX tracks
 
+# Buffer widths coverage is computed for (must include COVERAGE_BUFFER_METERS)
+COVERAGE_BUFFER_PROFILES = (10, 20, 30, 50)
+COVERAGE_MAX_BUFFER_METERS = max(COVERAGE_BUFFER_PROFILES)
+
 # Use British National Grid (EPSG:27700) for accurate UK distance calculations
-# Web Mercator (3857) has significant distortion at UK latitudes
+# Web Mercator (3857) has significant distortion at UK latitudes.
+# paths and rides store a generated geometry_bng column in this SRID.
 UK_SRID = 27700
 
+# Side length of the spatial tiles used by the parallel full recompute
+COVERAGE_TILE_METERS = 10_000
 
-def recompute_coverage(db: Session, path_ids: Optional[list[int]] = None) -> int:
+# Target length of the path segments coverage is tracked on
+COVERAGE_SEGMENT_METERS = 50
+
+
+def recompute_coverage(
+    db: Session,
+    path_ids: Optional[list[int]] = None,
+    engine: Optional[str] = None
+) -> int:
     """
     Recompute coverage for paths based on spatial overlap with ride geometries.
 
+    Rebuilds the path_ride_coverage rows of the selected paths from the
+    stored ride buffers, then refreshes their path-level coverage.
+
     Args:
         db: Database session
         path_ids: Optional list of path IDs to update. If None, updates all paths.
+        engine: "postgis" or "shapely". Defaults to COVERAGE_ENGINE.
 
     Returns:
         Number of paths updated.
     """
 
-    # First, check if there are any rides
-    ride_count = db.execute(text("SELECT COUNT(*) FROM rides")).scalar()
-
-    if ride_count == 0:
-        # No rides, reset all paths to not ridden
-        if path_ids:
-            result = db.execute(
-                text("""
-                    UPDATE paths
-                    SET is_ridden = FALSE,
-                        coverage_fraction = 0.0,
-                        last_ridden_date = NULL
-                    WHERE id = ANY(:path_ids)
-                """),
-                {"path_ids": path_ids}
-            )
-        else:
-            result = db.execute(
-                text("""
-                    UPDATE paths
-                    SET is_ridden = FALSE,
-                        coverage_fraction = 0.0,
-                        last_ridden_date = NULL
-                """)
-            )
-        db.commit()
-        return result.rowcount
+    # An explicit empty selection means there is nothing to update
+    if path_ids is not None and not path_ids:
+        return 0
+
+    # Make sure every ride has a materialized buffer and every path has
+    # segments before a full recompute
+    if path_ids is None:
+        store_ride_buffers(db)
+        build_path_segments(db)
 
-    # Build the coverage calculation query
-    # Uses ST_Transform to convert to a meter-based CRS (EPSG:3857) for buffering
-    # Then calculates intersection length as fraction of total path length
+    engine = engine or COVERAGE_ENGINE
+    if engine == "shapely":
+        from app.services.coverage_shapely import recompute_coverage_shapely
+        return recompute_coverage_shapely(db, path_ids)
+    if engine != "postgis":
+        raise ValueError(f"Unknown coverage engine: {engine}")
 
     path_filter = ""
-    params = {
-        "buffer_meters": COVERAGE_BUFFER_METERS,
-        "min_fraction": COVERAGE_MIN_FRACTION
-    }
+    params = {"max_buffer": COVERAGE_MAX_BUFFER_METERS}
 
     if path_ids:
         path_filter = "WHERE p.id = ANY(:path_ids)"
         params["path_ids"] = path_ids
+        db.execute(
+            text("DELETE FROM path_ride_coverage WHERE path_id = ANY(:path_ids)"),
+            params
+        )
+    else:
+        db.execute(text("DELETE FROM path_ride_coverage"))
 
-    coverage_query = text(f"""
-        WITH ride_buffer AS (
-            -- Create a single buffered geometry from all rides
-            -- Transform to British National Grid (EPSG:27700) for accurate UK measurements
-            SELECT ST_Union(
-                ST_Buffer(
-                    ST_Transform(geometry, {UK_SRID}),
-                    :buffer_meters
-                )
-            ) AS buffered_geom
-            FROM rides
-            WHERE geometry IS NOT NULL
-        ),
-        path_coverage AS (
+    # Each path only looks at the widest buffers that actually touch it,
+    # which the GIST index on ride_buffers.geometry finds without scanning
+    # all rides. distance_m decides which narrower profiles a ride counts for.
+    db.execute(
+        text(f"""
+            INSERT INTO path_ride_coverage (path_id, ride_id, ride_date, distance_m, covered_length_m, geometry)
+            SELECT path_id, ride_id, ride_date, distance_m, ST_Length(covered), covered
+            FROM (
+                SELECT
+                    tp.id AS path_id,
+                    r.id AS ride_id,
+                    r.date_recorded AS ride_date,
+                    ST_Distance(tp.geom, r.geometry_bng) AS distance_m,
+                    ST_Multi(ST_CollectionExtract(ST_Intersection(tp.geom, rb.geometry), 2)) AS covered
+                FROM (
+                    SELECT p.id, p.geometry_bng AS geom
+                    FROM paths p
+                    {path_filter}
+                ) tp
+                JOIN ride_buffers rb
+                  ON rb.buffer_m = :max_buffer
+                 AND ST_Intersects(rb.geometry, tp.geom)
+                JOIN rides r ON r.id = rb.ride_id
+            ) contributions
+            WHERE NOT ST_IsEmpty(covered)
+        """),
+        params
+    )
+
+    return refresh_path_coverage(db, path_ids)
+
+
+def get_coverage_tiles(db: Session, tile_meters: int = COVERAGE_TILE_METERS) -> list[dict]:
+    """
+    Split the path network into tiles for a parallel recompute.
+
+    Paths are grouped by area and by the EPSG:27700 grid square of
+    tile_meters that contains their centroid, so each tile is a compact set
+    of paths that can be recomputed independently of the others.
+
+    Returns:
+        List of tiles as dicts with "area", "tile" and "path_ids", largest first.
+    """
+    result = db.execute(
+        text("""
             SELECT
-                p.id,
-                -- Calculate length of path that intersects with ride buffer
-                CASE
-                    WHEN rb.buffered_geom IS NOT NULL AND ST_Intersects(
-                        ST_Transform(p.geometry, {UK_SRID}),
-                        rb.buffered_geom
-                    ) THEN
-                        ST_Length(
-                            ST_Intersection(
-                                ST_Transform(p.geometry, {UK_SRID}),
-                                rb.buffered_geom
-                            )
-                        ) / NULLIF(ST_Length(ST_Transform(p.geometry, {UK_SRID})), 0)
-                    ELSE 0.0
-                END AS coverage_frac,
-                -- Get the most recent ride date that intersects this path
+                area,
+                FLOOR(ST_X(centroid) / :tile_meters)::int AS tile_x,
+                FLOOR(ST_Y(centroid) / :tile_meters)::int AS tile_y,
+                ARRAY_AGG(id ORDER BY id) AS path_ids
+            FROM (
+                SELECT id, area, ST_Centroid(geometry_bng) AS centroid
+                FROM paths
+            ) p
+            GROUP BY area, tile_x, tile_y
+            ORDER BY COUNT(*) DESC
+        """),
+        {"tile_meters": tile_meters}
+    )
+
+    return [
+        {
+            "area": row.area,
+            "tile": f"{row.tile_x}_{row.tile_y}" if row.tile_x is not None else None,
+            "path_ids": list(row.path_ids)
+        }
+        for row in result
+    ]
+
+
+def recompute_coverage_parallel(
+    session_factory: Callable[[], Session],
+    workers: int,
+    on_tile_done: Optional[Callable[[dict, int, int], None]] = None,
+    engine: Optional[str] = None
+) -> list[dict]:
+    """
+    Recompute coverage for all paths, running spatial tiles concurrently.
+
+    Each tile is recomputed with recompute_coverage(path_ids=...) on its own
+    session, so the work is spread over up to `workers` PostgreSQL backends.
+
+    Args:
+        session_factory: Callable returning a new database session
+        workers: Number of tiles to recompute at once
+        on_tile_done: Optional callback(tile_result, tiles_done, tiles_total)
+            called as each tile finishes
+        engine: "postgis" or "shapely". Defaults to COVERAGE_ENGINE.
+
+    Returns:
+        List of per-tile results with "area", "tile", "paths",
+        "paths_updated" and "seconds".
+    """
+    db = session_factory()
+    try:
+        # Buffer any rides and split any paths the tiles will need
+        store_ride_buffers(db)
+        build_path_segments(db)
+        tiles = get_coverage_tiles(db)
+    finally:
+        db.close()
+
+    def run_tile(tile: dict) -> dict:
+        started = time.perf_counter()
+        session = session_factory()
+        try:
+            paths_updated = recompute_coverage(session, path_ids=tile["path_ids"], engine=engine)
+        finally:
+            session.close()
+        return {
+            "area": tile["area"],
+            "tile": tile["tile"],
+            "paths": len(tile["path_ids"]),
+            "paths_updated": paths_updated,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(run_tile, tile) for tile in tiles]
+        for future in as_completed(futures):
+            tile_result = future.result()
+            results.append(tile_result)
+            logger.info(
+                f"Coverage tile {tile_result['area']}/{tile_result['tile']}: "
+                f"{tile_result['paths_updated']} paths in {tile_result['seconds']}s "
+                f"({len(results)}/{len(tiles)})"
+            )
+            if on_tile_done:
+                on_tile_done(tile_result, len(results), len(tiles))
+
+    return results
+
+
+def add_ride_coverage(db: Session, ride_ids: list[int]) -> list[int]:
+    """
+    Record the path coverage contributed by newly stored rides.
+
+    Buffers the rides, inserts their path_ride_coverage rows and returns the
+    paths they touch. Pass the result to refresh_path_coverage() to update
+    the path-level coverage.
+
+    Args:
+        db: Database session
+        ride_ids: IDs of the new rides
+
+    Returns:
+        List of path IDs touched by the rides.
+    """
+    if not ride_ids:
+        return []
+
+    store_ride_buffers(db, ride_ids)
+
+    # The GIST index on paths.geometry_bng finds the candidate paths for
+    # each ride's widest buffer without reprojecting the network
+    result = db.execute(
+        text("""
+            INSERT INTO path_ride_coverage (path_id, ride_id, ride_date, distance_m, covered_length_m, geometry)
+            SELECT path_id, ride_id, ride_date, distance_m, ST_Length(covered), covered
+            FROM (
+                SELECT
+                    p.id AS path_id,
+                    r.id AS ride_id,
+                    r.date_recorded AS ride_date,
+                    ST_Distance(p.geometry_bng, r.geometry_bng) AS distance_m,
+                    ST_Multi(ST_CollectionExtract(ST_Intersection(p.geometry_bng, rb.geometry), 2)) AS covered
+                FROM ride_buffers rb
+                JOIN rides r ON r.id = rb.ride_id
+                JOIN paths p ON ST_Intersects(p.geometry_bng, rb.geometry)
+                WHERE rb.ride_id = ANY(:ride_ids)
+                  AND rb.buffer_m = :max_buffer
+            ) contributions
+            WHERE NOT ST_IsEmpty(covered)
+            ON CONFLICT (path_id, ride_id) DO UPDATE
+            SET ride_date = EXCLUDED.ride_date,
+                distance_m = EXCLUDED.distance_m,
+                covered_length_m = EXCLUDED.covered_length_m,
+                geometry = EXCLUDED.geometry
+            RETURNING path_id
+        """),
+        {"ride_ids": ride_ids, "max_buffer": COVERAGE_MAX_BUFFER_METERS}
+    )
+    path_ids = sorted({row[0] for row in result})
+    db.commit()
+
+    return path_ids
+
+
+def get_ride_path_ids(db: Session, ride_id: int) -> list[int]:
+    """
+    Get the paths a ride contributes coverage to.
+
+    Call this before deleting a ride: the ride's path_ride_coverage rows are
+    removed with it, and only these paths need refresh_path_coverage().
+    """
+    result = db.execute(
+        text("SELECT path_id FROM path_ride_coverage WHERE ride_id = :ride_id"),
+        {"ride_id": ride_id}
+    )
+    return [row[0] for row in result]
+
+
+def refresh_path_coverage(db: Session, path_ids: Optional[list[int]] = None) -> int:
+    """
+    Update segment and path coverage for paths after rides changed.
+
+    In a single statement, each path segment is intersected with the union
+    of the ride buffers that touch it, once per COVERAGE_BUFFER_PROFILES
+    width. Only segment profiles whose coverage actually changed are written.
+
+    Args:
+        db: Database session
+        path_ids: Optional list of path IDs to update. If None, updates all paths.
+
+    Returns:
+        Number of paths updated.
+    """
+    if path_ids is not None and not path_ids:
+        return 0
+
+    segment_filter = ""
+    params = {"min_fraction": COVERAGE_MIN_FRACTION, "buffers": list(COVERAGE_BUFFER_PROFILES)}
+
+    if path_ids:
+        segment_filter = "WHERE s.path_id = ANY(:path_ids)"
+        params["path_ids"] = path_ids
+
+    db.execute(
+        text(f"""
+            INSERT INTO path_segment_coverage (segment_id, buffer_m, coverage_fraction, is_ridden, last_ridden_date)
+            SELECT
+                segment_id,
+                buffer_m,
+                coverage_frac,
+                coverage_frac >= :min_fraction,
+                last_ride_date
+            FROM (
+                SELECT
+                    s.id AS segment_id,
+                    b.buffer_m,
+                    LEAST(
+                        COALESCE(
+                            ST_Length(ST_Intersection(s.geometry, cov.buffered_geom))
+                                / NULLIF(s.length_m, 0),
+                            0.0
+                        ),
+                        1.0
+                    ) AS coverage_frac,
+                    cov.last_ride_date
+                FROM path_segments s
+                CROSS JOIN UNNEST(CAST(:buffers AS INTEGER[])) AS b(buffer_m)
+                LEFT JOIN LATERAL (
+                    SELECT
+                        ST_Union(rb.geometry) AS buffered_geom,
+                        MAX(r.date_recorded) AS last_ride_date
+                    FROM ride_buffers rb
+                    JOIN rides r ON r.id = rb.ride_id
+                    WHERE rb.buffer_m = b.buffer_m
+                      AND ST_Intersects(rb.geometry, s.geometry)
+                ) cov ON TRUE
+                {segment_filter}
+            ) segment_coverage
+            ON CONFLICT (segment_id, buffer_m) DO UPDATE
+            SET coverage_fraction = EXCLUDED.coverage_fraction,
+                is_ridden = EXCLUDED.is_ridden,
+                last_ridden_date = EXCLUDED.last_ridden_date
+            WHERE path_segment_coverage.coverage_fraction IS DISTINCT FROM EXCLUDED.coverage_fraction
+               OR path_segment_coverage.last_ridden_date IS DISTINCT FROM EXCLUDED.last_ridden_date
+        """),
+        params
+    )
+
+    return aggregate_path_coverage(db, path_ids)
+
+
+def aggregate_path_coverage(db: Session, path_ids: Optional[list[int]] = None) -> int:
+    """
+    Roll segment coverage profiles up to the path level.
+
+    Path coverage_fraction per profile is the length-weighted sum of its
+    segment fractions, and last_ridden_date is an indexed MAX over the
+    path_ride_coverage rows within that profile's distance. The default
+    COVERAGE_BUFFER_METERS profile is also copied onto the path_segments and
+    paths columns.
+
+    Args:
+        db: Database session
+        path_ids: Optional list of path IDs to update. If None, updates all paths.
+
+    Returns:
+        Number of paths updated.
+    """
+    if path_ids is not None and not path_ids:
+        return 0
+
+    segment_filter = ""
+    path_filter = ""
+    params = {"min_fraction": COVERAGE_MIN_FRACTION, "default_buffer": COVERAGE_BUFFER_METERS}
+
+    if path_ids:
+        segment_filter = "AND s.path_id = ANY(:path_ids)"
+        path_filter = "AND p.id = ANY(:path_ids)"
+        params["path_ids"] = path_ids
+
+    db.execute(
+        text(f"""
+            UPDATE path_segments s
+            SET
+                coverage_fraction = c.coverage_fraction,
+                is_ridden = c.is_ridden,
+                last_ridden_date = c.last_ridden_date
+            FROM path_segment_coverage c
+            WHERE c.segment_id = s.id
+              AND c.buffer_m = :default_buffer
+              AND (s.coverage_fraction IS DISTINCT FROM c.coverage_fraction
+                   OR s.last_ridden_date IS DISTINCT FROM c.last_ridden_date)
+              {segment_filter}
+        """),
+        params
+    )
+
+    db.execute(
+        text(f"""
+            INSERT INTO path_coverage_profiles (path_id, buffer_m, coverage_fraction, is_ridden, last_ridden_date)
+            SELECT
+                pc.path_id,
+                pc.buffer_m,
+                pc.coverage_frac,
+                pc.coverage_frac >= :min_fraction,
                 (
-                    SELECT MAX(r.date_recorded)
-                    FROM rides r
-                    WHERE r.geometry IS NOT NULL
-                      AND r.date_recorded IS NOT NULL
-                      AND ST_DWithin(
-                          ST_Transform(p.geometry, {UK_SRID}),
-                          ST_Transform(r.geometry, {UK_SRID}),
-                          :buffer_meters
-                      )
-                ) AS last_ride_date
+                    SELECT MAX(prc.ride_date)
+                    FROM path_ride_coverage prc
+                    WHERE prc.path_id = pc.path_id
+                      AND prc.distance_m <= pc.buffer_m
+                )
+            FROM (
+                SELECT
+                    s.path_id,
+                    c.buffer_m,
+                    COALESCE(SUM(s.length_m * c.coverage_fraction) / NULLIF(SUM(s.length_m), 0), 0.0) AS coverage_frac
+                FROM path_segments s
+                JOIN path_segment_coverage c ON c.segment_id = s.id
+                WHERE TRUE {segment_filter}
+                GROUP BY s.path_id, c.buffer_m
+            ) pc
+            ON CONFLICT (path_id, buffer_m) DO UPDATE
+            SET coverage_fraction = EXCLUDED.coverage_fraction,
+                is_ridden = EXCLUDED.is_ridden,
+                last_ridden_date = EXCLUDED.last_ridden_date
+        """),
+        params
+    )
+
+    # Paths without segments have no profile rows and read as not ridden
+    result = db.execute(
+        text(f"""
+            UPDATE paths
+            SET
+                coverage_fraction = COALESCE(pcp.coverage_fraction, 0.0),
+                is_ridden = COALESCE(pcp.is_ridden, FALSE),
+                last_ridden_date = pcp.last_ridden_date
             FROM paths p
-            CROSS JOIN ride_buffer rb
-            {path_filter}
-        )
-        UPDATE paths
-        SET
-            coverage_fraction = COALESCE(pc.coverage_frac, 0.0),
-            is_ridden = (COALESCE(pc.coverage_frac, 0.0) >= :min_fraction),
-            last_ridden_date = pc.last_ride_date
-        FROM path_coverage pc
-        WHERE paths.id = pc.id
-    """)
-
-    result = db.execute(coverage_query, params)
+            LEFT JOIN path_coverage_profiles pcp
+              ON pcp.path_id = p.id AND pcp.buffer_m = :default_buffer
+            WHERE paths.id = p.id
+              {path_filter}
+        """),
+        params
+    )
     db.commit()
 
     updated_count = result.rowcount
@@ -140,6 +478,116 @@ def recompute_coverage(db: Session, path_ids: Optional[list[int]] = None) -> int
     return updated_count
 
 
+def build_path_segments(db: Session, path_ids: Optional[list[int]] = None) -> int:
+    """
+    Split paths into roughly COVERAGE_SEGMENT_METERS long pieces.
+
+    Each path is cut into equal-length pieces in EPSG:27700 so coverage can
+    be tracked along its length. Run after importing paths.
+
+    Args:
+        db: Database session
+        path_ids: Optional list of path IDs to (re)split. If None, splits
+            every path that has no segments yet.
+
+    Returns:
+        Number of segments written.
+    """
+    if path_ids is not None and not path_ids:
+        return 0
+
+    params = {"segment_meters": COVERAGE_SEGMENT_METERS}
+
+    if path_ids is None:
+        path_filter = "AND NOT EXISTS (SELECT 1 FROM path_segments s WHERE s.path_id = p.id)"
+    else:
+        path_filter = "AND p.id = ANY(:path_ids)"
+        params["path_ids"] = path_ids
+        db.execute(
+            text("DELETE FROM path_segments WHERE path_id = ANY(:path_ids)"),
+            params
+        )
+
+    result = db.execute(
+        text(f"""
+            INSERT INTO path_segments (path_id, seq, length_m, geometry)
+            SELECT
+                p.id,
+                n,
+                ST_Length(piece.geom),
+                piece.geom
+            FROM paths p
+            CROSS JOIN LATERAL (
+                SELECT GREATEST(1, ROUND(ST_Length(p.geometry_bng) / :segment_meters))::int AS pieces
+            ) split
+            CROSS JOIN LATERAL generate_series(0, split.pieces - 1) AS n
+            CROSS JOIN LATERAL (
+                SELECT ST_LineSubstring(
+                    p.geometry_bng,
+                    n::float / split.pieces,
+                    (n + 1)::float / split.pieces
+                ) AS geom
+            ) piece
+            WHERE p.geometry_bng IS NOT NULL
+              {path_filter}
+        """),
+        params
+    )
+    db.commit()
+
+    return result.rowcount
+
+
+def store_ride_buffers(db: Session, ride_ids: Optional[list[int]] = None) -> int:
+    """
+    Materialize the coverage buffers of each ride in the ride_buffers table.
+
+    One buffer per COVERAGE_BUFFER_PROFILES width is computed in British
+    National Grid (EPSG:27700) when a ride is stored, so coverage recomputes
+    never re-buffer historical rides.
+
+    Args:
+        db: Database session
+        ride_ids: Optional list of ride IDs to (re)buffer. If None, buffers
+            every ride that is missing a stored buffer.
+
+    Returns:
+        Number of buffers written.
+    """
+    if ride_ids is not None and not ride_ids:
+        return 0
+
+    params = {"buffers": list(COVERAGE_BUFFER_PROFILES)}
+
+    if ride_ids is None:
+        ride_filter = """AND NOT EXISTS (
+                  SELECT 1 FROM ride_buffers rb
+                  WHERE rb.ride_id = r.id AND rb.buffer_m = b.buffer_m
+              )"""
+    else:
+        ride_filter = "AND r.id = ANY(:ride_ids)"
+        params["ride_ids"] = ride_ids
+
+    result = db.execute(
+        text(f"""
+            INSERT INTO ride_buffers (ride_id, buffer_m, geometry)
+            SELECT
+                r.id,
+                b.buffer_m,
+                ST_Multi(ST_Buffer(r.geometry_bng, b.buffer_m))
+            FROM rides r
+            CROSS JOIN UNNEST(CAST(:buffers AS INTEGER[])) AS b(buffer_m)
+            WHERE r.geometry_bng IS NOT NULL
+              {ride_filter}
+            ON CONFLICT (ride_id, buffer_m) DO UPDATE SET geometry = EXCLUDED.geometry
+        """),
+        params
+    )
+    db.commit()
+
+    return result.rowcount
+
+
 def get_coverage_stats(db: Session) -> dict:
     """
     Get summary statistics about path coverage.
@@ -0,0 +1,259 @@
+"""
+Background worker for coverage recomputation.
+
+Uploads, deletes and manual recomputes queue a coverage job instead of
+running the spatial work inside the HTTP request. Requests that arrive while
+a job is still queued are merged into it, so a burst of uploads results in a
+single coverage run.
+
+Queued work is also recorded in the coverage_queue table and only removed
+once a job covering it completes, so jobs that were queued or running when
+the web process stopped are queued again by resume_coverage_jobs() at
+startup. Failed jobs stay recorded and are retried then too.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+import threading
+import uuid
+import logging
+
+from sqlalchemy import insert, delete
+
+from app.config import COVERAGE_WORKERS
+from app.db import SessionLocal
+from app.models import CoverageQueueEntry
+from app.services.coverage import (
+    recompute_coverage_parallel,
+    add_ride_coverage,
+    refresh_path_coverage
+)
+from app.services.response_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Number of finished jobs kept for the status endpoint
+MAX_FINISHED_JOBS = 200
+
+
+@dataclass
+class CoverageJob:
+    id: str
+    status: str = "queued"  # "queued", "running", "completed", "failed"
+    full_recompute: bool = False
+    ride_ids: set[int] = field(default_factory=set)
+    path_ids: set[int] = field(default_factory=set)
+    requests: int = 1  # Number of requests merged into this job
+    paths_updated: Optional[int] = None
+    error: Optional[str] = None
+    tiles_total: int = 0  # Full recomputes only
+    tiles: list[dict] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    queue_entry_ids: set[int] = field(default_factory=set, repr=False)  # coverage_queue rows it covers
+
+
+class CoverageWorker:
+    """Single background thread that runs queued coverage jobs one at a time."""
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._jobs: dict[str, CoverageJob] = {}
+        self._pending: Optional[CoverageJob] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self,
+        ride_ids: Optional[list[int]] = None,
+        path_ids: Optional[list[int]] = None,
+        full_recompute: bool = False
+    ) -> CoverageJob:
+        """
+        Queue coverage work, merging it into the pending job if there is one.
+
+        Args:
+            ride_ids: New rides whose coverage contributions must be added
+            path_ids: Paths whose coverage must be refreshed
+            full_recompute: Rebuild coverage for every path
+
+        Returns:
+            The job the work was queued on.
+        """
+        entry_ids = record_queued_work(ride_ids or [], path_ids or [], full_recompute)
+        return self._queue(ride_ids, path_ids, full_recompute, entry_ids)
+
+    def resume(self) -> Optional[CoverageJob]:
+        """Queue the work recorded in coverage_queue, e.g. left over from before a restart."""
+        with SessionLocal() as db:
+            entries = db.query(
+                CoverageQueueEntry.id,
+                CoverageQueueEntry.ride_id,
+                CoverageQueueEntry.path_id,
+                CoverageQueueEntry.full_recompute
+            ).all()
+        if not entries:
+            return None
+
+        logger.info(f"Resuming {len(entries)} queued coverage entries")
+        return self._queue(
+            [e.ride_id for e in entries if e.ride_id is not None],
+            [e.path_id for e in entries if e.path_id is not None],
+            any(e.full_recompute for e in entries),
+            [e.id for e in entries]
+        )
+
+    def _queue(
+        self,
+        ride_ids: Optional[list[int]],
+        path_ids: Optional[list[int]],
+        full_recompute: bool,
+        entry_ids: list[int]
+    ) -> CoverageJob:
+        with self._lock:
+            job = self._pending
+            if job is None:
+                job = CoverageJob(id=uuid.uuid4().hex)
+                self._pending = job
+                self._jobs[job.id] = job
+                self._prune()
+            else:
+                job.requests += 1
+
+            job.full_recompute = job.full_recompute or full_recompute
+            job.ride_ids.update(ride_ids or [])
+            job.path_ids.update(path_ids or [])
+            job.queue_entry_ids.update(entry_ids)
+
+            self._ensure_started()
+            self._lock.notify()
+
+        return job
+
+    def get(self, job_id: str) -> Optional[CoverageJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="coverage-worker", daemon=True)
+            self._thread.start()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.status in ("completed", "failed")]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._pending is None:
+                    self._lock.wait()
+                job = self._pending
+                self._pending = None
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+
+            try:
+                job.paths_updated = self._execute(job)
+                job.status = "completed"
+                clear_queued_work(job.queue_entry_ids)
+                logger.info(
+                    f"Coverage job {job.id} updated {job.paths_updated} paths "
+                    f"({job.requests} merged requests)"
+                )
+            except Exception as e:
+                logger.error(f"Coverage job {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_at = datetime.utcnow()
+                # Coverage changed, even if only some tiles finished
+                try:
+                    with SessionLocal() as db:
+                        bump_data_version(db)
+                except Exception as e:
+                    logger.error(f"Could not bump the data version after coverage job {job.id}: {e}")
+
+    def _execute(self, job: CoverageJob) -> int:
+        if job.full_recompute:
+            def on_tile_done(tile_result: dict, tiles_done: int, tiles_total: int):
+                job.tiles_total = tiles_total
+                job.tiles.append(tile_result)
+
+            tiles = recompute_coverage_parallel(SessionLocal, COVERAGE_WORKERS, on_tile_done)
+            return sum(t["paths_updated"] for t in tiles)
+
+        db = SessionLocal()
+        try:
+            path_ids = set(job.path_ids)
+            path_ids.update(add_ride_coverage(db, sorted(job.ride_ids)))
+            return refresh_path_coverage(db, sorted(path_ids))
+        finally:
+            db.close()
+
+
+def record_queued_work(ride_ids: list[int], path_ids: list[int], full_recompute: bool) -> list[int]:
+    """
+    Record queued coverage work in coverage_queue.
+
+    Returns:
+        IDs of the rows written; empty if they could not be written, in
+        which case the work is only queued in memory.
+    """
+    rows = (
+        [{"ride_id": ride_id, "path_id": None, "full_recompute": False} for ride_id in ride_ids]
+        + [{"ride_id": None, "path_id": path_id, "full_recompute": False} for path_id in path_ids]
+        + ([{"ride_id": None, "path_id": None, "full_recompute": True}] if full_recompute else [])
+    )
+    if not rows:
+        return []
+
+    table = CoverageQueueEntry.__table__
+    try:
+        with SessionLocal() as db:
+            entry_ids = db.execute(insert(table).returning(table.c.id), rows).scalars().all()
+            db.commit()
+        return entry_ids
+    except Exception as e:
+        logger.error(f"Could not record queued coverage work: {e}")
+        return []
+
+
+def clear_queued_work(entry_ids: set[int]):
+    """Delete coverage_queue rows whose work is done; left in place, they are only redone."""
+    if not entry_ids:
+        return
+    try:
+        with SessionLocal() as db:
+            db.execute(delete(CoverageQueueEntry).where(CoverageQueueEntry.id.in_(entry_ids)))
+            db.commit()
+    except Exception as e:
+        logger.error(f"Could not clear finished coverage work: {e}")
+
+
+coverage_worker = CoverageWorker()
+
+
+def submit_coverage_job(
+    ride_ids: Optional[list[int]] = None,
+    path_ids: Optional[list[int]] = None,
+    full_recompute: bool = False
+) -> CoverageJob:
+    """Queue coverage work on the shared background worker."""
+    return coverage_worker.submit(ride_ids=ride_ids, path_ids=path_ids, full_recompute=full_recompute)
+
+
+def resume_coverage_jobs() -> Optional[CoverageJob]:
+    """Queue coverage work recorded before the last restart, if any."""
+    try:
+        return coverage_worker.resume()
+    except Exception as e:
+        logger.error(f"Could not resume queued coverage work: {e}")
+        return None
+
+
+def get_coverage_job(job_id: str) -> Optional[CoverageJob]:
+    """Look up a queued, running or recently finished coverage job."""
+    return coverage_worker.get(job_id)
@@ -0,0 +1,273 @@
+"""
+In-process coverage engine using Shapely 2.
+
+Produces the same path_segment_coverage profiles and path_ride_coverage
+rows as the PostGIS SQL in app.services.coverage, but does the buffering
+and intersections in Python with vectorized Shapely operations and an STRtree
+over the ride buffers.
+
+compute_coverage() works on plain geometry arrays in British National Grid
+(EPSG:27700) and needs no database, so it can run offline or in CI.
+recompute_coverage_shapely() loads geometries from PostGIS, runs it and
+writes the results back.
+
+Select it with COVERAGE_ENGINE=shapely.
+"""
+
+from datetime import datetime
+from typing import Optional
+import logging
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.coverage import (
+    COVERAGE_BUFFER_METERS,
+    COVERAGE_BUFFER_PROFILES,
+    COVERAGE_MAX_BUFFER_METERS,
+    COVERAGE_MIN_FRACTION,
+    UK_SRID,
+    aggregate_path_coverage
+)
+
+logger = logging.getLogger(__name__)
+
+LINESTRING_TYPE_ID = 1
+
+
+def extract_lines(geometries: np.ndarray) -> np.ndarray:
+    """
+    Keep only the linear parts of each geometry, as MultiLineStrings.
+
+    Equivalent to ST_Multi(ST_CollectionExtract(geom, 2)): points left over
+    from line/polygon intersections are dropped, and geometries without any
+    lines become empty MultiLineStrings.
+    """
+    parts, index = shapely.get_parts(geometries, return_index=True)
+    is_line = shapely.get_type_id(parts) == LINESTRING_TYPE_ID
+
+    result = np.full(len(geometries), shapely.from_wkt("MULTILINESTRING EMPTY"), dtype=object)
+    if is_line.any():
+        # Geometries without lines keep the empty value already in `out`
+        shapely.multilinestrings(parts[is_line], indices=index[is_line], out=result)
+
+    return result
+
+
+def compute_coverage(
+    path_geoms: np.ndarray,
+    ride_geoms: np.ndarray,
+    ride_dates: list[Optional[datetime]],
+    buffer_meters: float = COVERAGE_BUFFER_METERS,
+    min_fraction: float = COVERAGE_MIN_FRACTION
+) -> dict:
+    """
+    Compute path coverage from ride tracks.
+
+    All geometries must be in a metric CRS (EPSG:27700 for our data).
+
+    Args:
+        path_geoms: Array of path LineStrings
+        ride_geoms: Array of ride (Multi)LineStrings
+        ride_dates: Recorded date of each ride, or None
+        buffer_meters: Buffer distance around ride tracks
+        min_fraction: Coverage fraction at which a path counts as ridden
+
+    Returns:
+        Dictionary with per-path arrays "coverage_fraction", "is_ridden" and
+        "last_ridden_date", plus the per-ride contributions as
+        "contrib_path_index", "contrib_ride_index" and "contrib_geometry".
+    """
+    path_geoms = np.asarray(path_geoms, dtype=object)
+    ride_geoms = np.asarray(ride_geoms, dtype=object)
+    n_paths = len(path_geoms)
+
+    coverage_fraction = np.zeros(n_paths, dtype=np.float64)
+    last_ridden_date: list[Optional[datetime]] = [None] * n_paths
+
+    # Candidate (path, ride) pairs whose geometries intersect
+    buffers = shapely.buffer(ride_geoms, buffer_meters)
+    tree = STRtree(buffers)
+    path_index, ride_index = tree.query(path_geoms, predicate="intersects")
+
+    # As in the SQL engine, every ride whose buffer touches a path counts for
+    # its last ridden date, even one that only covers a point of it
+    for i, r in zip(path_index, ride_index):
+        date = ride_dates[r]
+        if date is not None and (last_ridden_date[i] is None or date > last_ridden_date[i]):
+            last_ridden_date[i] = date
+
+    covered = extract_lines(shapely.intersection(path_geoms[path_index], buffers[ride_index]))
+    keep = ~shapely.is_empty(covered)
+    path_index, ride_index, covered = path_index[keep], ride_index[keep], covered[keep]
+
+    # Union the covered pieces of each path, grouped by path
+    order = np.argsort(path_index, kind="stable")
+    sorted_paths = path_index[order]
+    boundaries = np.flatnonzero(np.diff(sorted_paths)) + 1
+    path_lengths = shapely.length(path_geoms)
+
+    for group in np.split(order, boundaries):
+        if len(group) == 0:
+            continue
+        i = path_index[group[0]]
+        if path_lengths[i] > 0:
+            covered_length = shapely.length(shapely.union_all(covered[group]))
+            coverage_fraction[i] = min(covered_length / path_lengths[i], 1.0)
+
+    return {
+        "coverage_fraction": coverage_fraction,
+        "is_ridden": coverage_fraction >= min_fraction,
+        "last_ridden_date": last_ridden_date,
+        "contrib_path_index": path_index,
+        "contrib_ride_index": ride_index,
+        "contrib_geometry": covered
+    }
+
+
+def recompute_coverage_shapely(db: Session, path_ids: Optional[list[int]] = None) -> int:
+    """
+    Recompute coverage for paths with the Shapely engine.
+
+    Drop-in replacement for the PostGIS recompute_coverage(): rebuilds the
+    path_ride_coverage rows of the selected paths and their segment coverage
+    for every COVERAGE_BUFFER_PROFILES width, then rolls the segments up to
+    the path level with aggregate_path_coverage().
+
+    Args:
+        db: Database session
+        path_ids: Optional list of path IDs to update. If None, updates all paths.
+
+    Returns:
+        Number of paths updated.
+    """
+    if path_ids is not None and not path_ids:
+        return 0
+
+    path_filter = ""
+    segment_filter = ""
+    ride_filter = ""
+    params = {"buffer_meters": COVERAGE_MAX_BUFFER_METERS}
+
+    if path_ids:
+        path_filter = "AND p.id = ANY(:path_ids)"
+        segment_filter = "WHERE s.path_id = ANY(:path_ids)"
+        # Only load rides that can reach the selected paths
+        ride_filter = """
+            AND EXISTS (
+                SELECT 1 FROM paths p
+                WHERE p.id = ANY(:path_ids)
+                  AND ST_DWithin(p.geometry_bng, r.geometry_bng, :buffer_meters)
+            )"""
+        params["path_ids"] = path_ids
+
+    paths = db.execute(
+        text(f"""
+            SELECT p.id, ST_AsBinary(p.geometry_bng)
+            FROM paths p
+            WHERE p.geometry_bng IS NOT NULL
+            {path_filter}
+        """),
+        params
+    ).fetchall()
+
+    rides = db.execute(
+        text(f"""
+            SELECT r.id, r.date_recorded, ST_AsBinary(r.geometry_bng)
+            FROM rides r
+            WHERE r.geometry_bng IS NOT NULL
+            {ride_filter}
+        """),
+        params
+    ).fetchall()
+
+    segments = db.execute(
+        text(f"""
+            SELECT s.id, s.path_id, ST_AsBinary(s.geometry)
+            FROM path_segments s
+            {segment_filter}
+        """),
+        params
+    ).fetchall()
+
+    path_row_ids = [p[0] for p in paths]
+    path_geoms = shapely.from_wkb([bytes(p[1]) for p in paths])
+    ride_row_ids = [r[0] for r in rides]
+    ride_dates = [r[1] for r in rides]
+    ride_geoms = shapely.from_wkb([bytes(r[2]) for r in rides])
+
+    # Segments of paths without stored geometry are skipped with their path
+    path_positions = {path_id: i for i, path_id in enumerate(path_row_ids)}
+    segments = [s for s in segments if s[1] in path_positions]
+    segment_geoms = shapely.from_wkb([bytes(s[2]) for s in segments])
+
+    # Per-ride contributions use the widest buffer; narrower profiles filter
+    # them by distance_m
+    result = compute_coverage(path_geoms, ride_geoms, ride_dates, buffer_meters=COVERAGE_MAX_BUFFER_METERS)
+
+    if path_ids:
+        db.execute(
+            text("DELETE FROM path_ride_coverage WHERE path_id = ANY(:path_ids)"),
+            {"path_ids": path_ids}
+        )
+    else:
+        db.execute(text("DELETE FROM path_ride_coverage"))
+
+    contrib_paths = result["contrib_path_index"]
+    contrib_rides = result["contrib_ride_index"]
+    distances = shapely.distance(path_geoms[contrib_paths], ride_geoms[contrib_rides])
+
+    contributions = [
+        {
+            "path_id": path_row_ids[pi],
+            "ride_id": ride_row_ids[ri],
+            "ride_date": ride_dates[ri],
+            "distance_m": float(distance),
+            "covered_length_m": float(shapely.length(geom)),
+            "geometry": shapely.to_wkb(geom)
+        }
+        for pi, ri, distance, geom in zip(contrib_paths, contrib_rides, distances, result["contrib_geometry"])
+    ]
+    if contributions:
+        db.execute(
+            text(f"""
+                INSERT INTO path_ride_coverage (path_id, ride_id, ride_date, distance_m, covered_length_m, geometry)
+                VALUES (:path_id, :ride_id, :ride_date, :distance_m, :covered_length_m,
+                        ST_GeomFromWKB(:geometry, {UK_SRID}))
+            """),
+            contributions
+        )
+
+    segment_rows = []
+    for buffer_m in COVERAGE_BUFFER_PROFILES:
+        segment_result = compute_coverage(segment_geoms, ride_geoms, ride_dates, buffer_meters=buffer_m)
+        segment_rows.extend(
+            {
+                "segment_id": segment[0],
+                "buffer_m": buffer_m,
+                "coverage_fraction": float(segment_result["coverage_fraction"][i]),
+                "is_ridden": bool(segment_result["is_ridden"][i]),
+                "last_ridden_date": segment_result["last_ridden_date"][i]
+            }
+            for i, segment in enumerate(segments)
+        )
+    if segment_rows:
+        db.execute(
+            text("""
+                INSERT INTO path_segment_coverage (segment_id, buffer_m, coverage_fraction, is_ridden, last_ridden_date)
+                VALUES (:segment_id, :buffer_m, :coverage_fraction, :is_ridden, :last_ridden_date)
+                ON CONFLICT (segment_id, buffer_m) DO UPDATE
+                SET coverage_fraction = EXCLUDED.coverage_fraction,
+                    is_ridden = EXCLUDED.is_ridden,
+                    last_ridden_date = EXCLUDED.last_ridden_date
+            """),
+            segment_rows
+        )
+
+    updated_count = aggregate_path_coverage(db, path_ids)
+    logger.info(f"Updated coverage for {updated_count} paths (shapely engine)")
+
+    return updated_count
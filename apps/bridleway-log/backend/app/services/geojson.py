@@ -0,0 +1,94 @@
+"""
+Streaming GeoJSON FeatureCollections.
+
+Path and ride layers can run to tens of megabytes of GeoJSON. Rather than
+building every feature as a dict and serializing the lot at the end, rows
+are read through a server-side cursor, yield_per rows at a time, and each
+batch of features is written out as soon as it is fetched. The geometry
+column is already GeoJSON text from ST_AsGeoJSON, so it is spliced into the
+output as is; only the properties go through the JSON encoder.
+
+The stream runs after the endpoint has returned, when the request's
+get_db() session is already closed, so it opens a session of its own.
+
+Alternatively feature_collection_sql() has PostgreSQL assemble the whole
+collection with json_build_object/json_agg, leaving Python a single text
+value to send.
+"""
+
+from typing import Any, Callable, Iterator, Optional
+import json
+
+from sqlalchemy import Select, select, func, cast, literal, JSON, Text
+
+from app.db import SessionLocal
+
+# Rows fetched from the server-side cursor per round trip
+GEOJSON_STREAM_ROWS = 1000
+
+
+def feature_json(properties: dict, geometry: Optional[str]) -> str:
+    """A GeoJSON Feature, with geometry given as GeoJSON text."""
+    return (
+        '{"type":"Feature","properties":'
+        + json.dumps(properties, separators=(",", ":"))
+        + ',"geometry":'
+        + (geometry or "null")
+        + "}"
+    )
+
+
+def feature_collection_sql(rows, properties: dict, geometry) -> Select:
+    """
+    SELECT of one text value: a GeoJSON FeatureCollection of the rows of a subquery.
+
+    Args:
+        rows: Subquery the features are built from
+        properties: Feature property names mapped to SQL expressions on rows
+        geometry: GeoJSON text column of rows
+    """
+    property_args = []
+    for name, value in properties.items():
+        property_args += [literal(name), value]
+
+    feature = func.json_build_object(
+        literal("type"), literal("Feature"),
+        literal("properties"), func.json_build_object(*property_args),
+        literal("geometry"), cast(geometry, JSON)
+    )
+    collection = func.json_build_object(
+        literal("type"), literal("FeatureCollection"),
+        literal("features"), func.coalesce(func.json_agg(feature), cast(literal("[]"), JSON))
+    )
+    return select(cast(collection, Text)).select_from(rows)
+
+
+def stream_feature_collection(
+    statement: Select,
+    properties: Callable[[Any], dict],
+    members: Optional[dict] = None,
+    geometry_column: str = "geometry"
+) -> Iterator[bytes]:
+    """
+    Yield a GeoJSON FeatureCollection built from the rows of a query.
+
+    Args:
+        statement: SELECT with a GeoJSON text column, e.g. query.statement
+        properties: Builds the feature properties of a row
+        members: Extra top-level members of the FeatureCollection
+        geometry_column: Label of the GeoJSON text column
+    """
+    head = {"type": "FeatureCollection", **(members or {})}
+    yield (json.dumps(head, separators=(",", ":"))[:-1] + ',"features":[').encode()
+
+    first = True
+    with SessionLocal() as session:
+        result = session.execute(statement.execution_options(yield_per=GEOJSON_STREAM_ROWS))
+        for rows in result.partitions():
+            features = ",".join(feature_json(properties(row), row._mapping[geometry_column]) for row in rows)
+            if not features:
+                continue
+            yield (features if first else "," + features).encode()
+            first = False
+
+    yield b"]}"
@@ -0,0 +1,606 @@
+"""
+Streaming GPX parser.
+
+Reads GPX with expat instead of building a gpxpy object tree. Track and
+route points are collected straight into contiguous float64 arrays, one set
+per segment, and distance, elevation gain and start time are computed with
+NumPy. The ride geometry is built from those arrays with Shapely and handed
+to PostGIS as WKB. Distances use the same flat-earth / haversine rules as gpxpy, so rides
+imported before and after the switch get the same distance_km.
+
+Parse results of files with a known SHA-256 are cached on disk as compressed
+NumPy arrays (see load_cached_parse()), so re-importing archived files skips
+the XML entirely. The cache is bounded by GPX_PARSE_CACHE_MAX_BYTES.
+
+Each parsed track also gets a fingerprint (see track_fingerprint()) that
+usually stays the same when one activity is exported twice with different
+metadata, so near-duplicates can be found by index lookup.
+
+Used by the upload API and by scripts/import_gpx.py. The upload API runs
+hash_and_parse_gpx() and parse_gpx_path() in a shared process pool, see
+get_parse_pool().
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+from xml.parsers import expat
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+
+import numpy as np
+import shapely
+
+from app.config import GPX_PARSE_WORKERS, GPX_PARSE_CACHE_DIR, GPX_PARSE_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6378.137 * 1000
+ONE_DEGREE = (2 * np.pi * EARTH_RADIUS) / 360  # One degree in meters
+
+# Point-to-point steps larger than this (in degrees) use the haversine formula
+HAVERSINE_THRESHOLD_DEGREES = 0.2
+
+# Share of points that must carry elevation for a segment to use 3D distance
+ELEVATION_MIN_SHARE = 0.75
+
+READ_CHUNK_BYTES = 1 << 20
+
+# Track fingerprints: start time bucket in seconds, and bits per axis of the
+# geohash grid (15 bits each = geohash precision 6, cells of about 1.2 x 0.6 km)
+FINGERPRINT_TIME_BUCKET_SECONDS = 60
+FINGERPRINT_GRID_BITS = 15
+# Start time buckets either side that still count as the same activity
+FINGERPRINT_TIME_TOLERANCE_BUCKETS = 1
+# Hex digits of the cell sequence digest; with the bucket it fits String(64)
+FINGERPRINT_DIGEST_CHARS = 48
+
+# Bump when parse_gpx() output or the cache layout changes, so older cache
+# entries are ignored
+PARSE_CACHE_VERSION = 5
+
+# Cache entries written by a process between checks of the cache size
+PARSE_CACHE_PRUNE_EVERY = 100
+
+
+@dataclass
+class GpxSegment:
+    """One track segment or route as parallel float64 arrays."""
+    lon: np.ndarray
+    lat: np.ndarray
+    ele: np.ndarray  # NaN where the point has no elevation
+    time: np.ndarray  # Seconds since the Unix epoch (UTC), NaN where missing
+    is_route: bool = False
+
+    def __len__(self) -> int:
+        return len(self.lon)
+
+    @property
+    def coords(self) -> np.ndarray:
+        """(n, 2) array of lon/lat pairs."""
+        return np.column_stack((self.lon, self.lat))
+
+
+@dataclass
+class ParsedGpx:
+    """Geometry and summary values of a GPX file."""
+    segments: list[GpxSegment] = field(default_factory=list)  # Segments with at least 2 points
+    distance_km: float = 0.0
+    elevation_gain_m: Optional[float] = None
+    start_time: Optional[datetime] = None
+    # Set when loaded from the parse cache, whose coordinates are rounded
+    cached_fingerprint: Optional[str] = None
+
+    @property
+    def date_recorded(self) -> Optional[str]:
+        return self.start_time.isoformat() if self.start_time else None
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        return self.cached_fingerprint or track_fingerprint(self)
+
+    def to_wkb(self) -> Optional[bytes]:
+        """MULTILINESTRING WKB of the segments, or None if there are none."""
+        if not self.segments:
+            return None
+        geometry = shapely.multilinestrings([segment.coords for segment in self.segments])
+        return shapely.to_wkb(geometry)
+
+
+# Element kinds the parser cares about, by local name
+OTHER, TRACK_SEGMENT, ROUTE, POINT, ELEVATION, TIME = range(6)
+TAG_KINDS = {
+    "trkseg": TRACK_SEGMENT,
+    "rte": ROUTE,
+    "trkpt": POINT,
+    "rtept": POINT,
+    "ele": ELEVATION,
+    "time": TIME
+}
+
+
+class _GpxHandler:
+    """expat callbacks collecting trkpt/rtept values into flat arrays."""
+
+    def __init__(self, parser):
+        self.segments: list[GpxSegment] = []
+        self._parser = parser
+        self._kinds: dict[str, int] = {}  # Cache of element name -> kind, names may be prefixed
+        self._depth = 0
+        self._segment_open = False
+        self._point_depth = -1
+        self._field = OTHER
+        self._text: list[str] = []
+        self._reset_segment()
+
+    def _reset_segment(self):
+        self._lon = array("d")
+        self._lat = array("d")
+        self._ele: list[str] = []
+        self._time: list[str] = []
+
+    def _kind(self, name: str) -> int:
+        kind = self._kinds.get(name)
+        if kind is None:
+            kind = self._kinds[name] = TAG_KINDS.get(name.rpartition(":")[2], OTHER)
+        return kind
+
+    def start(self, name: str, attrs: dict):
+        self._depth += 1
+        kind = self._kind(name)
+        if kind == OTHER:
+            return
+
+        if kind == TRACK_SEGMENT or kind == ROUTE:
+            self._segment_open = True
+            self._reset_segment()
+        elif kind == POINT:
+            if self._segment_open and self._point_depth < 0:
+                self._point_depth = self._depth
+                self._lon.append(float(attrs.get("lon", "nan")))
+                self._lat.append(float(attrs.get("lat", "nan")))
+                self._ele.append("nan")
+                self._time.append("")
+        elif self._depth == self._point_depth + 1:
+            # Only direct children of the point; extensions may reuse the names.
+            # Text is only collected inside these, which skips the whitespace
+            # callbacks between elements.
+            self._field = kind
+            self._text = []
+            self._parser.CharacterDataHandler = self._text.append
+
+    def end(self, name: str):
+        depth = self._depth
+        self._depth -= 1
+        kind = self._kinds[name]
+        if kind == OTHER:
+            return
+
+        if self._field != OTHER and depth == self._point_depth + 1:
+            value = "".join(self._text).strip()
+            if value:
+                if self._field == ELEVATION:
+                    self._ele[-1] = value
+                else:
+                    self._time[-1] = value
+            self._field = OTHER
+            self._parser.CharacterDataHandler = None
+        elif kind == POINT and depth == self._point_depth:
+            self._point_depth = -1
+        elif (kind == TRACK_SEGMENT or kind == ROUTE) and self._segment_open:
+            self._segment_open = False
+            self.segments.append(GpxSegment(
+                lon=np.frombuffer(self._lon, dtype=np.float64),
+                lat=np.frombuffer(self._lat, dtype=np.float64),
+                ele=np.array(self._ele, dtype=np.float64),
+                time=parse_times(self._time),
+                is_route=kind == ROUTE
+            ))
+            self._reset_segment()
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Convert one ISO 8601 timestamp to seconds since the epoch, assuming UTC if it has no offset.
+
+    Values that are not timestamps give NaN, as gpxpy treated them as missing.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_times(values: list[str]) -> np.ndarray:
+    """
+    Convert ISO 8601 timestamps to seconds since the epoch, NaN for blanks and malformed values.
+
+    The usual all-UTC "...Z" case is converted in one NumPy call, to the
+    microsecond; anything else, or a batch NumPy rejects, goes through
+    parse_timestamp() one value at a time.
+    """
+    result = np.full(len(values), np.nan)
+    present = [i for i, v in enumerate(values) if v]
+    if not present:
+        return result
+
+    stamps = [values[i] for i in present]
+    if all(s.endswith("Z") for s in stamps):
+        try:
+            parsed = np.array([s[:-1] for s in stamps], dtype="datetime64[us]")
+            result[present] = parsed.astype(np.int64) / 1e6
+            return result
+        except ValueError:
+            pass
+    result[present] = [parse_timestamp(s) for s in stamps]
+    return result
+
+
+def segment_distance(segment: GpxSegment) -> float:
+    """
+    Length of a segment in meters, as gpxpy's length_3d()/length_2d() computes it.
+
+    Steps over HAVERSINE_THRESHOLD_DEGREES use the haversine formula, others
+    a flat-earth approximation; elevation is included when the segment has
+    enough of it.
+    """
+    if len(segment) < 2:
+        return 0.0
+
+    # gpxpy measures from each point back to the previous one
+    lat1, lat2 = segment.lat[1:], segment.lat[:-1]
+    lon1, lon2 = segment.lon[1:], segment.lon[:-1]
+
+    coef = np.cos(np.radians(lat1))
+    flat = np.hypot(lat1 - lat2, (lon1 - lon2) * coef) * ONE_DEGREE
+
+    has_elevation = np.nan_to_num(segment.ele) != 0
+    if len(segment) > 2 and has_elevation.mean() > ELEVATION_MIN_SHARE:
+        ele_diff = np.diff(segment.ele)
+        flat = np.where(np.isnan(ele_diff), flat, np.hypot(flat, np.nan_to_num(ele_diff)))
+
+    far = (np.abs(lat1 - lat2) > HAVERSINE_THRESHOLD_DEGREES) | (np.abs(lon1 - lon2) > HAVERSINE_THRESHOLD_DEGREES)
+    if far.any():
+        r_lat1, r_lat2 = np.radians(lat1[far]), np.radians(lat2[far])
+        d_lon = np.radians(lon1[far] - lon2[far])
+        a = np.sin((r_lat1 - r_lat2) / 2) ** 2 + np.sin(d_lon / 2) ** 2 * np.cos(r_lat1) * np.cos(r_lat2)
+        flat[far] = EARTH_RADIUS * 2 * np.arcsin(np.sqrt(a))
+
+    return float(np.nansum(flat))
+
+
+def track_fingerprint(parsed: ParsedGpx) -> Optional[str]:
+    """
+    Fingerprint of a track that ignores most of how it was exported.
+
+    "<start bucket>:<cells digest>": the start time in whole
+    FINGERPRINT_TIME_BUCKET_SECONDS, and a SHA-256 prefix of the geohash
+    cells the track passes through, in order of first visit. Creator tags,
+    extensions and thinning points within cells don't change it.
+
+    The cells have to match exactly: if a point lands across a cell edge in
+    one export and not the other (say from coordinate rounding or
+    resampling right at the edge), the digests differ and the exports are
+    not matched. The start time is matched loosely instead, a bucket either
+    side, by looking up fingerprint_candidates().
+
+    Returns:
+        The fingerprint, or None for tracks without timestamps (planned
+        routes), where the cells alone would match distinct rides.
+    """
+    if not parsed.segments or parsed.start_time is None:
+        return None
+
+    lon = np.concatenate([s.lon for s in parsed.segments])
+    lat = np.concatenate([s.lat for s in parsed.segments])
+    valid = ~(np.isnan(lon) | np.isnan(lat))
+    lon, lat = lon[valid], lat[valid]
+
+    cells_per_axis = 1 << FINGERPRINT_GRID_BITS
+    x = np.clip(((lon + 180.0) / 360.0 * cells_per_axis).astype(np.int64), 0, cells_per_axis - 1)
+    y = np.clip(((lat + 90.0) / 180.0 * cells_per_axis).astype(np.int64), 0, cells_per_axis - 1)
+    cells = (x << FINGERPRINT_GRID_BITS) | y
+
+    _, first_seen = np.unique(cells, return_index=True)
+    sequence = cells[np.sort(first_seen)]
+
+    time_bucket = int(parsed.start_time.timestamp()) // FINGERPRINT_TIME_BUCKET_SECONDS
+    digest = hashlib.sha256(sequence.astype("<i8").tobytes()).hexdigest()[:FINGERPRINT_DIGEST_CHARS]
+    return f"{time_bucket}:{digest}"
+
+
+def fingerprint_candidates(fingerprint: str) -> list[str]:
+    """
+    Fingerprints that count as the same activity as this one.
+
+    Same cells, with a start time up to FINGERPRINT_TIME_TOLERANCE_BUCKETS
+    buckets either side, so two exports whose start times straddle a bucket
+    boundary still match.
+    """
+    bucket, _, digest = fingerprint.partition(":")
+    if not digest:
+        return [fingerprint]
+    tolerance = FINGERPRINT_TIME_TOLERANCE_BUCKETS
+    return [f"{int(bucket) + offset}:{digest}" for offset in range(-tolerance, tolerance + 1)]
+
+
+def parse_gpx(content: Union[bytes, BinaryIO]) -> ParsedGpx:
+    """
+    Parse GPX content into per-segment arrays and summary values.
+
+    Accepts the content itself or a binary file, which is read in
+    READ_CHUNK_BYTES chunks. Track segments are used when there are any with
+    at least two points; otherwise routes are used. Distance and elevation
+    gain come from the tracks only, matching the previous gpxpy-based importer.
+    """
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    handler = _GpxHandler(parser)
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        view = memoryview(content)
+        for offset in range(0, len(view), READ_CHUNK_BYTES):
+            parser.Parse(view[offset:offset + READ_CHUNK_BYTES], False)
+    else:
+        while chunk := content.read(READ_CHUNK_BYTES):
+            parser.Parse(chunk, False)
+    parser.Parse(b"", True)
+
+    tracks = [s for s in handler.segments if not s.is_route]
+    routes = [s for s in handler.segments if s.is_route]
+
+    result = ParsedGpx(segments=[s for s in tracks if len(s) >= 2])
+    timed = tracks
+    if not result.segments:
+        result.segments = [s for s in routes if len(s) >= 2]
+        timed = tracks + routes
+
+    if not result.segments:
+        return ParsedGpx()
+
+    result.distance_km = sum(segment_distance(s) for s in tracks) / 1000.0
+
+    # Gain is accumulated across segment boundaries, skipping missing values
+    elevations = np.concatenate([s.ele for s in tracks]) if tracks else np.empty(0)
+    elevations = elevations[~np.isnan(elevations)]
+    gain = float(np.clip(np.diff(elevations), 0, None).sum()) if len(elevations) > 1 else 0.0
+    result.elevation_gain_m = gain if gain > 0 else None
+
+    times = np.concatenate([s.time for s in timed])
+    if not np.isnan(times).all():
+        result.start_time = datetime.fromtimestamp(float(np.nanmin(times)), tz=timezone.utc)
+
+    return result
+
+
+def parse_cache_path(file_hash: str) -> Path:
+    """Cache path of the parse result of the GPX file with this SHA-256 hash."""
+    return GPX_PARSE_CACHE_DIR / file_hash[:2] / f"{file_hash}.npz"
+
+
+def load_cached_parse(file_hash: str) -> Optional[ParsedGpx]:
+    """
+    Load a cached parse result, or None if there is no usable entry.
+
+    Entries hold the points of all segments as float64 arrays (lon/lat pairs,
+    elevation and time), the segment offsets into them, and the summary
+    values and fingerprint, with NaN for missing values. Nothing is rounded,
+    so a hit gives exactly the geometry of a fresh parse. A hit marks the
+    entry as recently used.
+    """
+    path = parse_cache_path(file_hash)
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path) as cached:
+            if int(cached["version"]) != PARSE_CACHE_VERSION:
+                return None
+            coords = cached["coords"]
+            ele = cached["ele"]
+            offsets = cached["offsets"]
+            is_route = cached["is_route"]
+            distance_km, elevation_gain_m, start_time = cached["summary"]
+            fingerprint = str(cached["fingerprint"])
+            time = cached["time"]
+        os.utime(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable parse cache entry {path}: {e}")
+        return None
+
+    segments = [
+        GpxSegment(
+            lon=coords[start:end, 0],
+            lat=coords[start:end, 1],
+            ele=ele[start:end],
+            time=time[start:end],
+            is_route=bool(route)
+        )
+        for start, end, route in zip(offsets[:-1], offsets[1:], is_route)
+    ]
+    return ParsedGpx(
+        segments=segments,
+        distance_km=float(distance_km),
+        elevation_gain_m=None if np.isnan(elevation_gain_m) else float(elevation_gain_m),
+        start_time=None if np.isnan(start_time) else datetime.fromtimestamp(float(start_time), tz=timezone.utc),
+        cached_fingerprint=fingerprint or None
+    )
+
+
+_cache_writes = 0
+
+
+def save_cached_parse(file_hash: str, parsed: ParsedGpx):
+    """
+    Cache a parse result, written to a temporary name and renamed into place.
+
+    Every PARSE_CACHE_PRUNE_EVERY writes, the cache is pruned back to
+    GPX_PARSE_CACHE_MAX_BYTES.
+    """
+    global _cache_writes
+
+    path = parse_cache_path(file_hash)
+    segments = parsed.segments
+    start_time = np.nan if parsed.start_time is None else parsed.start_time.timestamp()
+    summary = np.array([
+        parsed.distance_km,
+        np.nan if parsed.elevation_gain_m is None else parsed.elevation_gain_m,
+        start_time
+    ])
+
+    def concat(values: list[np.ndarray], width: int = 0) -> np.ndarray:
+        if values:
+            return np.concatenate(values).astype(np.float64)
+        return np.empty((0, width) if width else 0, dtype=np.float64)
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                np.savez_compressed(
+                    tmp,
+                    version=np.array(PARSE_CACHE_VERSION),
+                    coords=concat([s.coords for s in segments], 2),
+                    ele=concat([s.ele for s in segments]),
+                    time=concat([s.time for s in segments]),
+                    offsets=np.cumsum([0] + [len(s) for s in segments]),
+                    is_route=np.array([s.is_route for s in segments], dtype=bool),
+                    summary=summary,
+                    fingerprint=np.array(parsed.fingerprint or "")
+                )
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+    except Exception as e:
+        logger.warning(f"Failed to cache parse result of {file_hash}: {e}")
+        return
+
+    _cache_writes += 1
+    if _cache_writes % PARSE_CACHE_PRUNE_EVERY == 0:
+        prune_parse_cache()
+
+
+def prune_parse_cache(max_bytes: int = GPX_PARSE_CACHE_MAX_BYTES) -> int:
+    """
+    Remove the least recently used parse cache entries beyond max_bytes.
+
+    Returns:
+        Number of entries removed
+    """
+    entries = []
+    for path in GPX_PARSE_CACHE_DIR.glob("*/*.npz"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+
+    if removed:
+        logger.info(f"Removed {removed} parse cache entries, {total} bytes left")
+    return removed
+
+
+def parse_gpx_cached(content: Union[bytes, BinaryIO], file_hash: str) -> ParsedGpx:
+    """parse_gpx(), reading and filling the parse cache for this file hash."""
+    parsed = load_cached_parse(file_hash)
+    if parsed is None:
+        parsed = parse_gpx(content)
+        save_cached_parse(file_hash, parsed)
+    return parsed
+
+
+def parse_gpx_file(
+    content: Union[bytes, BinaryIO],
+    file_hash: Optional[str] = None
+) -> tuple[Optional[bytes], Optional[str], float, Optional[float], Optional[str]]:
+    """
+    Parse GPX file content and extract geometry and metadata.
+
+    Args:
+        content: The GPX file content, or a binary file to read it from
+        file_hash: SHA-256 hash of the content, if known; the parse cache is
+            then used
+
+    Returns:
+        Tuple of (wkb_geometry, date_recorded, distance_km, elevation_gain_m,
+        track_fingerprint)
+    """
+    parsed = parse_gpx_cached(content, file_hash) if file_hash else parse_gpx(content)
+    return parsed.to_wkb(), parsed.date_recorded, parsed.distance_km, parsed.elevation_gain_m, parsed.fingerprint
+
+
+def parse_gpx_path(
+    path: str,
+    file_hash: Optional[str] = None
+) -> tuple[Optional[bytes], Optional[str], float, Optional[float], Optional[str]]:
+    """
+    parse_gpx_file() for a file on disk, read in chunks.
+
+    Module-level so it can be sent to the parse process pool.
+    """
+    with open(path, "rb") as f:
+        return parse_gpx_file(f, file_hash)
+
+
+def hash_and_parse_gpx(content: bytes) -> tuple[str, tuple]:
+    """
+    SHA-256 hash of GPX content together with its parse_gpx_file() result.
+
+    Module-level so it can be sent to the parse process pool.
+    """
+    file_hash = hashlib.sha256(content).hexdigest()
+    return file_hash, parse_gpx_file(content, file_hash)
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for CPU-bound GPX hashing and parsing.
+
+    Created on first use with GPX_PARSE_WORKERS processes. Workers are
+    spawned rather than forked, since the web process also runs database
+    and coverage threads.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=GPX_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+def shutdown_parse_pool():
+    """Stop the parse pool workers, if the pool was started."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(cancel_futures=True)
+            _parse_pool = None
@@ -0,0 +1,183 @@
+"""
+Content-addressed GPX archive.
+
+Uploaded GPX files are stored gzip-compressed under GPX_STORAGE_DIR/objects,
+named by their SHA-256 file_hash (the same hash rides are deduplicated on):
+
+    objects/ab/abcdef...0123.gpx.gz
+
+Identical files are stored once, and a Ride row finds its file from
+file_hash alone. Bulk imports compress files in parallel before knowing
+whether their rides will be inserted. They stage them with stage_gpx() and
+only move the ones that were into place with commit_staged_gpx().
+
+Files saved before the archive existed used the layout
+YYYYMMDD_HHMMSS_<hash8>_<name>.gpx directly in GPX_STORAGE_DIR; they are
+still found by find_legacy_gpx().
+"""
+
+from pathlib import Path
+from typing import Iterator, Optional
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from app.config import GPX_STORAGE_DIR
+
+logger = logging.getLogger(__name__)
+
+GPX_OBJECT_DIR = GPX_STORAGE_DIR / "objects"
+GPX_OBJECT_SUFFIX = ".gpx.gz"
+GPX_COMPRESS_LEVEL = 6
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def gpx_object_path(file_hash: str) -> Path:
+    """Archive path of the GPX file with this SHA-256 hash."""
+    return GPX_OBJECT_DIR / file_hash[:2] / f"{file_hash}{GPX_OBJECT_SUFFIX}"
+
+
+def store_gpx(content: bytes, file_hash: str) -> Optional[Path]:
+    """
+    Store GPX content in the archive, unless it is already there.
+
+    The compressed file is written to a temporary name and renamed into
+    place, so concurrent uploads of the same file never see a partial object.
+
+    Args:
+        content: The GPX file content
+        file_hash: SHA-256 hash of the content
+
+    Returns:
+        Path to the archived file, or None if storing failed
+    """
+    def write(tmp):
+        # mtime=0 keeps the compressed bytes a pure function of the content
+        tmp.write(gzip.compress(content, compresslevel=GPX_COMPRESS_LEVEL, mtime=0))
+
+    return _store_object(file_hash, len(content), write)
+
+
+def stage_gpx(content: bytes, file_hash: str) -> Optional[Path]:
+    """
+    Compress GPX content to a temporary file beside its archive path.
+
+    The file is not part of the archive until commit_staged_gpx() moves it
+    into place; discard_staged_gpx() deletes it instead.
+
+    Returns:
+        Path to the staged file, or None if staging failed
+    """
+    path = gpx_object_path(file_hash)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return _write_temp(path, lambda tmp: tmp.write(
+            gzip.compress(content, compresslevel=GPX_COMPRESS_LEVEL, mtime=0)
+        ))
+    except Exception as e:
+        logger.error(f"Failed to stage GPX file {file_hash}: {e}")
+        return None
+
+
+def commit_staged_gpx(staged: Path, file_hash: str) -> Optional[Path]:
+    """Move a file staged by stage_gpx() into the archive."""
+    path = gpx_object_path(file_hash)
+    try:
+        if path.exists():
+            staged.unlink(missing_ok=True)
+        else:
+            os.replace(staged, path)
+            logger.info(f"Archived GPX file {file_hash} ({path.stat().st_size} bytes)")
+        return path
+    except Exception as e:
+        logger.error(f"Failed to archive GPX file {file_hash}: {e}")
+        return None
+
+
+def discard_staged_gpx(staged: Path):
+    """Delete a file staged by stage_gpx() that is not going in the archive."""
+    staged.unlink(missing_ok=True)
+
+
+def store_gpx_file(source: Path, file_hash: str) -> Optional[Path]:
+    """
+    Store a GPX file from disk in the archive, compressing it in chunks.
+
+    Same as store_gpx(), without reading the whole file into memory.
+    """
+    def write(tmp):
+        with open(source, "rb") as src, gzip.GzipFile(
+            fileobj=tmp, mode="wb", compresslevel=GPX_COMPRESS_LEVEL, mtime=0
+        ) as gz:
+            shutil.copyfileobj(src, gz, STREAM_CHUNK_BYTES)
+
+    return _store_object(file_hash, source.stat().st_size, write)
+
+
+def _store_object(file_hash: str, size: int, write) -> Optional[Path]:
+    """Write an archive object through a temporary file, unless it already exists."""
+    path = gpx_object_path(file_hash)
+    if path.exists():
+        return path
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _write_temp(path, write)
+        try:
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink()
+            raise
+
+        logger.info(f"Archived GPX file {file_hash} ({size} bytes -> {path.stat().st_size})")
+        return path
+
+    except Exception as e:
+        logger.error(f"Failed to archive GPX file {file_hash}: {e}")
+        return None
+
+
+def _write_temp(path: Path, write) -> Path:
+    """Write a temporary file in the directory of path and return its name."""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            write(tmp)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return Path(tmp_name)
+
+
+def iter_archived_gpx() -> Iterator[tuple[str, Path]]:
+    """Yield (file_hash, path) for each file in the archive."""
+    for path in sorted(GPX_OBJECT_DIR.glob(f"*/*{GPX_OBJECT_SUFFIX}")):
+        yield path.name[:-len(GPX_OBJECT_SUFFIX)], path
+
+
+def find_legacy_gpx(file_hash: str) -> Optional[Path]:
+    """
+    Find an uncompressed GPX file saved before the archive existed.
+
+    Legacy names only carry the first 8 hex digits of the hash, so each
+    candidate's content is hashed and compared with the full file_hash.
+    """
+    for path in sorted(GPX_STORAGE_DIR.glob(f"*_{file_hash[:8]}_*")):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(STREAM_CHUNK_BYTES):
+                digest.update(chunk)
+        if digest.hexdigest() == file_hash:
+            return path
+    return None
+
+
+def iter_gpx(path: Path) -> Iterator[bytes]:
+    """Stream the uncompressed content of an archived or legacy GPX file."""
+    opener = gzip.open if path.name.endswith(GPX_OBJECT_SUFFIX) else open
+    with opener(path, "rb") as f:
+        while chunk := f.read(STREAM_CHUNK_BYTES):
+            yield chunk
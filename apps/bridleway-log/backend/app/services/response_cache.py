@@ -0,0 +1,183 @@
+"""
+In-memory cache of serialized API responses.
+
+Paths, stats and ride GeoJSON only change when rides or paths are uploaded,
+deleted or imported, or coverage is recomputed. Those mutations call
+bump_data_version() once their changes are committed, and cached responses
+are keyed by (path, normalized query parameters, data version), so a bump
+makes every older entry unreachable; they then age out of the LRU.
+
+The data version is the data_version sequence in PostgreSQL, read on each
+request, so bumps from the import and recompute scripts and from other
+web workers are seen straight away. nextval() takes effect outside the
+transaction, which is why bumps come after the commit rather than with it.
+
+Responses carry a strong ETag derived from their bytes, and a request whose
+If-None-Match matches gets an empty 304, so a repeat page load costs neither
+a query nor a transfer.
+
+Large GeoJSON responses are streamed on a miss (see app.services.geojson);
+their chunks are collected as they go out and cached once the stream ends,
+so the ETag is only sent from the second request on.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Optional
+import hashlib
+import json
+import threading
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    media_type: str
+
+
+class ResponseCache:
+    """LRU of response bodies, bounded by entry count and total size."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, CachedBody] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: tuple) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: CachedBody):
+        if len(entry.body) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old.body)
+            self._entries[key] = entry
+            self._size += len(entry.body)
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+
+
+def bump_data_version(db: Session) -> int:
+    """Mark cached responses as stale after a committed data change."""
+    return db.execute(text("SELECT nextval('data_version')")).scalar()
+
+
+def read_data_version(db: Session) -> int:
+    """Current data version; 0 until the first bump."""
+    return db.execute(text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM data_version")).scalar()
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header lists this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+def cached_body_response(request: Request, entry: CachedBody) -> Response:
+    """200 with the cached body, or 304 if the client already has it."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+class CacheLookup:
+    """
+    Result of looking a request up in the response cache.
+
+    Endpoints return lookup.response when it is set, and otherwise build
+    their result and return lookup.store(result), or lookup.stream(chunks)
+    for a streamed body.
+    """
+
+    def __init__(self, request: Request, version: int):
+        self.request = request
+        self.version = version
+        self.key = (
+            request.url.path,
+            tuple(sorted(request.query_params.multi_items())),
+            self.version
+        )
+        entry = response_cache.get(self.key)
+        self.response: Optional[Response] = cached_body_response(request, entry) if entry else None
+
+    def store(self, result: Any) -> Response:
+        """Serialize a JSON result, cache it and return the response."""
+        body = json.dumps(result, separators=(",", ":")).encode()
+        return self.store_body(body, "application/json")
+
+    def store_body(self, body: bytes, media_type: str) -> Response:
+        """Cache an already serialized body and return the response."""
+        return cached_body_response(self.request, self._put(body, media_type))
+
+    def stream(self, chunks: Iterable[bytes], media_type: str = "application/json") -> StreamingResponse:
+        """
+        Stream a body, caching it once it has been sent in full.
+
+        Bodies larger than the whole cache are passed through without being
+        kept, so they don't hold their size in memory while streaming.
+        """
+        return StreamingResponse(
+            self._tee(chunks, media_type),
+            media_type=media_type,
+            headers={"Cache-Control": "no-cache"}
+        )
+
+    def _tee(self, chunks: Iterable[bytes], media_type: str) -> Iterator[bytes]:
+        kept: Optional[list[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if kept is not None:
+                size += len(chunk)
+                if size > response_cache.max_bytes:
+                    kept = None
+                else:
+                    kept.append(chunk)
+            yield chunk
+
+        if kept is not None:
+            self._put(b"".join(kept), media_type)
+
+    def _put(self, body: bytes, media_type: str) -> CachedBody:
+        entry = CachedBody(body=body, etag=make_etag(body), media_type=media_type)
+        response_cache.put(self.key, entry)
+        return entry
+
+
+def lookup_cached_response(request: Request, db: Session) -> CacheLookup:
+    """
+    Look up a GET request in the response cache.
+
+    The data version is read before the endpoint queries anything, so a
+    change committed while the response is being built leaves it under an
+    older version.
+    """
+    return CacheLookup(request, read_data_version(db))
@@ -0,0 +1,421 @@
+"""
+Batched ride import.
+
+Used by the ZIP upload endpoint and the bulk modes of scripts/import_gpx.py
+to ingest large exports (Strava, Garmin) without one round trip per file:
+
+- existing file hashes are loaded once, so duplicates are skipped before
+  any parsing; track fingerprints are loaded too, so the same activity
+  exported differently is skipped after parsing
+- a later copy of a file, or of an activity, still in flight waits for the
+  earlier one and is only skipped once that is inserted; if it is not, the
+  copy is imported in its place
+- new files are parsed and compressed in the GPX process pool, with a
+  bounded number in flight so memory stays flat however many files there are;
+  files already in the archive are not compressed again, and restores from
+  the archive only decompress files missing from the parse cache
+- rides are inserted batch_size at a time with their geometry as WKB;
+  a file hash inserted meanwhile by another upload is skipped by ON CONFLICT,
+  and a batch the database rejects is retried one ride at a time
+- files are only archived once their ride is committed, so skipped and
+  failed files leave nothing behind in the archive
+"""
+
+from collections import deque
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Union
+import gzip
+import hashlib
+import logging
+import zipfile
+
+from sqlalchemy import func, bindparam, LargeBinary
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import GPX_PARSE_WORKERS
+from app.models import Ride
+from app.services.gpx import (
+    parse_gpx,
+    parse_gpx_file,
+    save_cached_parse,
+    prune_parse_cache,
+    fingerprint_candidates,
+    get_parse_pool
+)
+from app.services.gpx_store import (
+    GPX_OBJECT_SUFFIX,
+    gpx_object_path,
+    stage_gpx,
+    commit_staged_gpx,
+    discard_staged_gpx,
+    iter_archived_gpx
+)
+
+logger = logging.getLogger(__name__)
+
+# Rides inserted per statement
+IMPORT_BATCH_SIZE = 500
+
+# Files being parsed at once, per parse worker
+PARSE_QUEUE_PER_WORKER = 2
+
+
+def iter_directory_gpx(directory: Union[str, Path]) -> Iterator[tuple[str, bytes]]:
+    """Yield (filename, content) for each .gpx file in a directory."""
+    for gpx_path in sorted(Path(directory).glob("*.gpx")):
+        yield gpx_path.name, gpx_path.read_bytes()
+
+
+def iter_zip_gpx(source: Union[str, Path, BinaryIO]) -> Iterator[tuple[str, bytes]]:
+    """
+    Yield (filename, content) for each .gpx and .gpx.gz member of a ZIP archive.
+
+    Members are read one at a time, so only the current file is held in
+    memory; other members (FIT files, CSVs, media) are ignored.
+    """
+    with zipfile.ZipFile(source) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+
+            name = Path(info.filename).name
+            lower = name.lower()
+            if lower.endswith(".gpx"):
+                with archive.open(info) as member:
+                    yield name, member.read()
+            elif lower.endswith(".gpx.gz"):
+                with archive.open(info) as member:
+                    yield name[:-3], gzip.decompress(member.read())
+
+
+def iter_archive_gpx() -> Iterator[tuple[str, Path]]:
+    """
+    Yield (filename, archive path) for each file in the GPX archive.
+
+    The archive is keyed by hash and keeps no filenames, so files are named
+    <file_hash>.gpx. Files are not read here: import_gpx_entries() takes the
+    hash from the archive path, skips rides that still exist by it, and only
+    decompresses files missing from the parse cache.
+    """
+    for file_hash, path in iter_archived_gpx():
+        yield f"{file_hash}.gpx", path
+
+
+def reparse_archived_gpx(path: str, file_hash: str):
+    """
+    Parse an archived GPX file and overwrite its parse cache entry.
+
+    Module-level so it can be sent to the parse process pool.
+    """
+    with gzip.open(path, "rb") as f:
+        save_cached_parse(file_hash, parse_gpx(f))
+
+
+def rebuild_parse_cache(on_progress: Optional[Callable[[int, int], None]] = None) -> tuple[int, int]:
+    """
+    Re-parse every file in the GPX archive into the parse cache.
+
+    Files are parsed in the GPX process pool, then the cache is pruned to
+    its size limit.
+
+    Args:
+        on_progress: Optional callback called with (files done, errors)
+
+    Returns:
+        (files parsed, errors)
+    """
+    pool = get_parse_pool()
+    max_pending = max(1, GPX_PARSE_WORKERS * PARSE_QUEUE_PER_WORKER)
+    pending = deque()
+    parsed = errors = 0
+
+    def collect():
+        nonlocal parsed, errors
+        file_hash, future = pending.popleft()
+        try:
+            future.result()
+            parsed += 1
+        except Exception as e:
+            logger.error(f"Error parsing archived GPX file {file_hash}: {e}")
+            errors += 1
+        if on_progress:
+            on_progress(parsed + errors, errors)
+
+    for file_hash, path in iter_archived_gpx():
+        pending.append((file_hash, pool.submit(reparse_archived_gpx, str(path), file_hash)))
+        while len(pending) >= max_pending:
+            collect()
+    while pending:
+        collect()
+
+    prune_parse_cache()
+    return parsed, errors
+
+
+def parse_and_stage_gpx(content: bytes, file_hash: str) -> tuple:
+    """
+    Parse GPX content and, if it holds a track, stage it for the archive.
+
+    Files already in the archive are not staged again. Returns
+    (parse_gpx_file() result, staged path or None). Module-level so it can
+    be sent to the parse process pool.
+    """
+    parsed = parse_gpx_file(content, file_hash)
+    if not parsed[0] or gpx_object_path(file_hash).exists():
+        return parsed, None
+    return parsed, stage_gpx(content, file_hash)
+
+
+def parse_archived_gpx(path: str, file_hash: str) -> tuple:
+    """
+    parse_and_stage_gpx() for a file already in the archive.
+
+    The file is only decompressed if its parse is not cached. Module-level
+    so it can be sent to the parse process pool.
+    """
+    with gzip.open(path, "rb") as f:
+        return parse_gpx_file(f, file_hash), None
+
+
+def import_gpx_entries(
+    db: Session,
+    entries: Iterable[tuple[str, Union[bytes, Path]]],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_batch: Optional[Callable[[list[int]], None]] = None
+) -> list[dict]:
+    """
+    Import GPX files as rides in batches.
+
+    Args:
+        db: Database session
+        entries: (filename, content) pairs, e.g. from iter_zip_gpx(), or
+            (filename, archive path) pairs from iter_archive_gpx()
+        batch_size: Rides per INSERT statement
+        on_batch: Optional callback called with the IDs of the rides each
+            batch inserted, once it is committed (e.g. to queue coverage)
+
+    Returns:
+        One result per entry, with keys filename, status ("imported",
+        "skipped_duplicate" or "error"), message and ride_id.
+    """
+    # Ride IDs of the file hashes and fingerprints already in the database
+    known_hashes = {}
+    known_fingerprints = {}
+    for ride_id, file_hash, fingerprint in db.query(Ride.id, Ride.file_hash, Ride.track_fingerprint):
+        if file_hash:
+            known_hashes[file_hash] = ride_id
+        if fingerprint:
+            known_fingerprints.setdefault(fingerprint, ride_id)
+
+    # Hashes and fingerprints of files in flight, with the later entries
+    # waiting on them; those are only skipped once the earlier file's ride is
+    # inserted, and otherwise take its place
+    hash_waiters: dict[str, list] = {}
+    fingerprint_waiters: dict[str, list] = {}
+
+    rides = Ride.__table__
+    insert_ride = insert(rides).values(
+        geometry=func.ST_GeomFromWKB(bindparam("geometry_wkb", type_=LargeBinary), 4326)
+    ).on_conflict_do_nothing(index_elements=["file_hash"]).returning(rides.c.id, rides.c.file_hash)
+
+    pool = get_parse_pool()
+    max_pending = max(1, GPX_PARSE_WORKERS * PARSE_QUEUE_PER_WORKER)
+    pending = deque()
+    batch = []
+    results: list[Optional[dict]] = []  # In entry order, filled in as files finish
+
+    def submit(index: int, filename: str, content: Union[bytes, Path], file_hash: str):
+        if isinstance(content, Path):
+            future = pool.submit(parse_archived_gpx, str(content), file_hash)
+        else:
+            future = pool.submit(parse_and_stage_gpx, content, file_hash)
+        pending.append((index, filename, file_hash, future))
+
+    def release_hash(file_hash: str):
+        """A file was not imported: the first copy waiting on its hash takes its place."""
+        waiters = hash_waiters.pop(file_hash, [])
+        if waiters:
+            hash_waiters[file_hash] = waiters[1:]
+            submit(*waiters[0], file_hash)
+
+    def release_fingerprint(fingerprint: Optional[str]):
+        """A ride was inserted or failed: queue the rides waiting on its fingerprint again."""
+        if not fingerprint:
+            return
+        for waiter in fingerprint_waiters.pop(fingerprint, []):
+            queue_row(*waiter)
+
+    def queue_row(index: int, row: dict, staged: Optional[Path]):
+        """Add a parsed ride to the batch, unless its activity is already imported or in flight."""
+        fingerprint = row["track_fingerprint"]
+        if fingerprint:
+            candidates = fingerprint_candidates(fingerprint)
+            same_track = [c for c in candidates if c in known_fingerprints]
+            if same_track:
+                if staged:
+                    discard_staged_gpx(staged)
+                results[index] = {
+                    "filename": row["filename"],
+                    "status": "skipped_duplicate",
+                    "message": f"Same activity as ride ID {known_fingerprints[same_track[0]]} (exported differently)",
+                    "ride_id": None
+                }
+                release_hash(row["file_hash"])
+                return
+
+            in_flight = [c for c in candidates if c in fingerprint_waiters]
+            if in_flight:
+                fingerprint_waiters[in_flight[0]].append((index, row, staged))
+                return
+            fingerprint_waiters[fingerprint] = []
+
+        batch.append((index, row, staged))
+
+    def insert_rows(rows: list) -> dict[str, int]:
+        """Insert and commit rows; returns ride IDs by file hash of the ones inserted."""
+        inserted = db.execute(insert_ride, [row for _, row, _ in rows]).all()
+        db.commit()
+        return {file_hash: ride_id for ride_id, file_hash in inserted}
+
+    def insert_batch():
+        if not batch:
+            return
+
+        rows = batch[:]
+        batch.clear()
+        try:
+            ride_ids = insert_rows(rows)
+        except SQLAlchemyError as e:
+            # Find the rows the database rejects and import the rest
+            db.rollback()
+            logger.warning(f"Batch insert of {len(rows)} rides failed, retrying one at a time: {e}")
+            ride_ids = {}
+            for entry in rows:
+                index, row, staged = entry
+                try:
+                    ride_ids.update(insert_rows([entry]))
+                except SQLAlchemyError as row_error:
+                    db.rollback()
+                    logger.error(f"Error inserting ride from {row['filename']}: {row_error}")
+                    results[index] = {
+                        "filename": row["filename"],
+                        "status": "error",
+                        "message": str(row_error),
+                        "ride_id": None
+                    }
+
+        batch_ride_ids = []
+        for index, row, staged in rows:
+            file_hash = row["file_hash"]
+            fingerprint = row["track_fingerprint"]
+            ride_id = ride_ids.get(file_hash)
+            if ride_id is None:
+                if staged:
+                    discard_staged_gpx(staged)
+                if results[index] is None:
+                    results[index] = {
+                        "filename": row["filename"],
+                        "status": "skipped_duplicate",
+                        "message": "Duplicate file (imported by another upload meanwhile)",
+                        "ride_id": None
+                    }
+                release_hash(file_hash)
+                release_fingerprint(fingerprint)
+                continue
+
+            if staged:
+                archived = commit_staged_gpx(staged, file_hash)
+            else:
+                archived = gpx_object_path(file_hash).exists()
+            if not archived:
+                logger.warning(f"GPX file {row['filename']} imported to database but failed to archive")
+            results[index] = {
+                "filename": row["filename"],
+                "status": "imported",
+                "message": f"Imported successfully ({row['distance_km']:.2f} km)",
+                "ride_id": ride_id
+            }
+            batch_ride_ids.append(ride_id)
+
+            known_hashes[file_hash] = ride_id
+            for waiter_index, waiter_filename, _ in hash_waiters.pop(file_hash, []):
+                results[waiter_index] = {
+                    "filename": waiter_filename,
+                    "status": "skipped_duplicate",
+                    "message": f"Duplicate file (matches ride ID {ride_id}, earlier in this import)",
+                    "ride_id": None
+                }
+            if fingerprint:
+                # The rides waiting on it are now skipped by known_fingerprints
+                known_fingerprints[fingerprint] = ride_id
+                release_fingerprint(fingerprint)
+
+        if on_batch and batch_ride_ids:
+            on_batch(batch_ride_ids)
+
+    def collect():
+        index, filename, file_hash, future = pending.popleft()
+        try:
+            (wkb, date_recorded, distance_km, elevation_gain, fingerprint), staged = future.result()
+        except Exception as e:
+            logger.error(f"Error processing GPX file {filename}: {e}")
+            results[index] = {"filename": filename, "status": "error", "message": str(e), "ride_id": None}
+            release_hash(file_hash)
+            return
+
+        if not wkb:
+            results[index] = {
+                "filename": filename,
+                "status": "error",
+                "message": "No valid track or route data found in GPX file",
+                "ride_id": None
+            }
+            release_hash(file_hash)
+            return
+
+        queue_row(index, {
+            "filename": filename,
+            "file_hash": file_hash,
+            "track_fingerprint": fingerprint,
+            "date_recorded": date_recorded,
+            "distance_km": round(distance_km, 3),
+            "elevation_gain_m": round(elevation_gain, 1) if elevation_gain else None,
+            "geometry_wkb": wkb
+        }, staged)
+        if len(batch) >= batch_size:
+            insert_batch()
+
+    for filename, content in entries:
+        if isinstance(content, Path):
+            file_hash = content.name[:-len(GPX_OBJECT_SUFFIX)]
+        else:
+            file_hash = hashlib.sha256(content).hexdigest()
+        results.append(None)
+        index = len(results) - 1
+
+        if file_hash in known_hashes:
+            results[index] = {
+                "filename": filename,
+                "status": "skipped_duplicate",
+                "message": f"Duplicate file (matches ride ID {known_hashes[file_hash]})",
+                "ride_id": None
+            }
+            continue
+        if file_hash in hash_waiters:
+            hash_waiters[file_hash].append((index, filename, content))
+            continue
+        hash_waiters[file_hash] = []
+
+        submit(index, filename, content, file_hash)
+        while len(pending) >= max_pending:
+            collect()
+
+    # Rides released by a failed insert go back through the pool
+    while pending or batch:
+        while pending:
+            collect()
+        insert_batch()
+
+    return results
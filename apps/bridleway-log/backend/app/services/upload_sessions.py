@@ -0,0 +1,145 @@
+"""
+Resumable chunked uploads.
+
+Large GPX files can be uploaded as a series of chunks instead of a single
+request body: the client creates an upload session, PUTs chunks at
+increasing offsets and then finalizes it. Chunks are appended to a spool
+file under UPLOAD_SPOOL_DIR and hashed as they arrive, so the web process
+holds at most one chunk of a file, and the SHA-256 is ready as soon as the
+last byte lands. After a dropped connection the client asks for the
+session's offset and carries on from there.
+
+Session metadata is written next to the spool file, so uploads also survive
+a restart of the web process; the running hash is then rebuilt from the
+bytes already spooled.
+"""
+
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from app.config import UPLOAD_SPOOL_DIR
+
+logger = logging.getLogger(__name__)
+
+# Sessions untouched for this long are removed with their spool files
+UPLOAD_SESSION_EXPIRY = timedelta(hours=24)
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass
+class UploadSession:
+    id: str
+    filename: str
+    size: int
+    directory: Path
+    offset: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)  # One writer at a time
+    _hasher: "hashlib._Hash" = field(default_factory=hashlib.sha256, repr=False)
+
+    @property
+    def spool_path(self) -> Path:
+        return self.directory / f"{self.id}.part"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.directory / f"{self.id}.json"
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.size
+
+    def append(self, data: bytes):
+        """Append a chunk at the current offset and add it to the hash."""
+        with open(self.spool_path, "ab") as f:
+            f.write(data)
+        self._hasher.update(data)
+        self.offset += len(data)
+
+    def file_hash(self) -> str:
+        """SHA-256 of the bytes received so far."""
+        return self._hasher.hexdigest()
+
+
+class UploadSessionStore:
+    """Upload sessions by ID, backed by spool and metadata files in a directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._sessions: dict[str, UploadSession] = {}
+
+    def create(self, filename: str, size: int) -> UploadSession:
+        """Start a new upload session with an empty spool file."""
+        self.expire()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        session = UploadSession(id=uuid.uuid4().hex, filename=filename, size=size, directory=self.directory)
+        session.spool_path.touch()
+        session.meta_path.write_text(json.dumps({"filename": filename, "size": size}))
+
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        """
+        Look up an upload session.
+
+        Sessions started before a restart are reloaded from disk, hashing
+        their spool file to restore the running hash and offset.
+        """
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session is not None:
+            return session
+
+        # IDs are generated hex UUIDs; anything else is not a file name we wrote
+        if len(upload_id) != 32 or any(c not in "0123456789abcdef" for c in upload_id):
+            return None
+
+        meta_path = self.directory / f"{upload_id}.json"
+        if not meta_path.exists():
+            return None
+
+        meta = json.loads(meta_path.read_text())
+        session = UploadSession(id=upload_id, filename=meta["filename"], size=meta["size"], directory=self.directory)
+        with open(session.spool_path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_BYTES):
+                session._hasher.update(chunk)
+                session.offset += len(chunk)
+
+        with self._lock:
+            return self._sessions.setdefault(upload_id, session)
+
+    def discard(self, upload_id: str):
+        """Forget a session and delete its files."""
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        for suffix in (".part", ".json"):
+            (self.directory / f"{upload_id}{suffix}").unlink(missing_ok=True)
+
+    def expire(self):
+        """Remove sessions that have not received data within UPLOAD_SESSION_EXPIRY."""
+        if not self.directory.exists():
+            return
+
+        cutoff = time.time() - UPLOAD_SESSION_EXPIRY.total_seconds()
+        for meta_path in self.directory.glob("*.json"):
+            spool_path = meta_path.with_suffix(".part")
+            last_write = spool_path.stat().st_mtime if spool_path.exists() else meta_path.stat().st_mtime
+            if last_write < cutoff:
+                logger.info(f"Removing expired upload {meta_path.stem}")
+                self.discard(meta_path.stem)
+
+
+upload_sessions = UploadSessionStore(UPLOAD_SPOOL_DIR)
@@ -0,0 +1,28 @@
+-- Migration: Add materialized ride buffers for coverage calculation
+-- Version: 2.1.0
+-- Date: 2026-10-17
+
+-- Each ride's coverage buffer (30 m) in British National Grid (EPSG:27700)
+CREATE TABLE IF NOT EXISTS ride_buffers (
+    ride_id INTEGER PRIMARY KEY REFERENCES rides(id) ON DELETE CASCADE,
+    geometry GEOMETRY(MULTIPOLYGON, 27700)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ride_buffers_geometry ON ride_buffers USING GIST(geometry);
+
+-- Buffer existing rides
+INSERT INTO ride_buffers (ride_id, geometry)
+SELECT id, ST_Multi(ST_Buffer(ST_Transform(geometry, 27700), 30))
+FROM rides
+WHERE geometry IS NOT NULL
+ON CONFLICT (ride_id) DO NOTHING;
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'ride_buffers') THEN
+        RAISE NOTICE 'Migration complete: ride_buffers table created';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: ride_buffers table not created';
+    END IF;
+END $$;
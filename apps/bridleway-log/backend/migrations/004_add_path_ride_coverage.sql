@@ -0,0 +1,43 @@
+-- Migration: Add per-ride path coverage contributions
+-- Version: 2.2.0
+-- Date: 2026-10-17
+
+-- Part of each path covered by each ride, in British National Grid (EPSG:27700)
+CREATE TABLE IF NOT EXISTS path_ride_coverage (
+    path_id INTEGER REFERENCES paths(id) ON DELETE CASCADE,
+    ride_id INTEGER REFERENCES rides(id) ON DELETE CASCADE,
+    ride_date TIMESTAMP,
+    covered_length_m FLOAT DEFAULT 0.0,
+    geometry GEOMETRY(MULTILINESTRING, 27700),
+    PRIMARY KEY (path_id, ride_id)
+);
+
+-- Ride lookups for deletion, and MAX(ride_date) per path for last_ridden_date
+CREATE INDEX IF NOT EXISTS ix_path_ride_coverage_ride_id ON path_ride_coverage(ride_id);
+CREATE INDEX IF NOT EXISTS idx_path_ride_coverage_path_date ON path_ride_coverage(path_id, ride_date);
+
+-- Populate contributions from the stored ride buffers
+INSERT INTO path_ride_coverage (path_id, ride_id, ride_date, covered_length_m, geometry)
+SELECT path_id, ride_id, ride_date, ST_Length(covered), covered
+FROM (
+    SELECT
+        p.id AS path_id,
+        r.id AS ride_id,
+        r.date_recorded AS ride_date,
+        ST_Multi(ST_CollectionExtract(ST_Intersection(ST_Transform(p.geometry, 27700), rb.geometry), 2)) AS covered
+    FROM paths p
+    JOIN ride_buffers rb ON ST_Intersects(rb.geometry, ST_Transform(p.geometry, 27700))
+    JOIN rides r ON r.id = rb.ride_id
+) contributions
+WHERE NOT ST_IsEmpty(covered)
+ON CONFLICT (path_id, ride_id) DO NOTHING;
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'path_ride_coverage') THEN
+        RAISE NOTICE 'Migration complete: path_ride_coverage table created';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: path_ride_coverage table not created';
+    END IF;
+END $$;
@@ -0,0 +1,31 @@
+-- Migration: Add stored British National Grid geometry columns
+-- Version: 2.3.0
+-- Date: 2026-10-17
+
+-- EPSG:27700 copies of the path and ride geometries, kept in sync by PostgreSQL
+ALTER TABLE paths ADD COLUMN IF NOT EXISTS geometry_bng GEOMETRY(LINESTRING, 27700)
+    GENERATED ALWAYS AS (ST_Transform(geometry, 27700)) STORED;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS geometry_bng GEOMETRY(MULTILINESTRING, 27700)
+    GENERATED ALWAYS AS (ST_Transform(geometry, 27700)) STORED;
+
+-- Spatial indexes for the source and projected geometries
+CREATE INDEX IF NOT EXISTS idx_paths_geometry ON paths USING GIST(geometry);
+CREATE INDEX IF NOT EXISTS idx_paths_geometry_bng ON paths USING GIST(geometry_bng);
+CREATE INDEX IF NOT EXISTS idx_rides_geometry ON rides USING GIST(geometry);
+CREATE INDEX IF NOT EXISTS idx_rides_geometry_bng ON rides USING GIST(geometry_bng);
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'paths' AND column_name = 'geometry_bng') THEN
+        RAISE NOTICE 'Migration complete: geometry_bng added to paths';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: geometry_bng not added to paths';
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'rides' AND column_name = 'geometry_bng') THEN
+        RAISE NOTICE 'Migration complete: geometry_bng added to rides';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: geometry_bng not added to rides';
+    END IF;
+END $$;
@@ -0,0 +1,43 @@
+-- Migration: Add fixed-length path segments for partial coverage
+-- Version: 2.4.0
+-- Date: 2026-10-17
+
+-- ~50 m pieces of each path in British National Grid (EPSG:27700)
+CREATE TABLE IF NOT EXISTS path_segments (
+    id SERIAL PRIMARY KEY,
+    path_id INTEGER NOT NULL REFERENCES paths(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    length_m FLOAT,
+    geometry GEOMETRY(LINESTRING, 27700),
+    is_ridden BOOLEAN DEFAULT FALSE,
+    coverage_fraction FLOAT DEFAULT 0.0,
+    last_ridden_date TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_path_segments_path_seq ON path_segments(path_id, seq);
+CREATE INDEX IF NOT EXISTS idx_path_segments_geometry ON path_segments USING GIST(geometry);
+
+-- Split existing paths into segments
+-- Segment coverage is filled in by the next coverage recompute
+INSERT INTO path_segments (path_id, seq, length_m, geometry)
+SELECT p.id, n, ST_Length(piece.geom), piece.geom
+FROM paths p
+CROSS JOIN LATERAL (
+    SELECT GREATEST(1, ROUND(ST_Length(p.geometry_bng) / 50))::int AS pieces
+) split
+CROSS JOIN LATERAL generate_series(0, split.pieces - 1) AS n
+CROSS JOIN LATERAL (
+    SELECT ST_LineSubstring(p.geometry_bng, n::float / split.pieces, (n + 1)::float / split.pieces) AS geom
+) piece
+WHERE p.geometry_bng IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM path_segments s WHERE s.path_id = p.id);
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'path_segments') THEN
+        RAISE NOTICE 'Migration complete: path_segments table created';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: path_segments table not created';
+    END IF;
+END $$;
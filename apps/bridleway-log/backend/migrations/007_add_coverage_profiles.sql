@@ -0,0 +1,47 @@
+-- Migration: Add multi-width coverage profiles
+-- Version: 2.5.0
+-- Date: 2026-10-17
+
+-- Ride buffers are stored once per profile width
+ALTER TABLE ride_buffers ADD COLUMN IF NOT EXISTS buffer_m INTEGER NOT NULL DEFAULT 30;
+ALTER TABLE ride_buffers ALTER COLUMN buffer_m DROP DEFAULT;
+ALTER TABLE ride_buffers DROP CONSTRAINT IF EXISTS ride_buffers_pkey;
+ALTER TABLE ride_buffers ADD PRIMARY KEY (ride_id, buffer_m);
+
+-- Distance between path and ride, so narrower profiles can filter contributions
+ALTER TABLE path_ride_coverage ADD COLUMN IF NOT EXISTS distance_m FLOAT;
+
+-- Segment coverage per buffer width
+CREATE TABLE IF NOT EXISTS path_segment_coverage (
+    segment_id INTEGER REFERENCES path_segments(id) ON DELETE CASCADE,
+    buffer_m INTEGER,
+    is_ridden BOOLEAN DEFAULT FALSE,
+    coverage_fraction FLOAT DEFAULT 0.0,
+    last_ridden_date TIMESTAMP,
+    PRIMARY KEY (segment_id, buffer_m)
+);
+
+-- Path coverage per buffer width
+CREATE TABLE IF NOT EXISTS path_coverage_profiles (
+    path_id INTEGER REFERENCES paths(id) ON DELETE CASCADE,
+    buffer_m INTEGER,
+    is_ridden BOOLEAN DEFAULT FALSE,
+    coverage_fraction FLOAT DEFAULT 0.0,
+    last_ridden_date TIMESTAMP,
+    PRIMARY KEY (path_id, buffer_m)
+);
+
+CREATE INDEX IF NOT EXISTS ix_path_coverage_profiles_buffer_m ON path_coverage_profiles(buffer_m);
+
+-- Buffers for the other widths, distances and profiles are filled in by
+-- scripts/migrate.py or the next coverage recompute
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'path_coverage_profiles') THEN
+        RAISE NOTICE 'Migration complete: coverage profile tables created';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: coverage profile tables not created';
+    END IF;
+END $$;
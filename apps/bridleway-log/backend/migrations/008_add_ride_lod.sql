@@ -0,0 +1,24 @@
+-- Migration: Add pre-simplified ride geometries
+-- Version: 2.6.0
+-- Date: 2026-10-17
+
+-- Simplified copies of each ride track for the map at low zoom levels, kept
+-- in sync by PostgreSQL. Tolerances are in degrees (about 100 m, 10 m and 2 m);
+-- preserveCollapsed keeps short rides visible instead of dropping them.
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS geometry_low GEOMETRY(MULTILINESTRING, 4326)
+    GENERATED ALWAYS AS (ST_Simplify(geometry, 0.001, true)) STORED;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS geometry_medium GEOMETRY(MULTILINESTRING, 4326)
+    GENERATED ALWAYS AS (ST_Simplify(geometry, 0.0001, true)) STORED;
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS geometry_high GEOMETRY(MULTILINESTRING, 4326)
+    GENERATED ALWAYS AS (ST_Simplify(geometry, 0.00002, true)) STORED;
+
+-- Verify migration
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'rides' AND column_name IN ('geometry_low', 'geometry_medium', 'geometry_high')) = 3 THEN
+        RAISE NOTICE 'Migration complete: simplified geometries added to rides';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: simplified geometries not added to rides';
+    END IF;
+END $$;
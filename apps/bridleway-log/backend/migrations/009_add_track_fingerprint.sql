@@ -0,0 +1,20 @@
+-- Migration: Add track fingerprints for near-duplicate ride detection
+-- Version: 2.7.0
+-- Date: 2026-10-17
+
+-- Start time bucket plus geohash cell sequence of each ride (see
+-- app/services/gpx.py track_fingerprint()). Uploads matching an existing
+-- fingerprint are skipped as the same activity exported differently.
+-- Existing rides are fingerprinted from the GPX archive by scripts/migrate.py.
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS track_fingerprint VARCHAR(64);
+CREATE INDEX IF NOT EXISTS ix_rides_track_fingerprint ON rides(track_fingerprint);
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'rides' AND column_name = 'track_fingerprint') THEN
+        RAISE NOTICE 'Migration complete: track_fingerprint added to rides';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: track_fingerprint not added to rides';
+    END IF;
+END $$;
@@ -0,0 +1,19 @@
+-- Migration: Add the data version sequence for the API response cache
+-- Version: 2.8.0
+-- Date: 2026-10-17
+
+-- Bumped with nextval() after every committed change to paths, rides or
+-- coverage, by the API and by the import and recompute scripts. The API
+-- reads it on each request and keys its cached responses on it, so every
+-- web worker drops stale GeoJSON and stats as soon as the data changes.
+CREATE SEQUENCE IF NOT EXISTS data_version;
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.sequences WHERE sequence_name = 'data_version') THEN
+        RAISE NOTICE 'Migration complete: data_version sequence added';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: data_version sequence not added';
+    END IF;
+END $$;
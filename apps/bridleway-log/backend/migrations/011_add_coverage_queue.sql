@@ -0,0 +1,26 @@
+-- Migration: Add the persistent coverage work queue
+-- Version: 2.9.0
+-- Date: 2026-10-17
+
+-- Coverage work queued on the background worker (see
+-- app/services/coverage_jobs.py): one row per ride, path or full recompute,
+-- deleted when the job covering it completes. The web process queues the
+-- remaining rows again at startup, so work queued or running during a
+-- restart or deploy is not lost.
+CREATE TABLE IF NOT EXISTS coverage_queue (
+    id SERIAL PRIMARY KEY,
+    ride_id INTEGER REFERENCES rides(id) ON DELETE CASCADE,
+    path_id INTEGER REFERENCES paths(id) ON DELETE CASCADE,
+    full_recompute BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP
+);
+
+-- Verify migration
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'coverage_queue') THEN
+        RAISE NOTICE 'Migration complete: coverage_queue table added';
+    ELSE
+        RAISE EXCEPTION 'Migration failed: coverage_queue table not added';
+    END IF;
+END $$;
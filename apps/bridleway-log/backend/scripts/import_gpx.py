@@ -4,6 +4,13 @@ Batch import GPX files into the database.
 
 Usage:
     python scripts/import_gpx.py --dir /data/gpx/activities
+    python scripts/import_gpx.py --dir /data/gpx/activities --bulk
+    python scripts/import_gpx.py --zip export_12345.zip
+    python scripts/import_gpx.py --archive
+    python scripts/import_gpx.py --reparse
+
+--archive restores rides missing from the database from the GPX archive
+(GPX_STORAGE_DIR/objects); --reparse rebuilds the GPX parse cache from it.
 """
 
 import argparse
@@ -11,92 +18,28 @@ import hashlib
 import sys
 import os
 from pathlib import Path
+from typing import Optional
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import gpxpy
-import gpxpy.gpx
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker
-from geoalchemy2 import WKTElement
 
-from app.config import DATABASE_URL
+from app.config import DATABASE_URL, COVERAGE_WORKERS
 from app.db import Base
 from app.models import Ride
-from app.services.coverage import recompute_coverage
-
-
-def parse_gpx_file(content: bytes) -> tuple:
-    """
-    Parse GPX file content and extract geometry and metadata.
-
-    Returns:
-        Tuple of (wkt_geometry, date_recorded, distance_km, elevation_gain_m)
-    """
-    gpx = gpxpy.parse(content.decode('utf-8'))
-
-    all_coords = []
-    total_distance = 0.0
-    elevation_gain = 0.0
-    min_time = None
-    prev_elevation = None
-
-    # Process all tracks
-    for track in gpx.tracks:
-        for segment in track.segments:
-            segment_coords = []
-            for point in segment.points:
-                segment_coords.append((point.longitude, point.latitude))
-
-                # Track time for date_recorded
-                if point.time:
-                    if min_time is None or point.time < min_time:
-                        min_time = point.time
-
-                # Calculate elevation gain
-                if point.elevation is not None:
-                    if prev_elevation is not None:
-                        elev_diff = point.elevation - prev_elevation
-                        if elev_diff > 0:
-                            elevation_gain += elev_diff
-                    prev_elevation = point.elevation
-
-            if len(segment_coords) >= 2:
-                all_coords.append(segment_coords)
-
-            # Calculate distance
-            total_distance += segment.length_3d() if segment.has_elevations() else segment.length_2d()
-
-    # Also process routes if no tracks
-    if not all_coords:
-        for route in gpx.routes:
-            route_coords = []
-            for point in route.points:
-                route_coords.append((point.longitude, point.latitude))
-                if point.time:
-                    if min_time is None or point.time < min_time:
-                        min_time = point.time
-            if len(route_coords) >= 2:
-                all_coords.append(route_coords)
-
-    if not all_coords:
-        return None, None, 0.0, None
-
-    # Convert to WKT MultiLineString
-    if len(all_coords) == 1:
-        coords_str = ", ".join(f"{lon} {lat}" for lon, lat in all_coords[0])
-        wkt = f"MULTILINESTRING(({coords_str}))"
-    else:
-        linestrings = []
-        for coords in all_coords:
-            coords_str = ", ".join(f"{lon} {lat}" for lon, lat in coords)
-            linestrings.append(f"({coords_str})")
-        wkt = f"MULTILINESTRING({', '.join(linestrings)})"
-
-    date_recorded = min_time.isoformat() if min_time else None
-    distance_km = total_distance / 1000.0
-
-    return wkt, date_recorded, distance_km, elevation_gain if elevation_gain > 0 else None
+from app.services.coverage import add_ride_coverage, refresh_path_coverage, recompute_coverage_parallel
+from app.services.gpx import parse_gpx_file, fingerprint_candidates
+from app.services.gpx_store import store_gpx
+from app.services.response_cache import bump_data_version
+from app.services.ride_import import (
+    IMPORT_BATCH_SIZE,
+    import_gpx_entries,
+    iter_archive_gpx,
+    iter_directory_gpx,
+    iter_zip_gpx,
+    rebuild_parse_cache
+)
 
 
 def import_gpx_files(directory: str, skip_existing: bool = True):
@@ -112,6 +55,7 @@ def import_gpx_files(directory: str, skip_existing: bool = True):
 
     print(f"Found {len(gpx_files)} GPX files to import")
 
+    imported_ride_ids = []
     imported = 0
     skipped = 0
     errors = 0
@@ -136,25 +80,37 @@ def import_gpx_files(directory: str, skip_existing: bool = True):
                     continue
 
             # Parse GPX content
-            wkt, date_recorded, distance_km, elevation_gain = parse_gpx_file(content)
+            wkb, date_recorded, distance_km, elevation_gain, fingerprint = parse_gpx_file(content, file_hash)
 
-            if not wkt:
+            if not wkb:
                 print(f"  Warning: No valid track data in {gpx_path.name}")
                 errors += 1
                 continue
 
+            # Check for the same activity exported differently
+            if skip_existing and fingerprint:
+                existing = session.query(Ride.id).filter(
+                    Ride.track_fingerprint.in_(fingerprint_candidates(fingerprint))
+                ).first()
+                if existing:
+                    skipped += 1
+                    continue
+
             # Create Ride record
             ride = Ride(
                 filename=gpx_path.name,
                 file_hash=file_hash,
+                track_fingerprint=fingerprint,
                 date_recorded=date_recorded,
                 distance_km=round(distance_km, 3),
                 elevation_gain_m=round(elevation_gain, 1) if elevation_gain else None,
-                geometry=WKTElement(wkt, srid=4326)
+                geometry=func.ST_GeomFromWKB(wkb, 4326)
             )
 
             session.add(ride)
             session.commit()
+            store_gpx(content, file_hash)
+            imported_ride_ids.append(ride.id)
             imported += 1
 
         except Exception as e:
@@ -164,31 +120,142 @@ def import_gpx_files(directory: str, skip_existing: bool = True):
 
     print(f"\nImport complete: {imported} imported, {skipped} skipped (duplicates), {errors} errors")
 
-    # Recompute coverage
+    # Recompute coverage for paths near the imported rides
     if imported > 0:
         print("\nRecomputing path coverage...")
         try:
-            paths_updated = recompute_coverage(session)
+            path_ids = add_ride_coverage(session, imported_ride_ids)
+            paths_updated = refresh_path_coverage(session, path_ids)
             print(f"Coverage updated for {paths_updated} paths")
         except Exception as e:
             print(f"Error recomputing coverage: {e}")
+            session.rollback()
+
+        bump_data_version(session)
 
     session.close()
     return imported, skipped, errors
 
 
+def bulk_import_gpx_files(
+    directory: Optional[str] = None,
+    zip_path: Optional[str] = None,
+    archive: bool = False,
+    batch_size: int = IMPORT_BATCH_SIZE
+):
+    """
+    Import all GPX files from a directory, a ZIP export or the GPX archive in bulk.
+
+    Existing hashes are loaded once, new files are parsed and archived in
+    parallel in the GPX process pool, rides are inserted batch_size at a
+    time, and coverage is recomputed once at the end. Files already in the
+    database are always skipped.
+    """
+
+    engine = create_engine(DATABASE_URL, pool_size=max(5, COVERAGE_WORKERS))
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+
+    if zip_path:
+        print(f"Importing GPX files from {zip_path}")
+        entries = iter_zip_gpx(zip_path)
+    elif archive:
+        print("Restoring rides from the GPX archive")
+        entries = iter_archive_gpx()
+    else:
+        print(f"Importing GPX files from {directory}")
+        entries = iter_directory_gpx(directory)
+
+    results = import_gpx_entries(
+        session,
+        entries,
+        batch_size=batch_size,
+        on_batch=lambda ride_ids: print(f"Inserted {len(ride_ids)} rides")
+    )
+
+    for result in results:
+        if result["status"] == "error":
+            print(f"  Error processing {result['filename']}: {result['message']}")
+
+    imported = sum(1 for r in results if r["status"] == "imported")
+    skipped = sum(1 for r in results if r["status"] == "skipped_duplicate")
+    errors = sum(1 for r in results if r["status"] == "error")
+
+    print(f"\nImport complete: {imported} imported, {skipped} skipped (duplicates), {errors} errors")
+
+    if imported > 0:
+        print("\nRecomputing path coverage...")
+        try:
+            tiles = recompute_coverage_parallel(Session, COVERAGE_WORKERS)
+            print(f"Coverage updated for {sum(t['paths_updated'] for t in tiles)} paths")
+        finally:
+            bump_data_version(session)
+
+    session.close()
+    return imported, skipped, errors
+
+
+def reparse_archive():
+    """Rebuild the GPX parse cache from every file in the archive."""
+    print("Re-parsing the GPX archive into the parse cache")
+
+    def on_progress(done: int, errors: int):
+        if done % 100 == 0:
+            print(f"Parsed {done} files ({errors} errors)")
+
+    parsed, errors = rebuild_parse_cache(on_progress)
+    print(f"\nParse cache rebuilt: {parsed} files parsed, {errors} errors")
+    return parsed, errors
+
+
 def main():
     parser = argparse.ArgumentParser(description='Import GPX files into the database')
-    parser.add_argument('--dir', required=True, help='Directory containing GPX files')
-    parser.add_argument('--no-skip', action='store_true', help='Do not skip existing files (by hash)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dir', help='Directory containing GPX files')
+    source.add_argument('--zip', help='ZIP export containing .gpx or .gpx.gz files (implies --bulk)')
+    source.add_argument('--archive', action='store_true',
+                        help='Restore rides missing from the database from the GPX archive (implies --bulk)')
+    source.add_argument('--reparse', action='store_true',
+                        help='Rebuild the GPX parse cache from the archive, without importing')
+    parser.add_argument('--no-skip', action='store_true', help='Do not skip existing files (by hash); --dir imports without --bulk only')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Parse in parallel, insert in batches and recompute coverage once')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                        help=f'Rides per insert in bulk mode (default: {IMPORT_BATCH_SIZE})')
 
     args = parser.parse_args()
 
+    # Bulk imports insert with ON CONFLICT (file_hash) DO NOTHING, so files
+    # already in the database are always skipped
+    if args.no_skip and not args.dir:
+        parser.error('--no-skip only applies to --dir imports')
+    if args.no_skip and args.bulk:
+        parser.error('--no-skip cannot be combined with --bulk')
+
+    if args.reparse:
+        reparse_archive()
+        return
+
+    if args.archive:
+        bulk_import_gpx_files(archive=True, batch_size=args.batch_size)
+        return
+
+    if args.zip:
+        if not os.path.isfile(args.zip):
+            print(f"Error: File not found: {args.zip}")
+            sys.exit(1)
+        bulk_import_gpx_files(zip_path=args.zip, batch_size=args.batch_size)
+        return
+
     if not os.path.isdir(args.dir):
         print(f"Error: Directory not found: {args.dir}")
         sys.exit(1)
 
-    import_gpx_files(args.dir, skip_existing=not args.no_skip)
+    if args.bulk:
+        bulk_import_gpx_files(directory=args.dir, batch_size=args.batch_size)
+    else:
+        import_gpx_files(args.dir, skip_existing=not args.no_skip)
 
 
 if __name__ == '__main__':
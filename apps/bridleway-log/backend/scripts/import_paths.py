@@ -21,6 +21,8 @@ from geoalchemy2.shape import from_shape
 from app.config import DATABASE_URL
 from app.db import Base
 from app.models import Path
+from app.services.coverage import build_path_segments
+from app.services.response_cache import bump_data_version
 
 
 def calculate_length_km(geometry):
@@ -129,11 +131,16 @@ def import_paths(filepath: str, area: str, clear_existing: bool = False):
             continue
 
     session.commit()
+
+    # Split the new paths into coverage segments
+    segments = build_path_segments(session)
+    bump_data_version(session)
     session.close()
 
     print(f"\nImport complete!")
     print(f"  Imported: {imported}")
     print(f"  Skipped: {skipped}")
+    print(f"  Segments: {segments}")
 
 
 def main():
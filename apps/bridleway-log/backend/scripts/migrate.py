@@ -19,6 +19,50 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from sqlalchemy import text
 from app.db import engine, Base
 from app.models import Path as PathModel, Ride
+from app.services.coverage import (
+    store_ride_buffers,
+    recompute_coverage,
+    build_path_segments,
+    COVERAGE_BUFFER_METERS
+)
+from app.services.gpx import load_cached_parse, parse_gpx_cached
+from app.services.gpx_store import gpx_object_path, find_legacy_gpx, iter_gpx
+from app.services.response_cache import bump_data_version
+
+
+def backfill_track_fingerprints(conn) -> int:
+    """
+    Fingerprint existing rides from their archived GPX files.
+
+    Also redoes fingerprints in the first format, a bare SHA-256 without
+    the "<start bucket>:" prefix.
+    """
+    rides = conn.execute(text("""
+        SELECT id, file_hash FROM rides
+        WHERE (track_fingerprint IS NULL OR track_fingerprint NOT LIKE '%:%') AND file_hash IS NOT NULL
+    """)).fetchall()
+
+    updated = 0
+    for ride_id, file_hash in rides:
+        parsed = load_cached_parse(file_hash)
+        if parsed is None:
+            path = gpx_object_path(file_hash)
+            if not path.exists():
+                path = find_legacy_gpx(file_hash)
+            if path is None:
+                continue
+            parsed = parse_gpx_cached(b"".join(iter_gpx(path)), file_hash)
+
+        fingerprint = parsed.fingerprint
+        if fingerprint:
+            conn.execute(
+                text("UPDATE rides SET track_fingerprint = :fingerprint WHERE id = :id"),
+                {"fingerprint": fingerprint, "id": ride_id}
+            )
+            updated += 1
+
+    conn.commit()
+    return updated
 
 
 def run_migration():
@@ -82,6 +126,272 @@ def run_migration():
         else:
             print("Coverage columns already exist.")
 
+        # Add stored British National Grid geometry columns
+        for table, geometry_type in (("paths", "LINESTRING"), ("rides", "MULTILINESTRING")):
+            result = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = :table AND column_name = 'geometry_bng'
+                )
+            """), {"table": table})
+            bng_exists = result.scalar()
+
+            if not bng_exists:
+                print(f"Adding geometry_bng column to {table} table...")
+                conn.execute(text(f"""
+                    ALTER TABLE {table} ADD COLUMN geometry_bng GEOMETRY({geometry_type}, 27700)
+                    GENERATED ALWAYS AS (ST_Transform(geometry, 27700)) STORED
+                """))
+                conn.commit()
+                print(f"geometry_bng column added to {table}.")
+            else:
+                print(f"geometry_bng column already exists on {table}.")
+
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_geometry ON {table} USING GIST(geometry)"))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_geometry_bng ON {table} USING GIST(geometry_bng)"))
+            conn.commit()
+
+        # Add pre-simplified ride geometries for low zoom levels
+        for column, tolerance in (("geometry_low", 0.001), ("geometry_medium", 0.0001), ("geometry_high", 0.00002)):
+            result = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'rides' AND column_name = :column
+                )
+            """), {"column": column})
+            lod_exists = result.scalar()
+
+            if not lod_exists:
+                print(f"Adding {column} column to rides table...")
+                conn.execute(text(f"""
+                    ALTER TABLE rides ADD COLUMN {column} GEOMETRY(MULTILINESTRING, 4326)
+                    GENERATED ALWAYS AS (ST_Simplify(geometry, {tolerance}, true)) STORED
+                """))
+                conn.commit()
+                print(f"{column} column added to rides.")
+            else:
+                print(f"{column} column already exists on rides.")
+
+        # Add track fingerprint column for near-duplicate detection
+        result = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'rides' AND column_name = 'track_fingerprint'
+            )
+        """))
+        fingerprint_exists = result.scalar()
+
+        if not fingerprint_exists:
+            print("Adding track_fingerprint column to rides table...")
+            conn.execute(text("ALTER TABLE rides ADD COLUMN track_fingerprint VARCHAR(64)"))
+            conn.execute(text("CREATE INDEX ix_rides_track_fingerprint ON rides(track_fingerprint)"))
+            conn.commit()
+            print("track_fingerprint column added.")
+        else:
+            print("track_fingerprint column already exists.")
+
+        fingerprinted = backfill_track_fingerprints(conn)
+        if fingerprinted:
+            print(f"Fingerprinted {fingerprinted} existing rides.")
+
+        rebuild_coverage = False
+
+        # Check if ride_buffers table exists
+        result = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.tables
+                WHERE table_name = 'ride_buffers'
+            )
+        """))
+        ride_buffers_exists = result.scalar()
+
+        if not ride_buffers_exists:
+            print("Creating ride_buffers table...")
+            conn.execute(text("""
+                CREATE TABLE ride_buffers (
+                    ride_id INTEGER REFERENCES rides(id) ON DELETE CASCADE,
+                    buffer_m INTEGER,
+                    geometry GEOMETRY(MULTIPOLYGON, 27700),
+                    PRIMARY KEY (ride_id, buffer_m)
+                )
+            """))
+            conn.execute(text("CREATE INDEX idx_ride_buffers_geometry ON ride_buffers USING GIST(geometry)"))
+            conn.commit()
+            print("Ride buffers table created.")
+        else:
+            print("Ride buffers table already exists.")
+
+            # Buffers used to be stored for a single width
+            result = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'ride_buffers' AND column_name = 'buffer_m'
+                )
+            """))
+            if not result.scalar():
+                print("Adding buffer width to ride_buffers table...")
+                conn.execute(text(f"ALTER TABLE ride_buffers ADD COLUMN buffer_m INTEGER NOT NULL DEFAULT {COVERAGE_BUFFER_METERS}"))
+                conn.execute(text("ALTER TABLE ride_buffers ALTER COLUMN buffer_m DROP DEFAULT"))
+                conn.execute(text("ALTER TABLE ride_buffers DROP CONSTRAINT ride_buffers_pkey"))
+                conn.execute(text("ALTER TABLE ride_buffers ADD PRIMARY KEY (ride_id, buffer_m)"))
+                conn.commit()
+                print("Buffer width added.")
+                rebuild_coverage = True
+
+        # Buffer any rides stored before the table existed
+        buffered = store_ride_buffers(conn)
+        print(f"Buffered {buffered} rides.")
+
+        # Check if path_segments table exists
+        result = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.tables
+                WHERE table_name = 'path_segments'
+            )
+        """))
+        path_segments_exists = result.scalar()
+
+        if not path_segments_exists:
+            print("Creating path_segments table...")
+            conn.execute(text("""
+                CREATE TABLE path_segments (
+                    id SERIAL PRIMARY KEY,
+                    path_id INTEGER NOT NULL REFERENCES paths(id) ON DELETE CASCADE,
+                    seq INTEGER NOT NULL,
+                    length_m FLOAT,
+                    geometry GEOMETRY(LINESTRING, 27700),
+                    is_ridden BOOLEAN DEFAULT FALSE,
+                    coverage_fraction FLOAT DEFAULT 0.0,
+                    last_ridden_date TIMESTAMP
+                )
+            """))
+            conn.execute(text("CREATE UNIQUE INDEX idx_path_segments_path_seq ON path_segments(path_id, seq)"))
+            conn.execute(text("CREATE INDEX idx_path_segments_geometry ON path_segments USING GIST(geometry)"))
+            conn.commit()
+            print("Path segments table created.")
+
+            # Split existing paths into segments
+            segments = build_path_segments(conn)
+            print(f"Created {segments} path segments.")
+            rebuild_coverage = True
+        else:
+            print("Path segments table already exists.")
+
+        # Check if path_ride_coverage table exists
+        result = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.tables
+                WHERE table_name = 'path_ride_coverage'
+            )
+        """))
+        path_ride_coverage_exists = result.scalar()
+
+        if not path_ride_coverage_exists:
+            print("Creating path_ride_coverage table...")
+            conn.execute(text("""
+                CREATE TABLE path_ride_coverage (
+                    path_id INTEGER REFERENCES paths(id) ON DELETE CASCADE,
+                    ride_id INTEGER REFERENCES rides(id) ON DELETE CASCADE,
+                    ride_date TIMESTAMP,
+                    distance_m FLOAT,
+                    covered_length_m FLOAT DEFAULT 0.0,
+                    geometry GEOMETRY(MULTILINESTRING, 27700),
+                    PRIMARY KEY (path_id, ride_id)
+                )
+            """))
+            conn.execute(text("CREATE INDEX ix_path_ride_coverage_ride_id ON path_ride_coverage(ride_id)"))
+            conn.execute(text("CREATE INDEX idx_path_ride_coverage_path_date ON path_ride_coverage(path_id, ride_date)"))
+            conn.commit()
+            print("Path ride coverage table created.")
+
+            rebuild_coverage = True
+        else:
+            print("Path ride coverage table already exists.")
+
+            result = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'path_ride_coverage' AND column_name = 'distance_m'
+                )
+            """))
+            if not result.scalar():
+                print("Adding distance_m to path_ride_coverage table...")
+                conn.execute(text("ALTER TABLE path_ride_coverage ADD COLUMN distance_m FLOAT"))
+                conn.commit()
+                rebuild_coverage = True
+
+        # Check if coverage profile tables exist
+        result = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.tables
+                WHERE table_name = 'path_coverage_profiles'
+            )
+        """))
+        profiles_exist = result.scalar()
+
+        if not profiles_exist:
+            print("Creating coverage profile tables...")
+            conn.execute(text("""
+                CREATE TABLE path_segment_coverage (
+                    segment_id INTEGER REFERENCES path_segments(id) ON DELETE CASCADE,
+                    buffer_m INTEGER,
+                    is_ridden BOOLEAN DEFAULT FALSE,
+                    coverage_fraction FLOAT DEFAULT 0.0,
+                    last_ridden_date TIMESTAMP,
+                    PRIMARY KEY (segment_id, buffer_m)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE path_coverage_profiles (
+                    path_id INTEGER REFERENCES paths(id) ON DELETE CASCADE,
+                    buffer_m INTEGER,
+                    is_ridden BOOLEAN DEFAULT FALSE,
+                    coverage_fraction FLOAT DEFAULT 0.0,
+                    last_ridden_date TIMESTAMP,
+                    PRIMARY KEY (path_id, buffer_m)
+                )
+            """))
+            conn.execute(text("CREATE INDEX ix_path_coverage_profiles_buffer_m ON path_coverage_profiles(buffer_m)"))
+            conn.commit()
+            print("Coverage profile tables created.")
+            rebuild_coverage = True
+        else:
+            print("Coverage profile tables already exist.")
+
+        # Populate contributions and segment coverage for the existing rides
+        if rebuild_coverage:
+            paths_updated = recompute_coverage(conn)
+            print(f"Coverage rebuilt for {paths_updated} paths.")
+
+        # Queue of coverage work that survives restarts of the web process
+        result = conn.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.tables
+                WHERE table_name = 'coverage_queue'
+            )
+        """))
+        if not result.scalar():
+            print("Creating coverage_queue table...")
+            conn.execute(text("""
+                CREATE TABLE coverage_queue (
+                    id SERIAL PRIMARY KEY,
+                    ride_id INTEGER REFERENCES rides(id) ON DELETE CASCADE,
+                    path_id INTEGER REFERENCES paths(id) ON DELETE CASCADE,
+                    full_recompute BOOLEAN NOT NULL DEFAULT FALSE,
+                    created_at TIMESTAMP
+                )
+            """))
+            conn.commit()
+            print("coverage_queue table created.")
+        else:
+            print("coverage_queue table already exists.")
+
+        # Data version sequence for the API response cache
+        conn.execute(text("CREATE SEQUENCE IF NOT EXISTS data_version"))
+        conn.commit()
+        # The migration may have changed what the API serves
+        bump_data_version(conn)
+
     print("Migration complete!")
 
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Recompute coverage for every path, spreading spatial tiles over several
+database connections.
+
+Use after changing the coverage parameters or reloading path data, or to
+benchmark the coverage engines against each other.
+
+Usage:
+    python scripts/recompute_coverage.py --workers 8
+    python scripts/recompute_coverage.py --engine shapely
+"""
+
+import argparse
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import DATABASE_URL, COVERAGE_WORKERS, COVERAGE_ENGINE
+from app.db import Base
+from app.services.coverage import recompute_coverage_parallel
+from app.services.response_cache import bump_data_version
+
+
+def print_progress(tile_result: dict, tiles_done: int, tiles_total: int):
+    print(
+        f"  [{tiles_done}/{tiles_total}] {tile_result['area']} tile {tile_result['tile']}: "
+        f"{tile_result['paths_updated']} paths in {tile_result['seconds']:.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute path coverage in parallel')
+    parser.add_argument('--workers', type=int, default=COVERAGE_WORKERS,
+                        help=f'Number of concurrent database connections (default: {COVERAGE_WORKERS})')
+    parser.add_argument('--engine', choices=['postgis', 'shapely'], default=COVERAGE_ENGINE,
+                        help=f'Coverage engine (default: {COVERAGE_ENGINE})')
+
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL, pool_size=max(5, args.workers))
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    print(f"Recomputing coverage with the {args.engine} engine and {args.workers} workers...")
+    started = time.perf_counter()
+
+    try:
+        tiles = recompute_coverage_parallel(Session, args.workers, print_progress, engine=args.engine)
+    finally:
+        # Let the API drop cached responses, even if only some tiles finished
+        with Session() as session:
+            bump_data_version(session)
+
+    paths_updated = sum(t["paths_updated"] for t in tiles)
+    print(f"\nCoverage updated for {paths_updated} paths in {len(tiles)} tiles "
+          f"({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Tests for the in-process Shapely coverage engine.
+
+compute_coverage() needs no database, so these run it on small hand-made
+paths and rides in a metric CRS, as recompute_coverage_shapely() does with
+geometries in British National Grid.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+import shapely
+
+from app.services.coverage_shapely import compute_coverage
+
+# A 100 m path along the x axis
+PATH = shapely.LineString([(0, 0), (100, 0)])
+
+
+def lines(*coords) -> np.ndarray:
+    return np.array([shapely.LineString(c) for c in coords], dtype=object)
+
+
+def test_full_cover():
+    result = compute_coverage([PATH], lines([(-20, 5), (120, 5)]), [datetime(2024, 5, 1)], buffer_meters=10)
+
+    assert result["coverage_fraction"][0] == pytest.approx(1.0)
+    assert result["is_ridden"][0]
+    assert result["last_ridden_date"] == [datetime(2024, 5, 1)]
+    assert result["contrib_path_index"].tolist() == [0]
+    assert result["contrib_ride_index"].tolist() == [0]
+    assert shapely.length(result["contrib_geometry"][0]) == pytest.approx(100.0)
+
+
+def test_partial_cover():
+    # Covers x from 0 to 40 + 10 m of buffer
+    result = compute_coverage([PATH], lines([(-20, 0), (40, 0)]), [None], buffer_meters=10)
+
+    assert result["coverage_fraction"][0] == pytest.approx(0.5)
+    assert result["is_ridden"][0]
+    assert result["last_ridden_date"] == [None]
+    contribution = result["contrib_geometry"][0]
+    assert shapely.get_type_id(contribution) == shapely.GeometryType.MULTILINESTRING
+    assert shapely.length(contribution) == pytest.approx(50.0)
+
+
+def test_below_min_fraction_is_not_ridden():
+    result = compute_coverage([PATH], lines([(-20, 0), (20, 0)]), [None], buffer_meters=10, min_fraction=0.5)
+
+    assert result["coverage_fraction"][0] == pytest.approx(0.3)
+    assert not result["is_ridden"][0]
+
+
+def test_overlapping_rides_are_unioned():
+    rides = lines([(0, 0), (60, 0)], [(40, 0), (100, 0)])
+    dates = [datetime(2024, 5, 1), datetime(2024, 6, 1)]
+    result = compute_coverage([PATH], rides, dates, buffer_meters=5)
+
+    assert result["coverage_fraction"][0] == pytest.approx(1.0)
+    assert result["last_ridden_date"] == [datetime(2024, 6, 1)]
+    assert sorted(result["contrib_ride_index"].tolist()) == [0, 1]
+    assert sorted(shapely.length(result["contrib_geometry"]).tolist()) == pytest.approx([65.0, 65.0])
+
+
+def test_no_cover():
+    result = compute_coverage([PATH], lines([(0, 50), (100, 50)]), [datetime(2024, 5, 1)], buffer_meters=10)
+
+    assert result["coverage_fraction"][0] == 0.0
+    assert not result["is_ridden"][0]
+    assert result["last_ridden_date"] == [None]
+    assert len(result["contrib_path_index"]) == 0
+    assert len(result["contrib_geometry"]) == 0
+
+
+def test_buffer_touching_at_a_point():
+    # A ride crossing the end of the path at right angles: its buffer only
+    # meets the path in a point. Like the SQL engine, it counts for the last
+    # ridden date but covers nothing and contributes no row.
+    ride = lines([(110, -50), (110, 50)])
+    result = compute_coverage([PATH], ride, [datetime(2024, 5, 1)], buffer_meters=10)
+
+    assert result["coverage_fraction"][0] == 0.0
+    assert result["last_ridden_date"] == [datetime(2024, 5, 1)]
+    assert len(result["contrib_path_index"]) == 0
+
+
+def test_no_rides():
+    result = compute_coverage([PATH], np.array([], dtype=object), [], buffer_meters=10)
+
+    assert result["coverage_fraction"].tolist() == [0.0]
+    assert result["is_ridden"].tolist() == [False]
+    assert result["last_ridden_date"] == [None]
+    assert len(result["contrib_geometry"]) == 0
+
+
+def test_empty_ride_geometry():
+    result = compute_coverage([PATH], np.array([shapely.from_wkt("LINESTRING EMPTY")]), [None], buffer_meters=10)
+
+    assert result["coverage_fraction"].tolist() == [0.0]
+    assert len(result["contrib_geometry"]) == 0
+
+
+def test_paths_are_independent():
+    paths = [PATH, shapely.LineString([(0, 100), (100, 100)])]
+    result = compute_coverage(paths, lines([(0, 100), (100, 100)]), [None], buffer_meters=10)
+
+    assert result["coverage_fraction"].tolist() == pytest.approx([0.0, 1.0])
+    assert result["is_ridden"].tolist() == [False, True]
+    assert result["contrib_path_index"].tolist() == [1]
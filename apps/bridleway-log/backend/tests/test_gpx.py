@@ -0,0 +1,112 @@
+"""
+Regression tests for the streaming GPX parser against gpxpy.
+
+app/services/gpx.py replaced gpxpy; these check that it still reads the
+sample rides in data/gpx the way the gpxpy-based importer did, and that it
+tolerates the same malformed input.
+"""
+
+from pathlib import Path
+import hashlib
+import math
+
+import numpy as np
+import pytest
+
+from app.services import gpx
+from app.services.gpx import parse_gpx, parse_gpx_file, parse_times
+
+gpxpy = pytest.importorskip("gpxpy")
+
+SAMPLE_DIR = Path(__file__).resolve().parents[4] / "data" / "gpx"
+SAMPLE_FILES = sorted(SAMPLE_DIR.glob("**/*.gpx"))
+
+
+def parse_with_gpxpy(content: bytes) -> tuple:
+    """Segments, distance, elevation gain and start time as the gpxpy-based importer computed them."""
+    gpx = gpxpy.parse(content.decode("utf-8"))
+
+    segments = []
+    total_distance = 0.0
+    elevation_gain = 0.0
+    min_time = None
+    prev_elevation = None
+
+    for track in gpx.tracks:
+        for segment in track.segments:
+            coords = []
+            for point in segment.points:
+                coords.append((point.longitude, point.latitude))
+                if point.time and (min_time is None or point.time < min_time):
+                    min_time = point.time
+                if point.elevation is not None:
+                    if prev_elevation is not None and point.elevation > prev_elevation:
+                        elevation_gain += point.elevation - prev_elevation
+                    prev_elevation = point.elevation
+            if len(coords) >= 2:
+                segments.append(coords)
+            total_distance += segment.length_3d() if segment.has_elevations() else segment.length_2d()
+
+    if not segments:
+        for route in gpx.routes:
+            coords = []
+            for point in route.points:
+                coords.append((point.longitude, point.latitude))
+                if point.time and (min_time is None or point.time < min_time):
+                    min_time = point.time
+            if len(coords) >= 2:
+                segments.append(coords)
+
+    return segments, total_distance / 1000.0, elevation_gain if elevation_gain > 0 else None, min_time
+
+
+@pytest.mark.skipif(not SAMPLE_FILES, reason="no sample GPX files in data/gpx")
+@pytest.mark.parametrize("gpx_path", SAMPLE_FILES, ids=lambda p: p.name)
+def test_matches_gpxpy(gpx_path: Path):
+    content = gpx_path.read_bytes()
+    segments, distance_km, elevation_gain_m, start_time = parse_with_gpxpy(content)
+    parsed = parse_gpx(content)
+
+    assert [segment.coords.tolist() for segment in parsed.segments] == [list(map(list, s)) for s in segments]
+    assert math.isclose(parsed.distance_km, distance_km, rel_tol=1e-9, abs_tol=1e-9)
+    if elevation_gain_m is None:
+        assert parsed.elevation_gain_m is None
+    else:
+        assert math.isclose(parsed.elevation_gain_m, elevation_gain_m, rel_tol=1e-9)
+    if start_time is None:
+        assert parsed.start_time is None
+    else:
+        assert parsed.start_time == start_time
+
+
+def test_malformed_time_is_ignored():
+    content = b"""<gpx><trk><trkseg>
+        <trkpt lat="53.70" lon="-1.90"><time>not a time</time></trkpt>
+        <trkpt lat="53.71" lon="-1.90"><time>2024-05-01T09:30:00Z</time></trkpt>
+    </trkseg></trk></gpx>"""
+    parsed = parse_gpx(content)
+
+    assert len(parsed.segments) == 1
+    assert parsed.date_recorded == "2024-05-01T09:30:00+00:00"
+    assert parse_with_gpxpy(content)[3].timestamp() == parsed.start_time.timestamp()
+
+
+def test_times_keep_microseconds():
+    times = parse_times(["2024-05-01T09:30:00.123456Z", "", "2024-05-01T10:30:00.5+01:00"])
+
+    assert times[0] == pytest.approx(1714555800.123456, abs=1e-6)
+    assert np.isnan(times[1])
+    assert times[2] == pytest.approx(1714555800.5, abs=1e-6)
+
+
+@pytest.mark.skipif(not SAMPLE_FILES, reason="no sample GPX files in data/gpx")
+@pytest.mark.parametrize("gpx_path", SAMPLE_FILES, ids=lambda p: p.name)
+def test_cache_hit_matches_fresh_parse(gpx_path: Path, tmp_path, monkeypatch):
+    monkeypatch.setattr(gpx, "GPX_PARSE_CACHE_DIR", tmp_path)
+    content = gpx_path.read_bytes()
+    file_hash = hashlib.sha256(content).hexdigest()
+
+    fresh = parse_gpx_file(content, file_hash)
+    assert gpx.parse_cache_path(file_hash).exists()
+
+    assert parse_gpx_file(content, file_hash) == fresh
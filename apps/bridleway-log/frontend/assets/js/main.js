@@ -11,12 +11,17 @@ const NOT_RIDDEN_COLOR = '#2563eb';  // Blue for not ridden
 const FILTERED_COLOR = '#8b5cf6';  // Purple for filtered view
 const RIDE_TRACE_COLOR = '#06b6d4';  // Cyan for GPX ride traces
 
+// GPX files this large are sent with the resumable chunked upload API
+const CHUNKED_UPLOAD_MIN_BYTES = 5 * 1024 * 1024;
+const CHUNK_MAX_RETRIES = 5;
+
 // State
 let map;
 let pathsLayer;
 let ridesLayer;  // Layer group for ride traces
 let rideData = {};  // Store ride GeoJSON features by ID
 let rideLayers = {};  // Store individual ride layers by ID
+let rideLod = null;  // Zoom band of the loaded ride geometry
 let useImperial = false;
 let currentRiddenFilter = 'all';  // Track current ridden filter for styling
 let allRides = [];  // Store all rides for filtering
@@ -87,14 +92,42 @@ function initMap() {
     currentBaseLayer = baseMaps.osm.layer();
     currentBaseLayer.addTo(map);
 
-    pathsLayer = L.geoJSON(null, {
-        style: styleFeature,
-        onEachFeature: onEachFeature
+    // Leaflet.VectorGrid still calls L.DomEvent.fakeStop, removed in Leaflet 1.8
+    if (!L.DomEvent.fakeStop) {
+        L.DomEvent.fakeStop = () => true;
+    }
+
+    // Paths come as vector tiles, so only what is in view is loaded;
+    // loadPaths() sets the tile URL for the current filters
+    pathsLayer = L.vectorGrid.protobuf(`${API_BASE}/tiles/paths/{z}/{x}/{y}.mvt`, {
+        vectorTileLayerStyles: {
+            paths: (properties) => styleFeature({ properties })
+        },
+        interactive: true,
+        maxNativeZoom: 16,
+        getFeatureId: (feature) => feature.properties.id
     }).addTo(map);
 
+    pathsLayer.on('click', (e) => {
+        const props = e.layer.properties;
+        const popup = L.popup()
+            .setLatLng(e.latlng)
+            .setContent(pathPopupContent(props))
+            .openOn(map);
+        loadPathRides(props.id, popup);
+    });
+
     // Layer group for ride traces (on top of paths)
     ridesLayer = L.layerGroup().addTo(map);
 
+    // Ride geometry is simplified per zoom band; reload it when leaving the band
+    map.on('zoomend', () => {
+        const zoom = map.getZoom();
+        if (rideLod && (zoom < rideLod.min_zoom || zoom > rideLod.max_zoom)) {
+            reloadRideGeometry();
+        }
+    });
+
     addLegend();
     addLayerToggles();
 }
@@ -134,15 +167,14 @@ function styleFeature(feature) {
     };
 }
 
-function onEachFeature(feature, layer) {
-    const props = feature.properties;
+function pathPopupContent(props) {
     const length = formatDistance(props.length_km);
     const coverage = props.coverage_fraction ? (props.coverage_fraction * 100).toFixed(0) : '0';
     const lastRidden = props.last_ridden_date
         ? new Date(props.last_ridden_date).toLocaleDateString('en-GB')
         : 'Never';
 
-    const content = `
+    return `
         <div class="path-popup-content">
             <div class="popup-row">
                 <span class="popup-label">Name:</span>
@@ -174,10 +206,39 @@ function onEachFeature(feature, layer) {
                 <span class="popup-label">Last Ridden:</span>
                 <span>${lastRidden}</span>
             </div>
+            <div class="popup-rides popup-divider"></div>
         </div>
     `;
+}
 
-    layer.bindPopup(content);
+async function loadPathRides(pathId, popup) {
+    const container = popup.getElement().querySelector('.popup-rides');
+    container.textContent = 'Loading rides...';
+
+    try {
+        const res = await fetch(`${API_BASE}/paths/${pathId}/rides`);
+        const data = await res.json();
+
+        if (data.total === 0) {
+            container.textContent = 'No rides recorded';
+            return;
+        }
+
+        container.innerHTML = `
+            <span class="popup-label">Rides (${data.total}):</span>
+            <ul class="popup-ride-list">
+                ${data.rides.map(ride => `
+                    <li>
+                        ${ride.date_recorded ? new Date(ride.date_recorded).toLocaleDateString('en-GB') : 'Unknown date'}
+                        - ${ride.filename}
+                    </li>
+                `).join('')}
+            </ul>
+        `;
+    } catch (error) {
+        console.error('Error loading path rides:', error);
+        container.textContent = 'Could not load rides';
+    }
 }
 
 function addLegend() {
@@ -411,16 +472,19 @@ async function loadPaths(fitBounds = false) {
             params.append('min_coverage', minCoverage.toString());
         }
 
-        const url = `${API_BASE}/paths${params.toString() ? '?' + params.toString() : ''}`;
-        const res = await fetch(url);
-        const data = await res.json();
+        const query = params.toString() ? '?' + params.toString() : '';
 
-        pathsLayer.clearLayers();
-        pathsLayer.addData(data);
+        // Swapping the tile URL redraws the layer with the new filters
+        pathsLayer.setUrl(`${API_BASE}/tiles/paths/{z}/{x}/{y}.mvt${query}`);
 
         // Only fit bounds on initial load, not when applying filters
-        if (fitBounds && data.features.length > 0) {
-            map.fitBounds(pathsLayer.getBounds(), { padding: [20, 20] });
+        if (fitBounds) {
+            const res = await fetch(`${API_BASE}/tiles/paths.json${query}`);
+            const tilejson = await res.json();
+            if (tilejson.bounds) {
+                const [west, south, east, north] = tilejson.bounds;
+                map.fitBounds([[south, west], [north, east]], { padding: [20, 20] });
+            }
         }
     } catch (err) {
         console.error('Error loading paths:', err);
@@ -438,7 +502,7 @@ async function loadRides() {
         // Fetch both ride list and geometries
         const [ridesRes, geoRes] = await Promise.all([
             fetch(`${API_BASE}/rides`),
-            fetch(`${API_BASE}/rides/geojson`)
+            fetch(`${API_BASE}/rides/geojson?zoom=${map.getZoom()}`)
         ]);
 
         const data = await ridesRes.json();
@@ -446,6 +510,7 @@ async function loadRides() {
 
         // Store all rides for filtering
         allRides = data.rides;
+        rideLod = geoData.lod || null;
 
         // Clear existing ride layers
         ridesLayer.clearLayers();
@@ -512,33 +577,7 @@ async function loadRides() {
         // Create layers for all rides
         for (const ride of data.rides) {
             if (rideData[ride.id]) {
-                const layer = L.geoJSON(rideData[ride.id], {
-                    style: {
-                        color: RIDE_TRACE_COLOR,
-                        weight: 4,
-                        opacity: 0.85
-                    },
-                    onEachFeature: (feature, lyr) => {
-                        const props = feature.properties;
-                        const rideDate = props.date_recorded
-                            ? new Date(props.date_recorded).toLocaleDateString('en-GB')
-                            : 'Unknown date';
-                        const rideDist = formatDistance(props.distance_km);
-                        const elevation = props.elevation_gain_m
-                            ? `${props.elevation_gain_m.toFixed(0)}m`
-                            : '-';
-
-                        lyr.bindPopup(`
-                            <div class="ride-popup-content">
-                                <strong>${props.filename}</strong><br>
-                                Date: ${rideDate}<br>
-                                Distance: ${rideDist}<br>
-                                Elevation: ${elevation}
-                            </div>
-                        `);
-                    }
-                });
-                rideLayers[ride.id] = layer;
+                rideLayers[ride.id] = createRideLayer(rideData[ride.id]);
             }
         }
 
@@ -550,6 +589,63 @@ async function loadRides() {
     }
 }
 
+function createRideLayer(feature) {
+    return L.geoJSON(feature, {
+        style: {
+            color: RIDE_TRACE_COLOR,
+            weight: 4,
+            opacity: 0.85
+        },
+        onEachFeature: (feature, lyr) => {
+            const props = feature.properties;
+            const rideDate = props.date_recorded
+                ? new Date(props.date_recorded).toLocaleDateString('en-GB')
+                : 'Unknown date';
+            const rideDist = formatDistance(props.distance_km);
+            const elevation = props.elevation_gain_m
+                ? `${props.elevation_gain_m.toFixed(0)}m`
+                : '-';
+
+            lyr.bindPopup(`
+                <div class="ride-popup-content">
+                    <strong>${props.filename}</strong><br>
+                    Date: ${rideDate}<br>
+                    Distance: ${rideDist}<br>
+                    Elevation: ${elevation}
+                </div>
+            `);
+        }
+    });
+}
+
+async function reloadRideGeometry() {
+    const zoom = map.getZoom();
+    try {
+        const res = await fetch(`${API_BASE}/rides/geojson?zoom=${zoom}`);
+        const geoData = await res.json();
+
+        // Ignore the response if the map moved to another band meanwhile
+        if (zoom !== map.getZoom()) return;
+        rideLod = geoData.lod || null;
+
+        // Swap each ride's layer, keeping its visibility
+        for (const feature of geoData.features) {
+            const rideId = feature.properties.id;
+            const oldLayer = rideLayers[rideId];
+            const layer = createRideLayer(feature);
+
+            rideData[rideId] = feature;
+            rideLayers[rideId] = layer;
+            if (oldLayer && ridesLayer.hasLayer(oldLayer)) {
+                ridesLayer.removeLayer(oldLayer);
+                ridesLayer.addLayer(layer);
+            }
+        }
+    } catch (err) {
+        console.error('Error loading ride geometry:', err);
+    }
+}
+
 function renderFilteredRides() {
     const panel = document.getElementById('rides-panel');
 
@@ -678,18 +774,39 @@ async function uploadGPX() {
     uploadBtn.textContent = 'Uploading...';
     statusDiv.innerHTML = '<p>Uploading...</p>';
 
-    const formData = new FormData();
-    for (const file of input.files) {
-        formData.append('files', file);
-    }
+    // A single ZIP (e.g. a Strava bulk export) goes to the archive endpoint
+    const isZip = input.files.length === 1 && input.files[0].name.toLowerCase().endsWith('.zip');
+    const files = Array.from(input.files);
+    const largeFiles = isZip ? [] : files.filter(f => f.size >= CHUNKED_UPLOAD_MIN_BYTES);
+    const smallFiles = isZip ? [] : files.filter(f => f.size < CHUNKED_UPLOAD_MIN_BYTES);
 
     try {
-        const res = await fetch(`${API_BASE}/rides/upload`, {
-            method: 'POST',
-            body: formData
-        });
+        const responses = [];
 
-        const data = await res.json();
+        if (isZip || smallFiles.length > 0) {
+            const formData = new FormData();
+            if (isZip) {
+                formData.append('file', input.files[0]);
+            } else {
+                for (const file of smallFiles) {
+                    formData.append('files', file);
+                }
+            }
+
+            const res = await fetch(`${API_BASE}/rides/${isZip ? 'upload-zip' : 'upload'}`, {
+                method: 'POST',
+                body: formData
+            });
+            responses.push(await res.json());
+        }
+
+        for (const file of largeFiles) {
+            responses.push(await uploadChunked(file, (percent) => {
+                statusDiv.innerHTML = `<p>Uploading ${file.name}: ${percent}%</p>`;
+            }));
+        }
+
+        const data = mergeUploadResponses(responses);
 
         let html = `<div class="upload-results">`;
         html += `<p>Processed ${data.total_files} file(s): ${data.imported} imported, ${data.skipped} skipped, ${data.errors} error(s)</p>`;
@@ -708,9 +825,11 @@ async function uploadGPX() {
         input.value = '';
         document.getElementById('file-count').textContent = '';
 
-        // Reload rides, stats, and paths
+        // Reload rides now, and stats and paths once coverage is recomputed
         if (data.imported > 0) {
-            await Promise.all([loadRides(), loadStats(), loadPaths()]);
+            await loadRides();
+            await waitForCoverageJob(data.coverage_job_id);
+            await Promise.all([loadStats(), loadPaths()]);
         }
     } catch (err) {
         console.error('Error uploading GPX:', err);
@@ -721,6 +840,94 @@ async function uploadGPX() {
     }
 }
 
+async function uploadChunked(file, onProgress) {
+    // Resumable upload: after a failed chunk, ask the server how much it
+    // has and carry on from there
+    let res = await fetch(`${API_BASE}/uploads`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    if (!res.ok) {
+        throw new Error((await res.json()).detail || `Upload of ${file.name} refused`);
+    }
+    const upload = await res.json();
+
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+        try {
+            res = await fetch(`${API_BASE}/uploads/${upload.upload_id}?offset=${offset}`, {
+                method: 'PUT',
+                body: file.slice(offset, offset + upload.chunk_size)
+            });
+            if (!res.ok) {
+                throw new Error((await res.json()).detail);
+            }
+            offset = (await res.json()).offset;
+            failures = 0;
+            onProgress(Math.floor(offset * 100 / file.size));
+        } catch (err) {
+            failures += 1;
+            if (failures > CHUNK_MAX_RETRIES) {
+                throw new Error(`Upload of ${file.name} failed: ${err.message}`);
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** failures));
+
+            const status = await fetch(`${API_BASE}/uploads/${upload.upload_id}`).catch(() => null);
+            if (status && status.ok) {
+                offset = (await status.json()).offset;
+            }
+        }
+    }
+
+    res = await fetch(`${API_BASE}/uploads/${upload.upload_id}/finalize`, { method: 'POST' });
+    if (!res.ok) {
+        const detail = (await res.json().catch(() => ({}))).detail;
+        throw new Error(`Upload of ${file.name} failed: ${detail || res.statusText}`);
+    }
+    return res.json();
+}
+
+function mergeUploadResponses(responses) {
+    // Combine upload responses; coverage jobs run in order, so the last one
+    // finishing means all of them have
+    const merged = { total_files: 0, imported: 0, skipped: 0, errors: 0, results: [], coverage_job_id: null };
+    for (const data of responses) {
+        merged.total_files += data.total_files;
+        merged.imported += data.imported;
+        merged.skipped += data.skipped;
+        merged.errors += data.errors;
+        merged.results.push(...data.results);
+        merged.coverage_job_id = data.coverage_job_id || merged.coverage_job_id;
+    }
+    return merged;
+}
+
+async function waitForCoverageJob(jobId, intervalMs = 1000) {
+    // Poll a background coverage job until it has finished
+    if (!jobId) {
+        return null;
+    }
+
+    while (true) {
+        const res = await fetch(`${API_BASE}/coverage/jobs/${jobId}`);
+        if (!res.ok) {
+            return null;
+        }
+
+        const job = await res.json();
+        if (job.status === 'completed' || job.status === 'failed') {
+            if (job.status === 'failed') {
+                console.error('Coverage job failed:', job.error);
+            }
+            return job;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 async function deleteRide(rideId) {
     if (!confirm('Delete this ride? Coverage will be recalculated.')) {
         return;
@@ -732,8 +939,12 @@ async function deleteRide(rideId) {
         });
 
         if (res.ok) {
-            // Reload rides, stats, and paths
-            await Promise.all([loadRides(), loadStats(), loadPaths()]);
+            const data = await res.json();
+
+            // Reload rides now, and stats and paths once coverage is recomputed
+            await loadRides();
+            await waitForCoverageJob(data.coverage_job_id);
+            await Promise.all([loadStats(), loadPaths()]);
         } else {
             const data = await res.json();
             alert(`Error deleting ride: ${data.detail || 'Unknown error'}`);